@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+"""Benchmark the build of this example site, offline, against the bundled
+doxygen XML (``examples/openmm-doxygen-xml.tar.bz2``).
+
+The sources and the XML are copied to a work directory, and ``sphinx-build``
+is run with fixed settings:
+
+cold
+    from scratch, with no doctrees, output or generated stub pages;
+warm
+    again, with nothing changed;
+touched
+    after changing one XML file (``--touch``), which should only read the
+    documents that use its compounds again;
+parallel
+    from scratch, with ``-j N`` (``--jobs``).
+
+Each run records its wall time, the peak RSS of the build processes and the
+timings of the extension's entry points (see the `autodoc_doxygen_timings`
+config value). With ``--repeat``, the fastest repetition of each run is
+kept. The results are printed and written to ``--output``, and compared to
+``--baseline``: a run that is slower, or uses more memory, than the baseline
+by more than the thresholds (and some slack), or reads more documents, is a
+regression, and the exit status is 1. ::
+
+  python benchmark.py --baseline benchmark-baseline.json
+  python benchmark.py --save-baseline benchmark-baseline.json
+"""
+from __future__ import print_function, absolute_import, division
+
+import argparse
+import glob
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+XML_ARCHIVE = os.path.join(HERE, '..', 'openmm-doxygen-xml.tar.bz2')
+RUNS = ('cold', 'warm', 'touched', 'parallel')
+# the relative regression thresholds of the measures
+THRESHOLDS = {'wall': 0.25, 'peak_rss_mb': 0.20}
+# the absolute slack of the measures, so that the noise of the short runs
+# (a warm build takes about a second) is not reported
+SLACK = {'wall': 0.25, 'peak_rss_mb': 5}
+
+
+def prepare(workdir):
+    """Copy the sources and extract the XML into *workdir*."""
+    src = os.path.join(workdir, 'src')
+    if os.path.isdir(src):
+        shutil.rmtree(src)
+    os.makedirs(src)
+    for filename in ['conf.py'] + glob.glob(os.path.join(HERE, '*.rst')):
+        shutil.copy(os.path.join(HERE, filename), src)
+
+    xml = os.path.join(workdir, 'xml')
+    if os.path.isdir(xml):
+        shutil.rmtree(xml)
+    with tarfile.open(XML_ARCHIVE) as tar:
+        tar.extractall(workdir)
+    return src, xml
+
+
+def clean(workdir):
+    for path in ('doctrees', 'html', os.path.join('src', 'generated')):
+        if os.path.isdir(os.path.join(workdir, path)):
+            shutil.rmtree(os.path.join(workdir, path))
+
+
+def touch(xml, filename):
+    """Change the content of *filename*, without changing what it documents."""
+    with open(os.path.join(xml, filename), 'ab') as f:
+        f.write(b'<!-- touched %r -->\n' % time.time())
+
+
+def build(workdir, src, xml, jobs=1):
+    """Run sphinx-build once. Returns the wall time, the peak RSS in MB (None
+    if unknown) and the timings written by the extension.
+    """
+    timings = os.path.join(workdir, 'timings.json')
+    if os.path.exists(timings):
+        os.remove(timings)
+    cmd = [sys.executable, '-m', 'sphinx', '-b', 'html', '-q',
+           '-d', os.path.join(workdir, 'doctrees'),
+           '-D', 'doxygen_xml=%s' % xml,
+           '-D', 'autodoc_doxygen_timings=%s' % timings,
+           src, os.path.join(workdir, 'html')]
+    if jobs > 1:
+        cmd += ['-j', str(jobs)]
+
+    with open(os.path.join(workdir, 'sphinx.log'), 'w') as log:
+        t0 = time.time()
+        process = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+        if hasattr(os, 'wait4'):
+            _, status, rusage = os.wait4(process.pid, 0)
+            returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1
+            # ru_maxrss is in kB on linux, and in bytes on macOS
+            scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+            peak_rss = rusage.ru_maxrss / scale
+        else:
+            returncode = process.wait()
+            peak_rss = None
+        wall = time.time() - t0
+
+    if returncode != 0:
+        with open(os.path.join(workdir, 'sphinx.log')) as log:
+            raise RuntimeError('sphinx-build failed:\n%s' % log.read())
+    with open(timings) as f:
+        return wall, peak_rss, json.load(f)
+
+
+def run_all(workdir, jobs, touched, repeat):
+    src, xml = prepare(workdir)
+    results = {}
+
+    def record(name, measure):
+        wall, peak_rss, timings = measure
+        result = {'wall': round(wall, 3),
+                  'peak_rss_mb': round(peak_rss, 1) if peak_rss is not None else None,
+                  'documents_read': len(timings['documents']),
+                  'phases': timings['phases']}
+        if name not in results or result['wall'] < results[name]['wall']:
+            results[name] = result
+        print('%-9s %7.2fs %8s MB %4d documents read' % (
+            name, wall, '%.1f' % peak_rss if peak_rss is not None else '?',
+            len(timings['documents'])))
+
+    for _ in range(repeat):
+        clean(workdir)
+        record('cold', build(workdir, src, xml))
+        record('warm', build(workdir, src, xml))
+        touch(xml, touched)
+        record('touched', build(workdir, src, xml))
+        clean(workdir)
+        record('parallel', build(workdir, src, xml, jobs))
+    return results
+
+
+def compare(results, baseline, thresholds, slack=SLACK):
+    """Get the list of the regressions of *results* compared to *baseline*."""
+    regressions = []
+    for name in RUNS:
+        old, new = baseline['runs'].get(name), results.get(name)
+        if old is None or new is None:
+            continue
+        for measure, threshold in sorted(thresholds.items()):
+            if old.get(measure) and new.get(measure) is not None and \
+                    new[measure] > old[measure] * (1 + threshold) + slack.get(measure, 0):
+                regressions.append('%s: %s %s > %s (+%d%%)' % (
+                    name, measure, new[measure], old[measure],
+                    100 * (new[measure] / old[measure] - 1)))
+        if new['documents_read'] > old['documents_read']:
+            regressions.append('%s: %d documents read instead of %d' % (
+                name, new['documents_read'], old['documents_read']))
+    return regressions
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0],
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--workdir', help='work directory (default: a temporary directory)')
+    p.add_argument('-j', '--jobs', type=int, default=4,
+                   help='number of processes of the parallel run (default: %(default)s)')
+    p.add_argument('--touch', default='classOpenMM_1_1Force.xml',
+                   help='XML file changed before the touched run (default: %(default)s)')
+    p.add_argument('--repeat', type=int, default=3,
+                   help='number of repetitions, of which the fastest is kept (default: %(default)s)')
+    p.add_argument('-o', '--output', help='write the results to this JSON file')
+    p.add_argument('--baseline', help='compare the results to this JSON file')
+    p.add_argument('--save-baseline', metavar='FILE', help='write the results as a new baseline')
+    p.add_argument('--wall-threshold', type=float, default=THRESHOLDS['wall'],
+                   help='relative wall time regression threshold (default: %(default)s)')
+    p.add_argument('--rss-threshold', type=float, default=THRESHOLDS['peak_rss_mb'],
+                   help='relative peak RSS regression threshold (default: %(default)s)')
+    args = p.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='autodoc_doxygen-benchmark-')
+    try:
+        results = run_all(os.path.abspath(workdir), args.jobs, args.touch, args.repeat)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir)
+
+    import sphinx
+    report = {'python': platform.python_version(), 'sphinx': sphinx.__version__,
+              'jobs': args.jobs, 'runs': results}
+    for filename in (args.output, args.save_baseline):
+        if filename:
+            with open(filename, 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, {'wall': args.wall_threshold,
+                                                  'peak_rss_mb': args.rss_threshold})
+        for regression in regressions:
+            print('REGRESSION %s' % regression)
+        if regressions:
+            return 1
+        print('no regression compared to %s' % args.baseline)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
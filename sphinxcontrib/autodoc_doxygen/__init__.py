@@ -1,56 +1,415 @@
 import os.path
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from lxml import etree as ET
 from sphinx.errors import ExtensionError
+from sphinx.util import logging
 
+from .index import CompoundFilter, DoxygenIndex, load_xml_dir, read_tagfile
+from .prefetch import plan_compounds
+from .profiling import profiled
 
-def set_doxygen_xml(app):
+logger = logging.getLogger(__name__)
+
+# guards the lazy initialization and the replacement of the doxygen root and
+# indexes, which the documenters may look up from several threads
+_lock = threading.RLock()
+
+
+def load_doxygen_xml(app):
     """Load all doxygen XML files from the app config variable
     `app.config.doxygen_xml` which should be a path to a directory
-    containing doxygen xml output
+    containing doxygen xml output, or to a single file with the combined
+    doxygen XML output (e.g. ``all.xml``). Only the compounds accepted by the
+    `doxygen_xml_include_kinds` and `doxygen_xml_exclude_names` config
+    variables are loaded.
+
+    `app.config.doxygen_xml` can also be a dict mapping project names to
+    such directories. Each project then gets its own index, which the
+    directives select with their ``:project:`` option. Projects without the
+    option use `app.config.doxygen_default_project` (by default, the first
+    project).
+
+    The index of each directory is cached in the doctree directory. When
+    the XML files of a directory change, only the changed files are parsed
+    again, and their compounds are replaced in the cached index (or in the
+    index already loaded, when sphinx is run again in the same process).
+
+    If `app.config.doxygen_index` is set instead, it should be the path to
+    an index prebuilt by the ``autodoc-doxygen-index`` command, which is
+    loaded in a single pass.
+
+    Returns the index of the default project, a dict of the indexes of all
+    the projects (empty if there is a single one), and the set of the
+    ``(project, compound name)`` of the compounds that changed since the
+    previous build (None if unknown).
+
+    If `app.config.doxygen_xml_lazy_descriptions` is set, the descriptions
+    are not loaded, but parsed from the memory-mapped XML files when they
+    are rendered (see `DoxygenIndex.description`).
+
+    If `app.config.doxygen_xml_prefetch` is set, only the compounds that the
+    autodoxy* directives of the sources need are loaded (see
+    `plan_compounds`). The plan is cached next to the index.
+
+    If `app.config.doxygen_tagfile` is set (to a dict mapping the projects
+    to their tagfiles, if there are several), the index is seeded with the
+    names and ids of the tagfile, and the compounds are only loaded when a
+    directive looks them up (see `DoxygenIndex.seed_tags`), except for those
+    loaded by the previous builds (which are checked for changes) and the
+    planned ones.
+    """
+    if app.config.doxygen_index:
+        try:
+            index = DoxygenIndex.load(app.config.doxygen_index)
+        except (IOError, OSError, ValueError, ET.XMLSyntaxError) as e:
+            raise ExtensionError(
+                '[sphinxcontrib-autodoc_doxygen] Could not load doxygen_index="%s": %s'
+                % (app.config.doxygen_index, e))
+        index.project = ''
+        return index, {}, None
+
+    if isinstance(app.config.doxygen_xml, dict):
+        projects = app.config.doxygen_xml
+    else:
+        projects = {'': app.config.doxygen_xml}
+
+    compound_filter = CompoundFilter(app.config.doxygen_xml_include_kinds,
+                                     app.config.doxygen_xml_exclude_names)
+    cache_dir = os.path.join(app.doctreedir, 'autodoc_doxygen')
+
+    # the indexes loaded by a previous build in this process, by directory
+    loaded = getattr(setup, 'DOXYGEN_LOADED', {})
+
+    default_project = app.config.doxygen_default_project or next(iter(projects))
+    if app.config.doxygen_xml_prefetch:
+        directives = _find_directive_names(app, default_project)
+
+    indexes = {}
+    changed = set()
+    for project, xmldir in projects.items():
+        err = ExtensionError(
+            '[sphinxcontrib-autodoc_doxygen] No doxygen '
+            'xml output found in doxygen_xml="%s"' % xmldir)
+
+        if not os.path.exists(xmldir):
+            raise err
+
+        cache = os.path.join(cache_dir, '%s.xml' % (project or 'index'))
+        refids = None
+        if app.config.doxygen_xml_prefetch:
+            refids = plan_compounds(xmldir, directives.get(project, ()),
+                                    cache=os.path.join(cache_dir, '%s.plan.json' % (project or 'index')))
+            if refids is not None:
+                logger.info('[autodoc_doxygen] prefetching %d compounds of %s', len(refids), xmldir)
+        tagfile = _project_tagfile(app.config.doxygen_tagfile, project)
+        if tagfile and not os.path.isfile(tagfile):
+            raise ExtensionError('[sphinxcontrib-autodoc_doxygen] No doxygen tagfile '
+                                 'found at doxygen_tagfile="%s"' % tagfile)
+        index = load_xml_dir(xmldir, compound_filter, cache=cache,
+                             previous=loaded.get(os.path.abspath(xmldir)),
+                             lazy_descriptions=app.config.doxygen_xml_lazy_descriptions,
+                             refids=refids, on_demand=bool(tagfile))
+        if index is None:
+            raise err
+        if tagfile:
+            index.seed_tags(read_tagfile(tagfile), xmldir, compound_filter)
+        index.project = project
+        indexes[project] = loaded[os.path.abspath(xmldir)] = index
+        if index.changed:
+            logger.info('[autodoc_doxygen] %d changed compounds in %s', len(index.changed), xmldir)
+        changed.update((project, name) for name in index.changed)
+    setup.DOXYGEN_LOADED = loaded
+
+    if default_project not in indexes:
+        raise ExtensionError('[sphinxcontrib-autodoc_doxygen] doxygen_default_project="%s" '
+                             'is not one of the doxygen_xml projects' % default_project)
+
+    return (indexes[default_project], indexes if isinstance(app.config.doxygen_xml, dict) else {},
+            changed)
+
+
+def _project_tagfile(tagfiles, project):
+    if isinstance(tagfiles, dict):
+        return tagfiles.get(project)
+    return tagfiles if not project else None
+
+
+def save_doxygen_xml(app, env):
+    """Once the documents are read, write the cached index of each project
+    whose compounds are loaded on demand (see `load_doxygen_xml`), if some
+    were, so that the next build loads them up front and finds out whether
+    they changed.
+
+    The compounds loaded by parallel readers are loaded here as well, from
+    the names the documents noted.
+    """
+    wait_for_doxygen_xml()
+    indexes = getattr(setup, 'DOXYGEN_INDEXES', None) or {'': getattr(setup, 'DOXYGEN_INDEX', None)}
+    for project, index in indexes.items():
+        if index is None or not index.tags or index.cache is None:
+            continue
+        for compounds in getattr(env, 'doxygen_compounds', {}).values():
+            for compound_project, name in compounds:
+                if compound_project == project:
+                    index.find_compound(name)
+        if index.loaded_on_demand:
+            logger.info('[autodoc_doxygen] %d compounds loaded on demand', len(index.loaded_on_demand))
+            index.loaded_on_demand = set()
+            tmp = '%s.%d.tmp' % (index.cache, os.getpid())
+            index.dump(tmp)
+            os.replace(tmp, index.cache)
+
+
+def _find_directive_names(app, default_project):
+    """Scan the sources for the names of the autodoxy* directives (see
+    `find_autodoxy_in_files`). Returns a dict mapping each project to the
+    list of the ``(directive, name, scope)`` of its directives.
+
+    The sources are found the way sphinx finds them, since this may run
+    before sphinx does (see `start_doxygen_xml`).
+    """
+    from sphinx.project import Project
+    from .autosummary.generate import find_autodoxy_in_files
+
+    source_suffix = app.config.source_suffix
+    if isinstance(source_suffix, str):
+        source_suffix = [source_suffix]
+    sources = Project(app.srcdir, source_suffix)
+    docnames = sources.discover(app.config.exclude_patterns + app.config.templates_path)
+    filenames = [sources.doc2path(docname) for docname in sorted(docnames)]
+
+    directives = {}
+    for directive, name, project, scope, filename, lineno in find_autodoxy_in_files(filenames):
+        directives.setdefault(project or default_project, []).append((directive, name, scope))
+    return directives
+
+
+def _set_doxygen_indexes(index, indexes, changed):
+    with _lock:
+        setup.DOXYGEN_INDEX = index
+        setup.DOXYGEN_INDEXES = indexes
+        setup.DOXYGEN_CHANGED = changed
+        setup.DOXYGEN_ROOT = index.root
+
+
+@profiled
+def set_doxygen_xml(app):
+    """Load the doxygen XML (see `load_doxygen_xml`), unless it is
+    already being loaded in the background.
+    """
+    if app.config.doxygen_xml_async:
+        return
+    _set_doxygen_indexes(*load_doxygen_xml(app))
+
+
+def start_doxygen_xml(app, config):
+    """If `app.config.doxygen_xml_async` is set, start loading the doxygen XML
+    in a background thread as soon as the config is read, so that it overlaps
+    with sphinx finding and reading the sources. The loading is only waited
+    for when the doxygen root or index is first needed.
+
+    Generating the stub pages (`process_generate_options`, if some
+    autodoxysummary directives have a ``:toctree:``) and validating the
+    names (`validate_autodoxy_names`) need the index at ``builder-inited``,
+    since sphinx looks for the sources to read right after it, and the
+    names are checked before any is read. With either of them, the loading
+    only overlaps with sphinx loading the environment and the builder.
+    """
+    if not config.doxygen_xml_async:
+        return
+    executor = ThreadPoolExecutor(max_workers=1)
+    setup.DOXYGEN_FUTURE = executor.submit(load_doxygen_xml, app)
+    executor.shutdown(wait=False)
+
+
+def wait_for_doxygen_xml(*args):
+    """Block until the doxygen XML being loaded in the background is loaded.
+    Loading errors are raised here. The arguments are ignored, so that this
+    can be connected to any event.
     """
-    err = ExtensionError(
-        '[sphinxcontrib-autodoc_doxygen] No doxygen '
-        'xml output found in doxygen_xml="%s"' % app.config.doxygen_xml)
+    future = getattr(setup, 'DOXYGEN_FUTURE', None)
+    if future is None:
+        return
+    with _lock:
+        if setup.DOXYGEN_FUTURE is not future:
+            return  # another thread got it first
+        try:
+            result = future.result()
+        finally:
+            setup.DOXYGEN_FUTURE = None
+        _set_doxygen_indexes(*result)
 
-    if not os.path.isdir(app.config.doxygen_xml):
-        raise err
 
-    files = [os.path.join(app.config.doxygen_xml, f)
-             for f in os.listdir(app.config.doxygen_xml)
-             if f.lower().endswith('.xml') and not f.startswith('._')]
-    if len(files) == 0:
-        raise err
+def wait_before_parallel_read(app, env, docnames):
+    # forked reader processes would not get the loading thread, so the
+    # loading has to be complete before sphinx forks them
+    if app.parallel > 1:
+        wait_for_doxygen_xml()
 
-    setup.DOXYGEN_ROOT = ET.ElementTree(ET.Element('root')).getroot()
-    for file in files:
-        root = ET.parse(file).getroot()
-        for node in root:
-            setup.DOXYGEN_ROOT.append(node)
+
+def note_doxygen_compound(env, index, element):
+    """Record that the current document uses *element* (a compounddef, or
+    an element inside one) of *index*, so that the document is read again
+    when the compound changes (see `get_outdated_docs`).
+    """
+    if element is None or env is None or env.docname is None:
+        return
+    compound = element if element.tag == 'compounddef' else next(element.iterancestors('compounddef'), None)
+    if compound is None:
+        return
+    if not hasattr(env, 'doxygen_compounds'):
+        env.doxygen_compounds = {}
+    key = (index.project, compound.findtext('compoundname'))
+    env.doxygen_compounds.setdefault(env.docname, set()).add(key)
+
+
+def cpp_scope_name(parent_key):
+    """Get the name of the scope (e.g. "OpenMM::Force") of a ``cpp:parent_key``
+    LookupKey of the cpp domain, or None.
+    """
+    if parent_key is None:
+        return None
+    # the data of a LookupKey are (name, template params, id) tuples
+    return '::'.join(str(p[0]) for p in getattr(parent_key, 'data', parent_key)) or None
+
+
+def get_outdated_docs(app, env, added, changed, removed):
+    """Read the documents that use a doxygen compound that changed since the
+    previous build again.
+    """
+    wait_for_doxygen_xml()
+    changed_compounds = getattr(setup, 'DOXYGEN_CHANGED', None)
+    if not changed_compounds or not hasattr(env, 'doxygen_compounds'):
+        return []
+    return [docname for docname, compounds in env.doxygen_compounds.items()
+            if docname not in removed and not compounds.isdisjoint(changed_compounds)]
+
+
+def purge_doxygen_compounds(app, env, docname):
+    if hasattr(env, 'doxygen_compounds'):
+        env.doxygen_compounds.pop(docname, None)
+
+
+def merge_doxygen_compounds(app, env, docnames, other):
+    if not hasattr(other, 'doxygen_compounds'):
+        return
+    if not hasattr(env, 'doxygen_compounds'):
+        env.doxygen_compounds = {}
+    for docname in docnames:
+        if docname in other.doxygen_compounds:
+            env.doxygen_compounds[docname] = other.doxygen_compounds[docname]
 
 
 def get_doxygen_root():
     """Get the root element of the doxygen XML document.
     """
-    if not hasattr(setup, 'DOXYGEN_ROOT'):
-        setup.DOXYGEN_ROOT = ET.Element("root")  # dummy
-    return setup.DOXYGEN_ROOT
+    wait_for_doxygen_xml()
+    root = getattr(setup, 'DOXYGEN_ROOT', None)
+    if root is None:
+        with _lock:
+            if getattr(setup, 'DOXYGEN_ROOT', None) is None:
+                setup.DOXYGEN_ROOT = ET.Element("root")  # dummy
+            root = setup.DOXYGEN_ROOT
+    return root
+
+
+def get_doxygen_index(project=None):
+    """Get the `DoxygenIndex` of the doxygen XML document. If the root was
+    replaced since the index was built, the index is rebuilt. This is safe to
+    call from several threads.
+
+    If several doxygen projects are configured, *project* selects the index
+    of one of them; otherwise it is ignored.
+    """
+    wait_for_doxygen_xml()
+    if project:
+        indexes = getattr(setup, 'DOXYGEN_INDEXES', None)
+        if indexes:
+            try:
+                return indexes[project]
+            except KeyError:
+                raise ExtensionError('[autodoc_doxygen] unknown doxygen project "%s" (known '
+                                     'projects: %s)' % (project, ', '.join(sorted(indexes))))
+
+    index = getattr(setup, 'DOXYGEN_INDEX', None)
+    if index is None or index.root is not get_doxygen_root():
+        with _lock:
+            root = get_doxygen_root()
+            index = getattr(setup, 'DOXYGEN_INDEX', None)
+            if index is None or index.root is not root:
+                index = setup.DOXYGEN_INDEX = DoxygenIndex(root)
+    return index
 
 
 def setup(app):
     import sphinx.ext.autosummary
-    from .autodoc import DoxygenClassDocumenter, DoxygenMethodDocumenter
+    from .autodoc import (DoxygenClassDocumenter, DoxygenMethodDocumenter, DoxygenNamespaceDocumenter,
+                          DoxygenFunctionDocumenter, DoxygenEnumDocumenter, DoxygenTypedefDocumenter,
+                          merge_generated_rest, purge_generated_rest, prune_generated_rest,
+                          prune_unused_rest)
     from .autosummary import DoxygenAutosummary, DoxygenAutoEnum
     from .autosummary.generate import process_generate_options
+    from .profiling import (init_profiling, dump_document_profile, merge_profiles, merge_timings,
+                            write_timings, start_memory_profiling, memory_before_read,
+                            memory_after_read, write_memory_report)
+    from .references import clear_reference_cache, resolve_missing_reference
+    from .validation import validate_autodoxy_names
 
+    app.connect("config-inited", start_memory_profiling)
+    app.connect("config-inited", start_doxygen_xml)
+    app.connect("builder-inited", init_profiling)
     app.connect("builder-inited", set_doxygen_xml)
+    app.connect("builder-inited", validate_autodoxy_names)
     app.connect("builder-inited", process_generate_options)
+    app.connect("env-get-outdated", get_outdated_docs)
+    app.connect("env-get-outdated", prune_generated_rest)
+    app.connect("env-purge-doc", purge_doxygen_compounds)
+    app.connect("env-purge-doc", purge_generated_rest)
+    app.connect("env-merge-info", merge_doxygen_compounds)
+    app.connect("env-merge-info", merge_timings)
+    app.connect("env-merge-info", merge_generated_rest)
+    app.connect("env-before-read-docs", wait_before_parallel_read)
+    app.connect("env-before-read-docs", memory_before_read)
+    app.connect("doctree-read", dump_document_profile)
+    app.connect("env-updated", wait_for_doxygen_xml)
+    app.connect("env-updated", clear_reference_cache)
+    app.connect("env-updated", memory_after_read)
+    app.connect("env-updated", prune_unused_rest)
+    app.connect("env-updated", save_doxygen_xml)
+    app.connect("missing-reference", resolve_missing_reference)
+    app.connect("build-finished", merge_profiles)
+    app.connect("build-finished", write_timings)
+    app.connect("build-finished", write_memory_report)
 
     app.setup_extension('sphinx.ext.autodoc')
     app.setup_extension('sphinx.ext.autosummary')
 
     app.add_autodocumenter(DoxygenClassDocumenter)
     app.add_autodocumenter(DoxygenMethodDocumenter)
-    app.add_config_value("doxygen_xml", "", True)
+    app.add_autodocumenter(DoxygenNamespaceDocumenter)
+    app.add_autodocumenter(DoxygenFunctionDocumenter)
+    app.add_autodocumenter(DoxygenTypedefDocumenter)
+    # only for the members of namespaces: autodoxyenum is the DoxygenAutoEnum directive
+    app.registry.add_documenter(DoxygenEnumDocumenter.objtype, DoxygenEnumDocumenter)
+    app.add_config_value("doxygen_xml", "", True, (str, dict))
+    app.add_config_value("doxygen_index", "", True)
+    app.add_config_value("doxygen_default_project", "", True)
+    app.add_config_value("doxygen_xml_include_kinds", [], True)
+    app.add_config_value("doxygen_xml_exclude_names", [], True)
+    app.add_config_value("doxygen_xml_async", False, False)
+    app.add_config_value("doxygen_xml_lazy_descriptions", False, True)
+    app.add_config_value("doxygen_xml_prefetch", False, True)
+    app.add_config_value("doxygen_tagfile", "", True, (str, dict))
+    app.add_config_value("autodoc_doxygen_profile", "", False)
+    app.add_config_value("autodoc_doxygen_timings", "", False)
+    app.add_config_value("autodoc_doxygen_memory", "", False)
+    app.add_config_value("autodoc_doxygen_member_jobs", 1, False)
+    app.add_config_value("autodoc_doxygen_cache_rest", True, False)
+    app.add_config_value("autodoc_doxygen_shard_threshold", 0, True)
+    app.add_config_value("autodoc_doxygen_shard_size", 100, True)
+    app.add_config_value("autodoc_doxygen_inherited_members", False, True)
+    app.add_config_value("autodoc_doxygen_validate", False, False)
 
     app.add_directive('autodoxysummary', DoxygenAutosummary)
     app.add_directive('autodoxyenum', DoxygenAutoEnum)
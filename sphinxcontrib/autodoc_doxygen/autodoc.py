@@ -1,12 +1,108 @@
 from __future__ import print_function, absolute_import, division
 
+import functools
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 from six import itervalues
 from lxml import etree as ET
-from sphinx.ext.autodoc import Documenter, members_option, ALL
+from docutils.parsers.rst import directives
+import sphinx
+from sphinx.ext.autodoc import Documenter, inherited_members_option, members_option, ALL
 from sphinx.errors import ExtensionError
 
-from . import get_doxygen_root
-from .xmlutils import format_xml_paragraph
+from . import get_doxygen_index, note_doxygen_compound
+from .index import DESCRIPTION_TAGS, split_signature
+from .profiling import profiled
+from .xmlutils import format_xml_paragraph, ref_name
+
+
+# classes with at least this many members have the text of their members
+# precomputed by a pool of `autodoc_doxygen_member_jobs` threads
+PARALLEL_MEMBERS = 64
+
+
+def extension_version():
+    """A digest of the code and templates of the extension (and of the sphinx
+    version), which the cached reST of the documenters is checked against, so
+    that it is generated again by any other version of the extension.
+    """
+    if extension_version.digest is None:
+        h = hashlib.sha1(sphinx.__display_version__.encode('utf-8'))
+        root = os.path.dirname(os.path.abspath(__file__))
+        for dirpath, dirnames, filenames in sorted(os.walk(root)):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.endswith(('.py', '.rst')):
+                    with open(os.path.join(dirpath, filename), 'rb') as f:
+                        h.update(f.read())
+        extension_version.digest = h.hexdigest()
+    return extension_version.digest
+extension_version.digest = None
+
+
+def _option_value(value):
+    # a hashable value of a directive option, the same in every process
+    if value is ALL:
+        return 'ALL'
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(value))
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+def merge_generated_rest(app, env, docnames, other):
+    """Merge the reST cached by a parallel reader (see `DoxygenDocumenter.generate`)."""
+    if hasattr(other, 'doxygen_rest'):
+        if not hasattr(env, 'doxygen_rest'):
+            env.doxygen_rest = {}
+        env.doxygen_rest.update(other.doxygen_rest)
+    if hasattr(other, 'doxygen_rest_used'):
+        if not hasattr(env, 'doxygen_rest_used'):
+            env.doxygen_rest_used = {}
+        for docname in docnames:
+            if docname in other.doxygen_rest_used:
+                env.doxygen_rest_used[docname] = other.doxygen_rest_used[docname]
+
+
+def purge_generated_rest(app, env, docname):
+    if hasattr(env, 'doxygen_rest_used'):
+        env.doxygen_rest_used.pop(docname, None)
+
+
+def prune_generated_rest(app, env, added, changed, removed):
+    """Drop the reST cached by other versions of the extension."""
+    if hasattr(env, 'doxygen_rest'):
+        version = extension_version()
+        for key in [k for k, entry in env.doxygen_rest.items() if entry[1] != version]:
+            del env.doxygen_rest[key]
+    return []
+
+
+def prune_unused_rest(app, env):
+    """Once the documents are read, drop the reST cached for the objects that
+    no document documents any more.
+    """
+    if hasattr(env, 'doxygen_rest'):
+        used = set()
+        for keys in getattr(env, 'doxygen_rest_used', {}).values():
+            used.update(keys)
+        for key in [k for k in env.doxygen_rest if k not in used]:
+            del env.doxygen_rest[key]
+
+
+def precomputable(func):
+    """Decorator for the documenter methods that only turn the XML into text,
+    so that `DoxygenDocumenter.precompute` can run them ahead of `generate`.
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if self._precomputed is not None and func.__name__ in self._precomputed:
+            return self._precomputed[func.__name__]
+        return func(self, *args, **kwargs)
+    return wrapper
 
 
 class DoxygenDocumenter(Documenter):
@@ -18,9 +114,15 @@ class DoxygenDocumenter(Documenter):
     objname = None   # example: "NonbondedForce"  or "methodName"
     objpath = []     # always the empty list
     object = None    # the xml node for the object
+    overload = None  # example: "(int, double) const", if the name had an argument list
+    _precomputed = None  # see precompute()
+    # whether the generated reST only depends on the compound of the object,
+    # so that it can be cached (see generate())
+    cache_rest = True
 
     option_spec = {
         'members': members_option,
+        'project': directives.unchanged,
     }
 
     def __init__(self, directive, name, indent=u'', id=None):
@@ -28,9 +130,27 @@ class DoxygenDocumenter(Documenter):
         if id is not None:
             self.parse_id(id)
 
+    @property
+    def doxygen_index(self):
+        """The `DoxygenIndex` of the project selected by the ``:project:`` option."""
+        return get_doxygen_index(self.options.project)
+
     def parse_id(self, id):
         return False
 
+    def precompute(self):
+        """Compute the name, signature and docs of an object set by `parse_id`,
+        which `generate` then uses instead of computing them. This only reads
+        the XML, so it can run in a worker thread.
+        """
+        if self.object is None:
+            return
+        self._precomputed = {
+            'format_name': self.format_name(),
+            'format_signature': self.format_signature(),
+            'get_doc': self.get_doc(),
+        }
+
     def parse_name(self):
         """Determine what module to import and what attribute to document.
         Returns True and sets *self.modname*, *self.objname*, *self.fullname*,
@@ -43,7 +163,8 @@ class DoxygenDocumenter(Documenter):
 
         # methods in the superclass sometimes use '.' to join namespace/class
         # names with method names, and we don't want that.
-        self.name = self.name.replace('.', '::')
+        name, self.overload = split_signature(self.name)
+        self.name = name.replace('.', '::')
         self.fullname = self.name
         self.modname = self.fullname
         self.objpath = []
@@ -56,6 +177,115 @@ class DoxygenDocumenter(Documenter):
 
         return True
 
+    @profiled
+    def generate(self, more_content=None, real_modname=None, check_module=False, all_members=False):
+        """Generate the reST of the object, or replay the reST generated for it
+        by a previous directive (of this build or of a previous one), if the
+        XML of its compound did not change since, and its references still
+        link to the same names.
+
+        The reST is cached in the environment, by objtype, doxygen id, options
+        and indentation, along with the digest of the compound, the names of
+        the references (see `_ref_names`) and the `extension_version`. The
+        lines located in the document of the directive are replayed in the
+        current one. The documents note the entries they use, and the others
+        are dropped once the documents are read (see `prune_unused_rest`).
+        """
+        key = digest = None
+        resolved = False
+        if self.cache_rest and not more_content and self.env.config.autodoc_doxygen_cache_rest:
+            resolved = self.object is None
+            key, digest = self._cache_key(all_members)
+            resolved = resolved and self.object is not None
+        if key is not None:
+            if not hasattr(self.env, 'doxygen_rest_used'):
+                self.env.doxygen_rest_used = {}
+            self.env.doxygen_rest_used.setdefault(self.env.docname, set()).add(key)
+            entry = getattr(self.env, 'doxygen_rest', {}).get(key)
+            if entry is not None and entry[:2] == (digest, extension_version()) and \
+                    self._same_refs(entry[2]):
+                document = self._document_source()
+                for line, source, offset in entry[3]:
+                    self.directive.result.append(line, document + source if source.startswith(':') else source,
+                                                 offset)
+                self.note_compounds()
+                return
+
+        start = len(self.directive.result)
+        if resolved:
+            # `_cache_key` already parsed and looked the name up
+            self.parse_name = self.import_object = lambda: True
+        try:
+            super(DoxygenDocumenter, self).generate(more_content, real_modname, check_module, all_members)
+        finally:
+            if resolved:
+                del self.parse_name, self.import_object
+        self.note_compounds()
+        if key is not None:
+            # the lines located in this document are cached without its path
+            document = self._document_source() + ':'
+            result = self.directive.result
+            lines = []
+            for line, (source, offset) in zip(result.data[start:], result.items[start:]):
+                if source.startswith(document):
+                    source = source[len(document) - 1:]
+                lines.append((line, source, offset))
+            if not hasattr(self.env, 'doxygen_rest'):
+                self.env.doxygen_rest = {}
+            self.env.doxygen_rest[key] = (digest, extension_version(), self._ref_names(), lines)
+
+    def _cache_key(self, all_members):
+        """Get the key of the object in the reST cache, and the digest of its
+        compound, resolving the object if it wasn't by `parse_id`.
+        """
+        if self.object is None and (not self.parse_name() or not self.import_object()):
+            return None, None
+        compound = self.object if self.object.tag == 'compounddef' else \
+            next(self.object.iterancestors('compounddef'), None)
+        if compound is None or self.object.get('id') is None:
+            return None, None
+        options = tuple(sorted((name, _option_value(value)) for name, value in self.options.items()))
+        key = (self.objtype, self.object.get('id'), options, self.indent, bool(all_members))
+        return key, self.doxygen_index.digest(compound)
+
+    def _rest_elements(self):
+        """The elements whose XML the generated reST is made from."""
+        return [self.object]
+
+    def _ref_names(self):
+        """Get the ``(refid, name)`` of the references in the XML of the object
+        (see `_rest_elements`), with the name they link to (see `ref_name`),
+        which the generated reST depends on as well.
+        """
+        index = self.doxygen_index
+        refids = set()
+        for element in self._rest_elements():
+            refids.update(ref.get('refid') for ref in element.iter('ref'))
+            if index.lazy_descriptions:
+                # the tree only has the byte ranges of the descriptions
+                for node in element.iter(*DESCRIPTION_TAGS):
+                    description = index.description(node.getparent(), node.tag)
+                    if description is not node:
+                        refids.update(ref.get('refid') for ref in description.iter('ref'))
+        return tuple((refid, ref_name(index, refid)) for refid in sorted(refids))
+
+    def _same_refs(self, refs):
+        index = self.doxygen_index
+        return all(ref_name(index, refid) == name for refid, name in refs)
+
+    def _document_source(self):
+        return self.env.doc2path(self.env.docname)
+
+    def get_sourcename(self):
+        # the docstrings are located in the document of the directive
+        return '%s:docstring of %s' % (self._document_source(), self.fullname)
+
+    def note_compounds(self):
+        """Record the compounds the generated reST depends on (see
+        `note_doxygen_compound`).
+        """
+        note_doxygen_compound(self.env, self.doxygen_index, self.object)
+
     def add_directive_header(self, sig):
         """Add the directive header and options to the generated content."""
         domain = getattr(self, 'domain', 'cpp')
@@ -95,6 +325,13 @@ class DoxygenDocumenter(Documenter):
             documenter = classes[-1](self.directive, mname, indent=self.indent, id=member.get('id'))
             memberdocumenters.append((documenter, isattr))
 
+        jobs = self.env.config.autodoc_doxygen_member_jobs
+        if jobs > 1 and len(memberdocumenters) >= PARALLEL_MEMBERS:
+            # the output is still generated in order, by this thread
+            self.doxygen_index  # initialize it before the threads need it
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                list(pool.map(lambda d: d[0].precompute(), memberdocumenters))
+
         for documenter, isattr in memberdocumenters:
             documenter.generate(
                 all_members=True, real_modname=self.real_modname,
@@ -104,17 +341,20 @@ class DoxygenDocumenter(Documenter):
         self.env.temp_data['autodoc:module'] = None
         self.env.temp_data['autodoc:class'] = None
 
+    @precomputable
     def get_doc(self):
-        detaileddescription = self.object.find('detaileddescription')
-        doc = [format_xml_paragraph(detaileddescription)]
+        detaileddescription = self.doxygen_index.description(self.object, 'detaileddescription')
+        if detaileddescription is None:
+            return []
+        doc = [format_xml_paragraph(detaileddescription, self.doxygen_index)]
         return doc
 
     def get_brief(self):
-        briefdescription = self.object.find('briefdescription')
+        briefdescription = self.doxygen_index.description(self.object, 'briefdescription')
         if briefdescription is None:
             return None
 
-        brief = [format_xml_paragraph(briefdescription)]
+        brief = [format_xml_paragraph(briefdescription, self.doxygen_index)]
         return brief
 
 
@@ -127,6 +367,8 @@ class DoxygenClassDocumenter(DoxygenDocumenter):
 
     option_spec = {
         'members': members_option,
+        'inherited-members': inherited_members_option,
+        'project': directives.unchanged,
     }
 
     @classmethod
@@ -134,8 +376,14 @@ class DoxygenClassDocumenter(DoxygenDocumenter):
         # this method is only called from Documenter.document_members
         # when a higher level documenter (module or namespace) is trying
         # to choose the appropriate documenter for each of its lower-level
-        # members. Currently not implemented since we don't have a higher-level
-        # doumenter like a DoxygenNamespaceDocumenter.
+        # members. The classes are members of a DoxygenNamespaceDocumenter.
+        return (isinstance(parent, DoxygenNamespaceDocumenter) and ET.iselement(member) and
+                member.tag == 'compounddef' and member.get('kind') in ('class', 'struct'))
+
+    def parse_id(self, id):
+        match = self.doxygen_index.find_id(id)
+        if match is not None and match.tag == 'compounddef':
+            self.object = match
         return False
 
     def import_object(self):
@@ -145,33 +393,59 @@ class DoxygenClassDocumenter(DoxygenDocumenter):
 
         Returns True if successful, False if an error occurred.
         """
-        xpath_query = './/compoundname[text()="%s"]/..' % self.fullname
-        match = get_doxygen_root().xpath(xpath_query)
-        if len(match) != 1:
-            raise ExtensionError('[autodoc_doxygen] could not find class (fullname="%s"). I tried'
-                                 'the following xpath: "%s"' % (self.fullname, xpath_query))
+        if ET.iselement(self.object):
+            return True  # set by parse_id()
+        match = self.doxygen_index.find_compound(self.fullname)
+        if match is None:
+            raise ExtensionError('[autodoc_doxygen] could not find class (fullname="%s")' % self.fullname)
 
-        self.object = match[0]
+        self.object = match
         return True
 
-    def format_signaure(self):
+    def format_signature(self):
         return ''
 
     def format_name(self):
         return self.fullname
 
     def get_object_members(self, want_all):
-        all_members = self.object.xpath('.//sectiondef[@kind="public-func" '
-            'or @kind="public-static-func"]/memberdef[@kind="function"]')
+        all_members = [(m.find('name').text, m) for m in self.object.xpath(
+            './/sectiondef[@kind="public-func" or @kind="public-static-func"]/memberdef[@kind="function"]')]
+        if self.options.inherited_members:
+            # a lookup in the table precomputed by the index
+            all_members += self.doxygen_index.inherited_members(self.object.findtext('compoundname'))
 
         if want_all:
-            return False, ((m.find('name').text, m) for m in all_members)
+            return False, all_members
         else:
             if not self.options.members:
                 return False, []
             else:
-                return False, ((m.find('name').text, m) for m in all_members
-                               if m.find('name').text in self.options.members)
+                return False, ((name, m) for name, m in all_members if name in self.options.members)
+
+    def _ancestor_compounds(self):
+        # the compounds of the inherited methods, which are documented too
+        if not self.options.inherited_members:
+            return []
+        index = self.doxygen_index
+        compounds = [index.find_compound(name) for name in index.ancestors(self.object.findtext('compoundname'))]
+        return [compound for compound in compounds if compound is not None]
+
+    def _cache_key(self, all_members):
+        key, digest = super(DoxygenClassDocumenter, self)._cache_key(all_members)
+        if key is not None and self.options.inherited_members:
+            index = self.doxygen_index
+            digest = '+'.join([digest] + [index.digest(compound) for compound in self._ancestor_compounds()])
+        return key, digest
+
+    def _rest_elements(self):
+        return [self.object] + self._ancestor_compounds()
+
+    def note_compounds(self):
+        super(DoxygenClassDocumenter, self).note_compounds()
+        if self.object is not None:
+            for compound in self._ancestor_compounds():
+                note_doxygen_compound(self.env, self.doxygen_index, compound)
 
     def filter_members(self, members, want_all):
         ret = []
@@ -190,6 +464,8 @@ class DoxygenMethodDocumenter(DoxygenDocumenter):
     directivetype = 'function'
     domain = 'cpp'
     priority = 100
+    # the kinds of sectiondef the methods are looked up in
+    sections = ('public-func', 'public-static-func')
 
     @classmethod
     def can_document_member(cls, member, membername, isattr, parent):
@@ -198,11 +474,9 @@ class DoxygenMethodDocumenter(DoxygenDocumenter):
         return False
 
     def parse_id(self, id):
-        xp = './/*[@id="%s"]' % id
-        match = get_doxygen_root().xpath(xp)
-        if len(match) > 0:
-            match = match[0]
-            self.fullname = match.find('./definition').text.split()[-1]
+        match = self.doxygen_index.find_id(id)
+        if match is not None:
+            self.fullname = self.doxygen_index.declaration(match).name
             self.modname = self.fullname
             self.objname = match.find('./name').text
             self.object = match
@@ -215,45 +489,226 @@ class DoxygenMethodDocumenter(DoxygenDocumenter):
             # classname or method name
             return True
 
-        xpath_query = ('.//compoundname[text()="%s"]/../sectiondef[@kind="public-func"]'
-                       '/memberdef[@kind="function"]/name[text()="%s"]/..') % tuple(self.fullname.rsplit('::', 1))
-        match = get_doxygen_root().xpath(xpath_query)
+        modname, objname = self.fullname.rsplit('::', 1)
+        if self.overload is not None:
+            match = self.doxygen_index.find_overload(modname, objname, self.overload)
+            if match is None:
+                raise ExtensionError('[autodoc_doxygen] could not find method (modname="%s", objname="%s") '
+                                     'with the arguments %s' % (modname, objname, self.overload))
+            self.object = match
+            return True
+
+        match = self.doxygen_index.find_members(modname, objname, kind='function',
+                                                sections=self.sections) or \
+            self.doxygen_index.find_inherited(modname, objname)
         if len(match) == 0:
-            raise ExtensionError('[autodoc_doxygen] could not find method (modname="%s", objname="%s"). I tried '
-                                 'the following xpath: "%s"' % (tuple(self.fullname.rsplit('::', 1)) + (xpath_query,)))
+            raise ExtensionError('[autodoc_doxygen] could not find method (modname="%s", objname="%s")'
+                                 % (modname, objname))
         self.object = match[0]
         return True
 
-    def format_name(self):
-        def text(el):
-            if el.text is not None:
-                return el.text
-            return ''
-
-        def tail(el):
-            if el.tail is not None:
-                return el.tail
-            return ''
-
-        rtype_el = self.object.find('type')
-        rtype_el_ref = rtype_el.find('ref')
-        if rtype_el_ref is not None:
-            rtype = text(rtype_el) + text(rtype_el_ref) + tail(rtype_el_ref)
-        else:
-            rtype = rtype_el.text
+    @property
+    def declaration(self):
+        """The `Declaration` of the method, precomputed by the index."""
+        return self.doxygen_index.declaration(self.object)
 
-        signame = (rtype and (rtype + ' ') or '') + self.objname
+    @precomputable
+    def format_name(self):
+        rtype = self.declaration.rtype
+        signame = (rtype and (rtype + ' ') or '') + self.declared_name()
         return self.format_template_name() + signame
 
+    def declared_name(self):
+        # methods are declared inside their class
+        return self.objname
+
     def format_template_name(self):
-        types = [e.text for e in self.object.findall('templateparamlist/param/type')]
-        if len(types) == 0:
-            return ''
-        return 'template <%s>\n' % ','.join(types)
+        # on the same line: the lines of a directive header are separate signatures
+        return self.declaration.template
 
+    @precomputable
     def format_signature(self):
-        args = self.object.find('argsstring').text
-        return args
+        return self.declaration.args
+
+    def document_members(self, all_members=False):
+        pass
+
+
+class DoxygenNamespaceDocumenter(DoxygenDocumenter):
+    """Document the classes, functions, enums and typedefs of a namespace.
+
+    The namespace itself is not a cpp domain object: only its description is
+    added, and its members are declared with their qualified names. They come
+    from `DoxygenIndex.namespace_members`, in one pass over the namespace.
+    """
+    objtype = 'doxynamespace'
+    domain = 'cpp'
+    priority = 100
+    content_indent = u''
+    # the members are in other compounds: they are cached by their own documenters
+    cache_rest = False
+
+    option_spec = {
+        'members': members_option,
+        'project': directives.unchanged,
+    }
+
+    # the order in which the kinds of members are documented
+    member_kinds = ('class', 'typedef', 'enum', 'function')
+
+    @classmethod
+    def can_document_member(cls, member, membername, isattr, parent):
+        return False
+
+    def import_object(self):
+        match = self.doxygen_index.find_compound(self.fullname)
+        if match is None or match.get('kind') != 'namespace':
+            raise ExtensionError('[autodoc_doxygen] could not find namespace (fullname="%s")' % self.fullname)
+
+        self.object = match
+        return True
+
+    def format_signature(self):
+        return ''
+
+    def add_directive_header(self, sig):
+        pass
+
+    def get_object_members(self, want_all):
+        if not want_all and not self.options.members:
+            return False, []
+        members = self.doxygen_index.namespace_members(self.fullname)
+        ret = []
+        for kind in self.member_kinds:
+            for member in members[kind]:
+                if kind == 'class':
+                    name = member.findtext('compoundname')
+                else:
+                    name = '%s::%s' % (self.fullname, member.findtext('name'))
+                if want_all or name.rsplit('::', 1)[-1] in self.options.members:
+                    ret.append((name, member))
+        return False, ret
+
+    def filter_members(self, members, want_all):
+        ret = []
+        for (membername, member) in members:
+            ret.append((membername, member, False))
+        return ret
+
+
+class DoxygenFunctionDocumenter(DoxygenMethodDocumenter):
+    """Document a function of a namespace (e.g. "OpenMM::foo")."""
+    objtype = 'doxyfunction'
+    priority = DoxygenMethodDocumenter.priority + 1
+    sections = ('func',)
+
+    @classmethod
+    def can_document_member(cls, member, membername, isattr, parent):
+        return isinstance(parent, DoxygenNamespaceDocumenter) and \
+            super(DoxygenFunctionDocumenter, cls).can_document_member(member, membername, isattr, parent)
+
+    def parse_id(self, id):
+        super(DoxygenFunctionDocumenter, self).parse_id(id)
+        if self.object is not None:
+            compound = next(self.object.iterancestors('compounddef'))
+            self.fullname = self.modname = '%s::%s' % (compound.findtext('compoundname'), self.objname)
+        return False
+
+    def declared_name(self):
+        # the functions are declared outside of their namespace
+        return self.fullname
+
+
+class DoxygenEnumDocumenter(DoxygenDocumenter):
+    """Document an enum of a namespace, with its enumerators.
+
+    This is only used by `DoxygenNamespaceDocumenter`: ``autodoxyenum`` is
+    the `~.autosummary.DoxygenAutoEnum` table of the values.
+    """
+    objtype = 'doxyenum'
+    domain = 'cpp'
+    priority = 100
+
+    @classmethod
+    def can_document_member(cls, member, membername, isattr, parent):
+        return (isinstance(parent, DoxygenNamespaceDocumenter) and ET.iselement(member) and
+                member.tag == 'memberdef' and member.get('kind') == 'enum')
+
+    def parse_id(self, id):
+        match = self.doxygen_index.find_id(id)
+        if match is not None and match.tag == 'memberdef':
+            self.object = match
+        return False
+
+    def import_object(self):
+        if ET.iselement(self.object):
+            return True
+        modname, objname = self.fullname.rsplit('::', 1)
+        match = self.doxygen_index.find_members(modname, objname, kind='enum')
+        if len(match) == 0:
+            raise ExtensionError('[autodoc_doxygen] could not find enum (modname="%s", objname="%s")'
+                                 % (modname, objname))
+        self.object = match[0]
+        return True
+
+    @property
+    def directivetype(self):
+        return 'enum-class' if self.object.get('strong') == 'yes' else 'enum'
+
+    def format_name(self):
+        compound = next(self.object.iterancestors('compounddef'))
+        return '%s::%s' % (compound.findtext('compoundname'), self.object.findtext('name'))
+
+    def format_signature(self):
+        return ''
+
+    def document_members(self, all_members=False):
+        sourcename = self.get_sourcename()
+        indent = self.indent
+        for value in self.object.iterchildren('enumvalue'):
+            initializer = (value.findtext('initializer') or '').strip()
+            if initializer and not initializer.startswith('='):
+                initializer = '= ' + initializer
+            self.add_line(u'', sourcename)
+            self.add_line(u'.. cpp:enumerator:: %s%s' % (
+                value.findtext('name'), ' ' + initializer if initializer else ''), sourcename)
+            self.indent = indent + u'   '
+            for node in ('briefdescription', 'detaileddescription'):
+                description = self.doxygen_index.description(value, node)
+                if description is not None:
+                    for line in format_xml_paragraph(description, self.doxygen_index):
+                        self.add_line(line, sourcename)
+            self.indent = indent
+
+
+class DoxygenTypedefDocumenter(DoxygenEnumDocumenter):
+    """Document a typedef (or type alias) of a namespace."""
+    objtype = 'doxytypedef'
+    directivetype = 'type'
+
+    @classmethod
+    def can_document_member(cls, member, membername, isattr, parent):
+        return (isinstance(parent, DoxygenNamespaceDocumenter) and ET.iselement(member) and
+                member.tag == 'memberdef' and member.get('kind') == 'typedef')
+
+    def import_object(self):
+        if ET.iselement(self.object):
+            return True
+        modname, objname = self.fullname.rsplit('::', 1)
+        match = self.doxygen_index.find_members(modname, objname, kind='typedef')
+        if len(match) == 0:
+            raise ExtensionError('[autodoc_doxygen] could not find typedef (modname="%s", objname="%s")'
+                                 % (modname, objname))
+        self.object = match[0]
+        return True
+
+    def format_name(self):
+        # e.g. "typedef std::vector<double> NS::Vector" or "using NS::Vector = std::vector<double>"
+        definition = self.object.findtext('definition')
+        for prefix in ('typedef ', 'using '):
+            if definition.startswith(prefix):
+                return definition[len(prefix):]
+        return definition
 
     def document_members(self, all_members=False):
         pass
@@ -1,13 +1,11 @@
 from __future__ import print_function, absolute_import, division
 
 import re
-import operator
 import posixpath
 import logging
-from functools import reduce
-from itertools import count, groupby
 
 from docutils import nodes
+from docutils.parsers.rst import directives
 from docutils.statemachine import StringList, ViewList
 from sphinx import addnodes
 from sphinx.ext.autosummary import Autosummary, autosummary_table
@@ -16,73 +14,53 @@ from sphinx.environment.adapters.toctree import TocTree
 from sphinx.util.matching import Matcher
 from sphinx.locale import __
 
-from .. import get_doxygen_root
+from .. import cpp_scope_name, get_doxygen_index, note_doxygen_compound
+from ..index import split_signature
+from ..profiling import profiled
 from ..autodoc import DoxygenMethodDocumenter, DoxygenClassDocumenter
 from ..xmlutils import format_xml_paragraph
 
 logger = logging.getLogger(__name__)
 
 
-def import_by_name(name, env=None, prefixes=None, i=0):
+def import_by_name(name, env=None, prefixes=None, i=0, project=None):
     """Get xml documentation for a class/method with a given name.
     If there are multiple classes or methods with that name, you
-    can use the `i` kwarg to pick which one.
-    """
-    if prefixes is None:
-        prefixes = [None]
-
-    if env is not None:
-        parents = env.ref_context.get('cpp:parent_key')
-        if parents is not None:
-            parent_symbols = [p[0].get_display_string() for p in parents]
-            prefixes.append('::'.join(parent_symbols))
+    can use the `i` kwarg to pick which one. The name is looked up
+    in the index of the doxygen *project*.
 
-    tried = []
-
-    for prefix in prefixes:
-        try:
-            if prefix:
-                prefixed_name = '::'.join([prefix, name])
-            else:
-                prefixed_name = name
-            return _import_by_name(prefixed_name, i=i)
-        except ImportError:
-            tried.append(prefixed_name)
-    raise ImportError('no module named %s' % ' or '.join(tried))
-
-
-def _import_by_name(name, i=0):
-    root = get_doxygen_root()
-    name = name.replace('.', '::')
-
-    if '::' in name:
-        xpath_query = (
-            './/compoundname[text()="%s"]/../'
-            'sectiondef[@kind="public-func"]/memberdef[@kind="function"]/'
-            'name[text()="%s"]/..') % tuple(name.rsplit('::', 1))
-        m = root.xpath(xpath_query)
-        if len(m) > 0:
-            obj = m[i]
-            full_name = '.'.join(name.rsplit('::', 1))
+    The name is resolved like a C++ name (see `DoxygenIndex.resolve`) in
+    each of the *prefixes* scopes, then in the current ``cpp:namespace`` or
+    ``cpp:class`` scope of *env*.
+    """
+    index = get_doxygen_index(project)
+    scopes = [p for p in prefixes or () if p]
+    scope = _cpp_scope(env)
+    if scope:
+        scopes.append(scope)
+
+    for scope in scopes or [None]:
+        found = index.resolve(name, scope, i=i)
+        if found is not None:
+            qualified, obj = found
+            if obj.tag == 'compounddef':
+                return qualified, obj, qualified, ''
+            # members are named "NS::Cls.member", followed by their argument list if given
+            name, overload = split_signature(qualified)
+            modname, objname = name.replace('.', '::').rsplit('::', 1)
+            full_name = '.'.join((modname, objname)) + (overload or '')
             return full_name, obj, full_name, ''
 
-        xpath_query = (
-            './/compoundname[text()="%s"]/../'
-            'sectiondef[@kind="public-type"]/memberdef[@kind="enum"]/'
-            'name[text()="%s"]/..') % tuple(name.rsplit('::', 1))
-        m = root.xpath(xpath_query)
-        if len(m) > 0:
-            obj = m[i]
-            full_name = '.'.join(name.rsplit('::', 1))
-            return full_name, obj, full_name, ''
+    raise ImportError('no module named %s%s' % (name, scopes and ' in %s' % ' or '.join(scopes) or ''))
 
-    xpath_query = ('.//compoundname[text()="%s"]/..' % name)
-    m = root.xpath(xpath_query)
-    if len(m) > 0:
-        obj = m[i]
-        return (name, obj, name, '')
 
-    raise ImportError()
+def _cpp_scope(env):
+    """Get the name of the current scope of the cpp domain (set by the
+    cpp:namespace and cpp:class directives), or None.
+    """
+    if env is None:
+        return None
+    return cpp_scope_name(env.ref_context.get('cpp:parent_key'))
 
 
 def get_documenter(obj, full_name):
@@ -94,12 +72,24 @@ def get_documenter(obj, full_name):
     raise NotImplementedError(obj.tag)
 
 
+def _item_name(line):
+    """Get the name of an autodoxysummary item, including its argument list
+    if it has one, e.g. "~NS::Cls::foo(int, double) const".
+    """
+    m = re.match(r'(~?[^\s(]+(?:\([^)]*\)(?:\s*(?:const\b|volatile\b|&&|&))*)?)', line.strip())
+    return m.group(1)
+
+
 class DoxygenAutosummary(Autosummary):
+    option_spec = dict(Autosummary.option_spec, project=directives.unchanged)
+
+    @profiled
     def run(self):
         self.bridge = DocumenterBridge(self.env, self.state.document.reporter,
-                                       Options(), self.lineno, self.state)
+                                       Options(project=self.options.get('project')),
+                                       self.lineno, self.state)
 
-        names = [x.strip().split()[0] for x in self.content
+        names = [_item_name(x) for x in self.content
                  if x.strip() and re.search(r'^[~a-zA-Z_]', x.strip()[0])]
         items = self.get_items(names)
         tablenodes = self.get_table(items)
@@ -150,24 +140,29 @@ class DoxygenAutosummary(Autosummary):
         env = self.state.document.settings.env
         items = []
 
-        names_and_counts = reduce(operator.add,
-            [tuple(zip(g, count())) for _, g in groupby(names)]) # type: List[(Str, Int)]
+        # overloads are told apart by their argument lists (e.g. "foo(int)" and
+        # "foo(double)"), so a repeated name is the same object
+        seen = set()
+        for name in names:
+            if name in seen:
+                continue
+            seen.add(name)
 
-        for name, i in names_and_counts:
             display_name = name
             if name.startswith('~'):
                 name = name[1:]
-                display_name = name.split('::')[-1]
+                display_name = split_signature(name)[0].split('::')[-1]
 
             try:
-                real_name, obj, parent, modname = import_by_name(name, env=env, i=i)
+                real_name, obj, parent, modname = import_by_name(name, env=env,
+                                                                 project=self.options.get('project'))
             except ImportError:
                 logger.warning('failed to import %s' % name)
                 items.append((name, '', '', name))
                 continue
 
             self.bridge.result = StringList()  # initialize for each documenter
-            documenter = get_documenter(obj, parent)(self, real_name, id=obj.get('id'))
+            documenter = get_documenter(obj, parent)(self.bridge, real_name, id=obj.get('id'))
             if not documenter.parse_name():
                 logger.warning('failed to parse name %s' % real_name)
                 items.append((display_name, '', '', real_name))
@@ -176,6 +171,7 @@ class DoxygenAutosummary(Autosummary):
                 logger.warning('failed to import object %s' % real_name)
                 items.append((display_name, '', '', real_name))
                 continue
+            note_doxygen_compound(env, documenter.doxygen_index, documenter.object)
             if documenter.options.members and not documenter.check_module():
                 continue
             # -- Grab the signature
@@ -256,8 +252,9 @@ class DoxygenAutosummary(Autosummary):
         table, table_spec, append_row = self.get_tablespec()
         for name, sig, summary, real_name in items:
             qualifier = 'cpp:any'
-            # required for cpp autolink
-            full_name = real_name.replace('.', '::')
+            # required for cpp autolink. The cpp domain can't parse references
+            # with an argument list, so overloads link to the function name
+            full_name = split_signature(real_name.replace('.', '::'))[0]
             col1 = ':%s:`%s <%s>`' % (qualifier, name, full_name)
             col2 = summary
             append_row(col1, col2)
@@ -266,13 +263,21 @@ class DoxygenAutosummary(Autosummary):
 
 
 class DoxygenAutoEnum(DoxygenAutosummary):
+    @profiled
+    def run(self):
+        return super(DoxygenAutoEnum, self).run()
+
     def get_items(self, names):
         env = self.state.document.settings.env
         self.name = names[0]
 
-        real_name, obj, parent, modname = import_by_name(self.name, env=env)
+        project = self.options.get('project')
+        real_name, obj, parent, modname = import_by_name(self.name, env=env, project=project)
+        index = get_doxygen_index(project)
+        note_doxygen_compound(env, index, obj)
         names = [n.text for n in obj.findall('./enumvalue/name')]
-        descriptions = [format_xml_paragraph(d) for d in obj.findall('./enumvalue/detaileddescription')]
+        descriptions = [format_xml_paragraph(index.description(v, 'detaileddescription'), index)
+                        for v in obj.findall('./enumvalue') if v.find('detaileddescription') is not None]
         return zip(names, descriptions)
 
     def get_table(self, items):
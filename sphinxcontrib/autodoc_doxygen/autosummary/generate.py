@@ -1,34 +1,46 @@
 from __future__ import print_function, absolute_import, division
 
 import codecs
+import hashlib
+import json
 import os
 import re
 import sys
+from collections import Counter
 
-from jinja2 import FileSystemLoader
+from jinja2 import FileSystemBytecodeCache, FileSystemLoader, meta
 from jinja2.sandbox import SandboxedEnvironment
 from sphinx.jinja2glue import BuiltinTemplateLoader
 from sphinx.util.osutil import ensuredir
 
-from . import import_by_name
+from . import import_by_name, _item_name
+from .. import get_doxygen_index
+from ..index import member_signature
+from ..profiling import profiled
 
 
 def generate_autosummary_docs(sources, output_dir=None, suffix='.rst',
-                              base_path=None, builder=None, template_dir=None):
-
-    showed_sources = list(sorted(sources))
-    if len(showed_sources) > 20:
-        showed_sources = showed_sources[:10] + ['...'] + showed_sources[-10:]
-    print('[autosummary] generating autosummary for: %s' %
-          ', '.join(showed_sources))
-
-    if output_dir:
-        print('[autosummary] writing to %s' % output_dir)
-
-    if base_path is not None:
-        sources = [os.path.join(base_path, filename) for filename in sources]
-
-    # create our own templating environment
+                              base_path=None, builder=None, template_dir=None,
+                              cache_dir=None, shard_threshold=0, shard_size=100,
+                              inherited_members=False):
+    """Generate the stub pages of the items listed in the autodoxysummary
+    directives (with a :toctree: option) of the *sources*, then of the
+    directives in the generated pages, and so on.
+
+    If *cache_dir* is given, the compiled templates are cached there, and
+    so is the staleness key of each generated page, which covers the
+    template sources and the values rendered into it: a page generated by a
+    previous run is regenerated when its key changes.
+
+    Classes with more than *shard_threshold* methods (if it is not 0) get
+    their methods documented on separate pages of *shard_size* methods
+    each, which the page of the class lists, so that sphinx can read and
+    write them in parallel.
+
+    If *inherited_members* is True, the pages of the classes document the
+    methods they inherit as well.
+    """
+    # create our own templating environment, shared by all the rounds
     template_dirs = [os.path.join(os.path.dirname(__file__), 'templates')]
 
     if builder is not None:
@@ -39,7 +51,43 @@ def generate_autosummary_docs(sources, output_dir=None, suffix='.rst',
         if template_dir:
             template_dirs.insert(0, template_dir)
         template_loader = FileSystemLoader(template_dirs)
-    template_env = SandboxedEnvironment(loader=template_loader)
+
+    bytecode_cache = None
+    stubs = {}
+    if cache_dir is not None:
+        ensuredir(os.path.join(cache_dir, 'jinja'))
+        bytecode_cache = FileSystemBytecodeCache(os.path.join(cache_dir, 'jinja'))
+        stubs = _load_stub_keys(cache_dir)
+    template_env = SandboxedEnvironment(loader=template_loader, bytecode_cache=bytecode_cache)
+    template_digests = {}
+
+    if base_path is not None:
+        sources = [os.path.join(base_path, filename) for filename in sources]
+
+    shards = (shard_threshold, shard_size)
+
+    # descend iteratively to new files
+    while sources:
+        sources = _generate_stubs(sources, output_dir, suffix, template_env,
+                                  template_digests, stubs, shards, inherited_members)
+
+    if cache_dir is not None:
+        _save_stub_keys(cache_dir, stubs)
+
+
+def _generate_stubs(sources, output_dir, suffix, template_env, template_digests, stubs, shards,
+                    inherited_members=False):
+    """Generate the stub pages for the autodoxysummary directives in *sources*,
+    and return the list of new files.
+    """
+    showed_sources = list(sorted(sources))
+    if len(showed_sources) > 20:
+        showed_sources = showed_sources[:10] + ['...'] + showed_sources[-10:]
+    print('[autosummary] generating autosummary for: %s' %
+          ', '.join(showed_sources))
+
+    if output_dir:
+        print('[autosummary] writing to %s' % output_dir)
 
     # read
     items = find_autosummary_in_files(sources)
@@ -47,7 +95,7 @@ def generate_autosummary_docs(sources, output_dir=None, suffix='.rst',
     # keep track of new files
     new_files = []
 
-    for name, path, template_name in sorted(set(items), key=str):
+    for name, path, template_name, project in sorted(set(items), key=str):
         if path is None:
             # The corresponding autosummary:: directive did not have
             # a :toctree: option
@@ -57,52 +105,136 @@ def generate_autosummary_docs(sources, output_dir=None, suffix='.rst',
         ensuredir(path)
 
         try:
-            name, obj, parent, mod_name = import_by_name(name)
+            name, obj, parent, mod_name = import_by_name(name, project=project)
         except ImportError as e:
             print('WARNING [autosummary] failed to import %r: %s' % (name, e), file=sys.stderr)
             continue
 
         fn = os.path.join(path, name + suffix).replace('::', '.')
 
-        # skip it if it exists
-        if os.path.isfile(fn):
-            continue
-
-        new_files.append(fn)
-
         if template_name is None:
             if obj.tag == 'compounddef' and obj.get('kind') == 'class':
                 template_name = 'doxyclass.rst'
             else:
                 raise NotImplementedError('No template for %s' % obj)
 
-        with open(fn, 'w') as f:
-            template = template_env.get_template(template_name)
-            ns = {}
-            if obj.tag == 'compounddef' and obj.get('kind') == 'class':
-                ns['methods'] = [e.text for e in obj.findall('.//sectiondef[@kind="public-func"]/memberdef[@kind="function"]/name')]
-                ns['enums'] = [e.text for e in obj.findall('.//sectiondef[@kind="public-type"]/memberdef[@kind="enum"]/name')]
-                ns['objtype'] = 'class'
-            else:
-                raise NotImplementedError(obj)
+        ns = {}
+        inherited = []
+        if obj.tag == 'compounddef' and obj.get('kind') == 'class':
+            if inherited_members:
+                inherited = [m for _, m in get_doxygen_index(project).inherited_members(name)]
+                ns['inherited_members'] = True
+            ns['methods'] = _method_names(obj.findall('.//sectiondef[@kind="public-func"]/memberdef[@kind="function"]')
+                                          + inherited)
+            ns['enums'] = [e.text for e in obj.findall('.//sectiondef[@kind="public-type"]/memberdef[@kind="enum"]/name')]
+            ns['objtype'] = 'class'
+        else:
+            raise NotImplementedError(obj)
+
+        parts = name.split('::')
+        mod_name, obj_name = '::'.join(parts[:-1]), parts[-1]
+
+        ns['fullname'] = name
+        ns['module'] = mod_name
+        ns['objname'] = obj_name
+        ns['name'] = parts[-1]
+        ns['underline'] = len(name) * '='
+        ns['project'] = project
+
+        shard_threshold, shard_size = shards
+        if shard_threshold and len(sharded_memberdefs(obj, inherited)) > shard_threshold:
+            # document the methods on pages of their own, listed by the class page
+            ns['shards'] = []
+            for i, methods in enumerate(shard_methods(obj, shard_size, inherited)):
+                shard_name = '%s.methods-%d' % (fn[:-len(suffix)], i + 1)
+                title = '%s methods (%d)' % (obj_name, i + 1)
+                shard_ns = dict(ns, methods=methods, title=title, underline=len(title) * '=')
+                if _write_stub(shard_name + suffix, 'doxyclass_methods.rst', shard_ns,
+                               template_env, template_digests, stubs):
+                    new_files.append(shard_name + suffix)
+                ns['shards'].append(os.path.basename(shard_name))
+
+        if _write_stub(fn, template_name, ns, template_env, template_digests, stubs):
+            new_files.append(fn)
+
+    return new_files
+
+
+def _write_stub(fn, template_name, ns, template_env, template_digests, stubs):
+    """Render the template into the stub page *fn*, unless the page exists
+    and was generated from the same template and values. Returns True if
+    the page was written.
+    """
+    key = hashlib.sha1(repr((_template_digest(template_env, template_name, template_digests),
+                             sorted(ns.items()))).encode('utf-8')).hexdigest()
+
+    # skip it if it exists, unless we generated it from a different
+    # template or different values
+    if os.path.isfile(fn) and stubs.get(fn, key) == key:
+        return False
+
+    stubs[fn] = key
+    with open(fn, 'w') as f:
+        template = template_env.get_template(template_name)
+        rendered = template.render(**ns)
+        f.write(rendered)
+    return True
+
+
+def _template_digest(template_env, template_name, template_digests):
+    """Digest of the source of a template and of the templates it includes,
+    imports or extends.
+    """
+    if template_name not in template_digests:
+        template_digests[template_name] = ''  # guards against include cycles
+        source = template_env.loader.get_source(template_env, template_name)[0]
+        h = hashlib.sha1(source.encode('utf-8'))
+        for name in sorted(n for n in meta.find_referenced_templates(template_env.parse(source)) if n):
+            h.update(_template_digest(template_env, name, template_digests).encode('utf-8'))
+        template_digests[template_name] = h.hexdigest()
+    return template_digests[template_name]
+
+
+def _load_stub_keys(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, 'stubs.json')) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
 
-            parts = name.split('::')
-            mod_name, obj_name = '::'.join(parts[:-1]), parts[-1]
+def _save_stub_keys(cache_dir, stubs):
+    with open(os.path.join(cache_dir, 'stubs.json'), 'w') as f:
+        json.dump(stubs, f, indent=0, sort_keys=True)
 
-            ns['fullname'] = name
-            ns['module'] = mod_name
-            ns['objname'] = obj_name
-            ns['name'] = parts[-1]
-            ns['underline'] = len(name) * '='
 
-            rendered = template.render(**ns)
-            f.write(rendered)
+def _method_names(memberdefs):
+    """Get the names to list for the given function memberdefs. Overloaded
+    functions get their argument lists appended, e.g. "foo(int, double)",
+    so that each one resolves to the right overload.
+    """
+    names = [m.findtext('name') for m in memberdefs]
+    overloaded = set(name for name, n in Counter(names).items() if n > 1)
+    return [name + member_signature(m) if name in overloaded else name
+            for name, m in zip(names, memberdefs)]
+
+
+def sharded_memberdefs(compounddef, inherited=()):
+    """Get the function memberdefs documented by the method pages of a class
+    when it is sharded: its public methods, static ones included, followed
+    by the *inherited* memberdefs. The class is sharded when there are more
+    of them than the shard threshold.
+    """
+    return compounddef.xpath('sectiondef[@kind="public-func" or @kind="public-static-func"]'
+                             '/memberdef[@kind="function"]') + list(inherited)
+
 
-    # descend recursively to new files
-    if new_files:
-        generate_autosummary_docs(new_files, output_dir=output_dir,
-                                  suffix=suffix, base_path=base_path, builder=builder,
-                                  template_dir=template_dir)
+def shard_methods(compounddef, shard_size, inherited=()):
+    """Split the `sharded_memberdefs` of a class into the lists of names (see
+    `_method_names`) documented by each of its method pages.
+    """
+    methods = _method_names(sharded_memberdefs(compounddef, inherited))
+    return [methods[i:i + shard_size] for i in range(0, len(methods), shard_size)]
 
 
 def find_autosummary_in_files(filenames):
@@ -124,22 +256,24 @@ def find_autosummary_in_lines(lines, module=None, filename=None):
     """Find out what items appear in autosummary:: directives in the
     given lines.
 
-    Returns a list of (name, toctree, template) where *name* is a name
-    of an object and *toctree* the :toctree: path of the corresponding
-    autosummary directive (relative to the root of the file name), and
-    *template* the value of the :template: option. *toctree* and
-    *template* ``None`` if the directive does not have the
-    corresponding options set.
+    Returns a list of (name, toctree, template, project) where *name* is a
+    name of an object and *toctree* the :toctree: path of the corresponding
+    autosummary directive (relative to the root of the file name),
+    *template* the value of the :template: option and *project* the value
+    of the :project: option. *toctree*, *template* and *project* are
+    ``None`` if the directive does not have the corresponding options set.
     """
     autosummary_re = re.compile(r'^(\s*)\.\.\s+autodoxysummary::\s*')
     autosummary_item_re = re.compile(r'^\s+(~?[_a-zA-Z][a-zA-Z0-9_.:]*)\s*.*?')
     toctree_arg_re = re.compile(r'^\s+:toctree:\s*(.*?)\s*$')
     template_arg_re = re.compile(r'^\s+:template:\s*(.*?)\s*$')
+    project_arg_re = re.compile(r'^\s+:project:\s*(.*?)\s*$')
 
     documented = []
 
     toctree = None
     template = None
+    project = None
     in_autosummary = False
     base_indent = ""
 
@@ -158,6 +292,11 @@ def find_autosummary_in_lines(lines, module=None, filename=None):
                 template = m.group(1).strip()
                 continue
 
+            m = project_arg_re.match(line)
+            if m:
+                project = m.group(1).strip()
+                continue
+
             if line.strip().startswith(':'):
                 continue  # skip options
 
@@ -166,7 +305,7 @@ def find_autosummary_in_lines(lines, module=None, filename=None):
                 name = m.group(1).strip()
                 if name.startswith('~'):
                     name = name[1:]
-                documented.append((name, toctree, template))
+                documented.append((name, toctree, template, project))
                 continue
 
             if not line.strip() or line.startswith(base_indent + " "):
@@ -180,11 +319,13 @@ def find_autosummary_in_lines(lines, module=None, filename=None):
             base_indent = m.group(1)
             toctree = None
             template = None
+            project = None
             continue
 
     return documented
 
 
+@profiled
 def process_generate_options(app):
     genfiles = app.config.autosummary_generate
 
@@ -201,4 +342,123 @@ def process_generate_options(app):
                 for genfile in genfiles]
 
     generate_autosummary_docs(genfiles, builder=app.builder,
-                              suffix=ext, base_path=app.srcdir)
+                              suffix=ext, base_path=app.srcdir,
+                              cache_dir=os.path.join(app.doctreedir, 'autodoc_doxygen'),
+                              shard_threshold=app.config.autodoc_doxygen_shard_threshold,
+                              shard_size=app.config.autodoc_doxygen_shard_size,
+                              inherited_members=app.config.autodoc_doxygen_inherited_members)
+
+
+# the directives whose names `find_autodoxy_in_lines` collects
+AUTODOXY_DIRECTIVES = ('autodoxysummary', 'autodoxyenum', 'autodoxyclass', 'autodoxymethod',
+                       'autodoxynamespace', 'autodoxyfunction', 'autodoxytypedef')
+# the directives with the names in their content, instead of their argument
+CONTENT_DIRECTIVES = ('autodoxysummary', 'autodoxyenum')
+# the directives whose content is not reST, so holds no directives
+VERBATIM_DIRECTIVES = ('code', 'code-block', 'sourcecode', 'parsed-literal', 'math', 'raw')
+
+
+def find_autodoxy_in_files(filenames):
+    """Find out what names are documented by the autodoxy* directives of the
+    given files.
+
+    See `find_autodoxy_in_lines`.
+    """
+    documented = []
+    for filename in filenames:
+        with codecs.open(filename, 'r', encoding='utf-8',
+                         errors='ignore') as f:
+            lines = f.read().splitlines()
+            documented.extend(find_autodoxy_in_lines(lines, filename=filename))
+    return documented
+
+
+def find_autodoxy_in_lines(lines, filename=None):
+    """Find out what names appear in the autodoxy* directives (see
+    `AUTODOXY_DIRECTIVES`) in the given lines.
+
+    Returns a list of (directive, name, project, scope, filename, lineno)
+    where *directive* is the name of the directive (e.g. "autodoxyclass"),
+    *name* its argument or one of the items of its content, *project* the
+    value of its :project: option, *scope* the ``cpp:namespace`` in effect
+    and *lineno* the (1-based) line of the name. *project* and *scope* are
+    ``None`` if they are not set.
+
+    The lines of literal blocks (after a paragraph ending with ``::``), of
+    the content of `VERBATIM_DIRECTIVES` and of comments are skipped, like
+    the examples of directives they usually show.
+    """
+    directive_re = re.compile(r'^(\s*)\.\.\s+(autodoxy\w+)::\s*(.*?)\s*$')
+    verbatim_re = re.compile(r'^(\s*)\.\.\s+(?:%s)::' % '|'.join(map(re.escape, VERBATIM_DIRECTIVES)))
+    # explicit markup other than a directive, a target, a footnote, a
+    # citation or a substitution definition
+    comment_re = re.compile(r'^(\s*)\.\.(?!\s+(?:[\w:.+-]+::|_|\[|\|))(?:\s|$)')
+    literal_re = re.compile(r'^(\s*)(?!\.\.(?:\s|$))(?=\S).*::\s*$')
+    namespace_re = re.compile(r'^\s*\.\.\s+cpp:namespace(-push|-pop)?::\s*(.*?)\s*$')
+    project_arg_re = re.compile(r'^\s+:project:\s*(.*?)\s*$')
+
+    documented = []
+
+    scopes = []
+    directive = None
+    entries = []
+    project = None
+    base_indent = ""
+    # the indentation of the line starting the skipped block, if any
+    skipped = None
+
+    def flush():
+        documented.extend((directive, name, project, scopes[-1] if scopes else None, filename, lineno)
+                          for name, lineno in entries)
+
+    for lineno, line in enumerate(lines, 1):
+        if directive is not None:
+            if not line.strip():
+                continue
+            if line.startswith(base_indent + " "):
+                m = project_arg_re.match(line)
+                if m:
+                    project = m.group(1).strip()
+                elif line.strip().startswith(':'):
+                    pass  # skip options
+                elif directive in CONTENT_DIRECTIVES and \
+                        re.match(r'[~a-zA-Z_]', line.strip()):
+                    name = _item_name(line)
+                    entries.append((name[1:] if name.startswith('~') else name, lineno))
+                continue
+            flush()
+            directive = None
+
+        if skipped is not None:
+            if not line.strip() or len(line) - len(line.lstrip()) > skipped:
+                continue
+            skipped = None
+
+        m = verbatim_re.match(line) or comment_re.match(line) or literal_re.match(line)
+        if m:
+            skipped = len(m.group(1))
+            continue
+
+        m = namespace_re.match(line)
+        if m:
+            kind, name = m.groups()
+            if kind == '-pop':
+                if scopes:
+                    scopes.pop()
+            elif kind == '-push':
+                scopes.append('%s::%s' % (scopes[-1], name) if scopes and scopes[-1] else name)
+            elif name in ('NULL', 'nullptr', '0'):
+                scopes = []
+            else:
+                scopes = [name]
+            continue
+
+        m = directive_re.match(line)
+        if m and m.group(2) in AUTODOXY_DIRECTIVES:
+            base_indent, directive, argument = m.groups()
+            entries = [(argument, lineno)] if argument and directive not in CONTENT_DIRECTIVES else []
+            project = None
+
+    if directive is not None:
+        flush()
+    return documented
@@ -0,0 +1,1216 @@
+from __future__ import print_function, absolute_import, division
+
+import gzip
+import hashlib
+import mmap
+import os
+import re
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from fnmatch import fnmatchcase
+from concurrent.futures import ThreadPoolExecutor
+
+from lxml import etree as ET
+
+# Version of the on-disk index format written by `DoxygenIndex.dump`. Bump it
+# whenever the layout changes, so that stale artifacts are rejected on load.
+INDEX_FORMAT = '3'
+INDEX_TAG = 'autodoc_doxygen_index'
+
+
+def list_xml_files(xmldir):
+    """List the doxygen XML files in *xmldir*, in a deterministic order.
+    """
+    return sorted(os.path.join(xmldir, f) for f in os.listdir(xmldir)
+                  if f.lower().endswith('.xml') and not f.startswith('._'))
+
+
+# the compound kinds that names can be looked up in (see `DoxygenIndex.resolve`)
+SCOPE_KINDS = frozenset(('namespace', 'class', 'struct', 'union'))
+
+_BUILTIN_TYPES = frozenset(('int', 'char', 'double', 'float', 'long', 'short', 'bool', 'void',
+                            'unsigned', 'signed', 'wchar_t', 'auto', 'const', 'volatile'))
+
+
+def split_signature(name):
+    """Split a function name with an optional argument list into its parts.
+    example: "NS::Cls::foo(int, double) const" -> ("NS::Cls::foo", "(int, double) const")
+    The argument list is None if there is none.
+    """
+    start = 0
+    m = re.search(r'operator\s*\(\s*\)', name)
+    if m:
+        start = m.end()
+    paren = name.find('(', start)
+    if paren < 0:
+        return name.strip(), None
+    return name[:paren].strip(), name[paren:].strip()
+
+
+def normalize_signature(args):
+    """Normalize an argument list, so that overloads can be looked up by it.
+    Whitespace, parameter names and default values are dropped, and only the
+    const/volatile/reference qualifiers are kept after the argument list.
+    example: "( const Force &force, int n=0 ) const =0" -> "(const Force&, int) const"
+    """
+    args = args.strip()
+    depth = 0
+    end = len(args)
+    for pos, c in enumerate(args):
+        if c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+            if depth == 0:
+                end = pos
+                break
+    inner, tail = args[1:end], args[end + 1:]
+
+    types = [_normalize_type(t) for t in _split_top_level(inner)]
+    if types == ['void']:
+        types = []
+    qualifiers = re.findall(r'\bconst\b|\bvolatile\b|&&|&', tail.split('=')[0])
+    return '(%s)%s' % (', '.join(t for t in types if t), ''.join(' ' + q for q in qualifiers))
+
+
+def _split_top_level(args):
+    parts, depth, current = [], 0, []
+    for c in args:
+        if c in '<([':
+            depth += 1
+        elif c in '>)]':
+            depth -= 1
+        elif c == ',' and depth == 0:
+            parts.append(''.join(current))
+            current = []
+            continue
+        current.append(c)
+    parts.append(''.join(current))
+    return parts
+
+
+def _normalize_type(t):
+    if '=' in t:
+        t = t[:t.index('=')]  # drop the default value
+    tokens = re.findall(r'::|\w+|\S', t)
+    # drop the parameter name, if any
+    if (len(tokens) > 1 and re.match(r'^[A-Za-z_]\w*$', tokens[-1]) and
+            tokens[-1] not in _BUILTIN_TYPES and tokens[-2] != '::' and
+            any(tok not in ('const', 'volatile') for tok in tokens[:-1])):
+        tokens.pop()
+    # only keep the spaces between words, e.g. "unsigned int" or "const Force&"
+    out = []
+    for i, tok in enumerate(tokens):
+        if i > 0 and re.match(r'\w', tok) and re.match(r'\w', tokens[i - 1]):
+            out.append(' ')
+        out.append(tok)
+    return ''.join(out)
+
+
+def _unqualified(signature):
+    return re.sub(r'\b\w+::', '', signature)
+
+
+def member_signature(memberdef):
+    """Compute the normalized argument list (see `normalize_signature`) of a
+    function memberdef, from the types of its params and its argsstring.
+    """
+    types = []
+    for param in memberdef.iterfind('param'):
+        type = param.find('type')
+        if type is not None:
+            types.append(''.join(type.itertext()) + (param.findtext('array') or ''))
+    argsstring = memberdef.findtext('argsstring') or ''
+    return normalize_signature('(%s)%s' % (', '.join(types), argsstring[argsstring.rfind(')') + 1:]))
+
+
+# The pieces of the C++ declaration of a function memberdef: the template
+# header (e.g. "template <typename T> ", or ""), the return type, the
+# qualified name and the argsstring. The types are flattened, with the text
+# of their refs.
+# example: ("", "const Force &", "OpenMM::System::getForce", "(int index) const")
+Declaration = namedtuple('Declaration', 'template rtype name args')
+
+
+def member_declaration(memberdef, compoundname):
+    """Compute the `Declaration` of the function memberdef of the compound
+    *compoundname*.
+    """
+    types = [''.join(t.itertext()) for t in memberdef.iterfind('templateparamlist/param/type')]
+    rtype = memberdef.find('type')
+    return Declaration('template <%s> ' % ', '.join(types) if types else '',
+                       ''.join(rtype.itertext()) if rtype is not None else '',
+                       '%s::%s' % (compoundname, memberdef.findtext('name')),
+                       memberdef.findtext('argsstring') or '')
+
+
+class CompoundFilter(object):
+    """Decide which compounds to load, by compound kind (e.g. ``class`` or
+    ``namespace``) and by qualified-name glob (e.g. ``*::detail``).
+
+    An empty *include_kinds* includes every kind.
+    """
+
+    def __init__(self, include_kinds=None, exclude_names=None):
+        self.include_kinds = frozenset(include_kinds or ())
+        self.exclude_names = tuple(exclude_names or ())
+
+    def __bool__(self):
+        return bool(self.include_kinds or self.exclude_names)
+    __nonzero__ = __bool__
+
+    def __call__(self, kind, name):
+        if self.include_kinds and kind not in self.include_kinds:
+            return False
+        return not any(fnmatchcase(name, pattern) for pattern in self.exclude_names)
+
+
+def is_index_file(filename):
+    """Tell whether *filename* is an index written by `DoxygenIndex.dump`,
+    rather than doxygen XML, from its first element.
+    """
+    opener = gzip.open if filename.endswith('.gz') else open
+    try:
+        with opener(filename, 'rb') as f:
+            for event, el in ET.iterparse(f, events=('start',), huge_tree=True):
+                return el.tag == INDEX_TAG
+    except (IOError, OSError, ET.XMLSyntaxError):
+        pass
+    return False
+
+
+def select_xml_files(xmldir, compound_filter=None, refids=None, exclude_unselected=True):
+    """List the doxygen XML files in *xmldir* that contain the compounds
+    accepted by *compound_filter* and, if *refids* is given, whose ids are in
+    *refids* (see `plan_compounds`). The compounds left out of *refids* are
+    only recorded as excluded if *exclude_unselected* is set.
+
+    The compounds are looked up in doxygen's ``index.xml``, so the files of
+    the excluded compounds are never opened. Returns ``(files, excluded)``,
+    where *excluded* maps the ids of the excluded compounds and their members
+    to their qualified names. Without an ``index.xml``, every file is listed
+    and the filter is applied while merging (see `DoxygenIndex.from_xml_files`).
+
+    *xmldir* can also be a single file with the combined XML of all the
+    compounds (e.g. doxygen's ``all.xml``, made with ``combine.xslt``).
+    """
+    if os.path.isfile(xmldir):
+        return [xmldir], {}
+    index_file = os.path.join(xmldir, 'index.xml')
+    if not (compound_filter or refids is not None) or not os.path.isfile(index_file):
+        return list_xml_files(xmldir), {}
+
+    files = []
+    excluded = {}
+    for compound in ET.parse(index_file).getroot().iterfind('compound'):
+        refid = compound.get('refid')
+        name = compound.findtext('name')
+        accepted = not compound_filter or compound_filter(compound.get('kind'), name)
+        if accepted and (refids is None or refid in refids):
+            filename = os.path.join(xmldir, refid + '.xml')
+            if os.path.isfile(filename):
+                files.append(filename)
+            continue
+        if accepted and not exclude_unselected:
+            continue
+        excluded[refid] = name
+        for member in compound.iterfind('member'):
+            excluded.setdefault(member.get('refid'), '%s::%s' % (name, member.findtext('name')))
+    return sorted(files), excluded
+
+
+def settings_signature(compound_filter=None, lazy_descriptions=False):
+    """Fingerprint the index format and the filter and storage settings. An
+    index can only be refreshed from the XML files if it was built with the
+    same settings; otherwise it has to be rebuilt from scratch.
+    """
+    h = hashlib.sha1(INDEX_FORMAT.encode('utf-8'))
+    if compound_filter:
+        h.update(repr((sorted(compound_filter.include_kinds), compound_filter.exclude_names)).encode('utf-8'))
+    if lazy_descriptions:
+        h.update(b'lazy descriptions')
+    return h.hexdigest()
+
+
+def load_xml_dir(xmldir, compound_filter=None, cache=None, jobs=None, previous=None,
+                 lazy_descriptions=False, refids=None, on_demand=False):
+    """Load and index the doxygen XML output in *xmldir*. Returns None if
+    there is no XML output in *xmldir*. With *lazy_descriptions*, the
+    descriptions are not kept in the tree (see `read_xml_file`). If
+    *refids* is given, only the compounds with these ids are loaded (see
+    `select_xml_files`).
+
+    With *on_demand*, the other compounds are meant to be loaded when they
+    are looked up (see `DoxygenIndex.seed_tags`): only the compounds in
+    *refids* and those that were loaded by the previous builds are loaded
+    up front, and the others are not recorded as excluded.
+
+    If *previous* is an index of *xmldir* loaded earlier in this process, or
+    *cache* is the filename of a cached index of *xmldir*, that index is
+    brought up to date with `DoxygenIndex.refresh`, so that only the files
+    that changed since are parsed again; the cache is rewritten if anything
+    changed. The names of the compounds that were added, removed or modified
+    are left in the ``changed`` attribute of the returned index (all of them
+    if it was built from scratch).
+    """
+    signature = settings_signature(compound_filter, lazy_descriptions)
+    index = previous if previous is not None and previous.signature == signature else None
+    if index is None and cache is not None and os.path.isfile(cache):
+        try:
+            index = DoxygenIndex.load(cache)
+        except (IOError, OSError, ValueError, ET.XMLSyntaxError):
+            index = None
+        if index is not None and index.signature != signature:
+            index = None
+
+    if on_demand:
+        refids = set(refids or ())
+        if index is not None:
+            refids.update(id for source in index.sources.values() for id in source.compounds)
+    files, excluded = select_xml_files(xmldir, compound_filter, refids,
+                                       exclude_unselected=not on_demand)
+    if len(files) == 0 and refids is None:
+        return None
+    rebuilt = index is None
+    if rebuilt:
+        index = DoxygenIndex(ET.Element('root'), signature=signature,
+                             lazy_descriptions=lazy_descriptions)
+    index.cache = cache
+    index.changed = index.refresh(files, jobs=jobs, compound_filter=compound_filter, excluded=excluded)
+
+    if cache is not None and (rebuilt or index.changed):
+        if not os.path.isdir(os.path.dirname(cache)):
+            os.makedirs(os.path.dirname(cache))
+        # write to a temporary file first, so that concurrent builds never
+        # see a partially written cache
+        tmp = '%s.%d.tmp' % (cache, os.getpid())
+        index.dump(tmp)
+        os.replace(tmp, cache)
+    return index
+
+
+# What `DoxygenIndex.refresh` remembers about each XML file: its modification
+# time and size (compared first, since they are cheap), the sha1 digest of its
+# contents, the ids of the compounds it defined, and the ids it defined that
+# were filtered out.
+XmlSource = namedtuple('XmlSource', 'mtime size digest compounds excluded')
+
+
+# files larger than this (i.e. combined XML files) are parsed as they are read
+STREAM_SIZE = 16 * 1024 * 1024
+
+
+def iter_compounds(source):
+    """Parse doxygen XML from *source* (a filename or a binary file object)
+    in one streaming pass, and generate its compounddefs as soon as each one
+    is parsed. The compounds are not kept in the parsed document: move them
+    to another tree to keep them.
+    """
+    for event, compound in ET.iterparse(source, events=('end',), tag='compounddef', huge_tree=True):
+        parent = compound.getparent()
+        yield compound
+        if parent is not None and compound.getparent() is parent:
+            parent.remove(compound)
+
+
+class _HashingReader(object):
+    # a file object wrapper computing the digest of what is read through it
+    def __init__(self, f):
+        self.f = f
+        self.sha1 = hashlib.sha1()
+
+    def read(self, n=-1):
+        data = self.f.read(n)
+        self.sha1.update(data)
+        return data
+
+
+# the description elements that `read_xml_file` can leave out of the tree.
+# They never contain one another.
+DESCRIPTION_TAGS = ('briefdescription', 'detaileddescription', 'inbodydescription')
+_DESCRIPTION_RE = re.compile(
+    br'<(%s)(?:\s[^>]*)?(?:/>|>(.*?)</\1\s*>)' % '|'.join(DESCRIPTION_TAGS).encode('ascii'), re.DOTALL)
+
+
+def strip_descriptions(data):
+    """Replace the description elements (see `DESCRIPTION_TAGS`) of the doxygen
+    XML *data* (bytes, or a memory map) with placeholders recording where they
+    are, e.g. ``<detaileddescription offset="1234" length="567"/>``. Empty
+    descriptions are replaced with empty elements. Returns the new bytes.
+    """
+    pieces = []
+    end = 0
+    for match in _DESCRIPTION_RE.finditer(data):
+        pieces.append(data[end:match.start()])
+        tag = match.group(1)
+        if match.group(2) is None or not match.group(2).strip():
+            pieces.append(b'<%s/>' % tag)
+        else:
+            pieces.append(b'<%s offset="%d" length="%d"/>' % (tag, match.start(), match.end() - match.start()))
+        end = match.end()
+    pieces.append(data[end:])
+    return b''.join(pieces)
+
+
+def read_xml_file(filename, digest=None, lazy_descriptions=False):
+    """Read a doxygen XML file. Returns its `XmlSource` (without compounds)
+    and its root element, or None instead of the root element if the digest
+    of its contents is *digest*, i.e. if it did not change.
+
+    Large files are parsed in a single sequential pass, with `iter_compounds`.
+    With *lazy_descriptions*, the file is memory-mapped and the descriptions
+    are left out of the tree (see `strip_descriptions`), to be parsed from
+    the file when they are needed (see `DoxygenIndex.description`).
+    """
+    st = os.stat(filename)
+    with open(filename, 'rb') as f:
+        if lazy_descriptions and st.st_size > 0:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                source_digest = hashlib.sha1(mm).hexdigest()
+                root = None if source_digest == digest else \
+                    ET.fromstring(strip_descriptions(mm), ET.XMLParser(huge_tree=True))
+            finally:
+                mm.close()
+        elif st.st_size > STREAM_SIZE:
+            reader = _HashingReader(f)
+            root = ET.Element('doxygen')
+            for compound in iter_compounds(reader):
+                root.append(compound)
+            while reader.read(1 << 20):
+                pass  # whatever follows the document still counts in the digest
+            source_digest = reader.sha1.hexdigest()
+        else:
+            data = f.read()
+            source_digest = hashlib.sha1(data).hexdigest()
+            root = None if source_digest == digest else ET.fromstring(data, ET.XMLParser(huge_tree=True))
+    source = XmlSource(st.st_mtime_ns, st.st_size, source_digest, (), ())
+    if source.digest == digest:
+        return source, None
+    return source, root
+
+
+def read_xml_files(files, digests=None, jobs=None, lazy_descriptions=False):
+    """`read_xml_file` each of *files*, with the digest of their previous
+    contents in *digests*. Returns the list of results, in the same order as
+    *files*.
+
+    lxml releases the GIL while it parses, so the files are read by a pool of
+    *jobs* threads (default: one per CPU).
+    """
+    digests = [(digests or {}).get(f) for f in files]
+    lazy = [lazy_descriptions] * len(files)
+    if jobs == 1 or len(files) < 2:
+        return [read_xml_file(f, d, l) for f, d, l in zip(files, digests, lazy)]
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+        return list(pool.map(read_xml_file, files, digests, lazy))
+
+
+# What a doxygen tagfile tells about a compound or member: its qualified name,
+# its kind, and the id of the compound defining it.
+# example: "classOpenMM_1_1Force_1a1" -> ("OpenMM::Force::getForceGroup", "function", "classOpenMM_1_1Force")
+Tag = namedtuple('Tag', 'name kind compound')
+
+
+def read_tagfile(filename):
+    """Read a doxygen tagfile (see doxygen's ``GENERATE_TAGFILE``) in a single
+    pass. Returns a dict mapping the doxygen ids of its compounds and members
+    to their `Tag`. The ids are those of the XML output, made from the names
+    of the html files and the anchors.
+    """
+    def file_id(filename):
+        return re.sub(r'\.html?$', '', filename or '')
+
+    tags = {}
+    for event, compound in ET.iterparse(filename, tag='compound', huge_tree=True):
+        name = compound.findtext('name')
+        refid = file_id(compound.findtext('filename'))
+        if name and refid:
+            tags[refid] = Tag(name, compound.get('kind'), refid)
+            file_scope = compound.get('kind') in ('file', 'dir', 'page', 'group')
+            for member in compound.iterfind('member'):
+                anchor = member.findtext('anchor')
+                if not anchor:
+                    continue
+                id = '%s_1%s' % (file_id(member.findtext('anchorfile')), anchor)
+                if file_scope and id in tags:
+                    continue  # a member of a namespace, also listed by its file
+                tags[id] = Tag('%s::%s' % (name, member.findtext('name')), member.get('kind'), refid)
+        compound.clear()
+        while compound.getprevious() is not None:
+            del compound.getparent()[0]
+    return tags
+
+
+class DoxygenIndex(object):
+    """Lookup tables over the merged doxygen XML tree.
+
+    The tree itself is kept in *self.root* (this is what `get_doxygen_root()`
+    returns), and the tables map doxygen ids and compound names directly to
+    their elements, so that the documenters don't have to search the whole
+    tree with XPath for every lookup.
+
+    The lookups can be made from several threads: they only read the tables
+    (the `resolve` memo aside, whose entries are set atomically). The tables
+    are only modified while loading, by `refresh`, and by the lookups that
+    load a compound on demand (see `seed_tags`), under a lock.
+
+    The index is updated in place rather than replaced by an immutable
+    snapshot: an lxml element only has one parent, so a new root could not
+    share the compounds of the old one without copying the whole tree. An
+    index is only refreshed while nothing looks it up (a build refreshes the
+    index of the previous one, see `load_xml_dir`, before any document is
+    read, and `get_doxygen_index` waits for a loading in the background), so
+    the lookups only ever see compounds being loaded on demand.
+    """
+
+    def __init__(self, root, excluded=None, signature=None, lazy_descriptions=False,
+                 declarations=None):
+        self.root = root
+        self.signature = signature  # see `settings_signature`
+        # whether the descriptions are left in the XML files, see `description`
+        self.lazy_descriptions = lazy_descriptions
+        self.project = ''  # the doxygen project, if there are several
+        self.cache = None  # the file the index is cached in, see `load_xml_dir`
+        self.ids = {}        # example: "classOpenMM_1_1Force" -> <compounddef>
+        self.compounds = {}  # example: "OpenMM::Force" -> <compounddef>
+        # example: ("OpenMM::Force", "getForceGroup") -> [<memberdef>, ...]
+        self.members = {}
+        # example: ("OpenMM::System", "getForce", "(int) const") -> <memberdef>
+        self.signatures = {}
+        # the declarations of the functions, by id, computed when they are
+        # indexed and stored in the dump (see `declaration`)
+        self.declarations = declarations if declarations is not None else {}
+        # ids of the compounds (and their members) that were filtered out
+        # while loading, mapped to their qualified names
+        self.excluded = excluded if excluded is not None else {}
+        # the namespace tree: the names of the scopes (namespaces, classes...)
+        # mapped to the names of their enclosing scopes, "" being the global one.
+        # example: "OpenMM::Force" -> "OpenMM"
+        self.scopes = {}
+        # memoized `resolve` results, misses included
+        self._resolved = {}
+        # filename -> `XmlSource`, for `refresh`
+        self.sources = {}
+        # names of the compounds changed by the last `refresh` (see `load_xml_dir`)
+        self.changed = None
+        # compound id -> digest of its serialization, see `digest`
+        self._digests = {}
+        # compound id -> the file it was read from, and the digest of the
+        # file if it only defines this compound, or None (see `_source_of`)
+        self._compound_sources = None
+        # filename -> memory map of the file, for `description`
+        self._mmaps = {}
+        self._mmaps_lock = threading.Lock()
+        # memoized `namespace_members` results
+        self._namespace_members = {}
+        # the inheritance graph: the names of the classes mapped to the names
+        # of their public base classes, in declaration order.
+        # example: "OpenMM::HarmonicBondForce" -> ["OpenMM::Force"]
+        self.bases = {}
+        # memoized `ancestors` and `inherited_members` results
+        self._ancestors = {}
+        self._inherited = {}
+        # the tags of the compounds and members, by id, and the ids of the
+        # compounds that can be loaded on demand, by name (see `seed_tags`)
+        self.tags = {}
+        self._tagged = {}
+        # id -> qualified name of the tags, by qualified name, for `find_tagged`
+        self._tag_names = {}
+        self.xmldir = None
+        self.compound_filter = None
+        # names of the compounds loaded on demand
+        self.loaded_on_demand = set()
+        self._load_lock = threading.RLock()
+        self._local = threading.local()
+
+        for compound in root.iter('compounddef'):
+            self.add_compound(compound)
+
+    def add_compound(self, compound):
+        self._clear_memos()
+        name = compound.findtext('compoundname')
+        if name is not None:
+            self.compounds.setdefault(name, compound)
+            if compound.get('kind') in ('class', 'struct') and self.compounds[name] is compound:
+                self.bases[name] = [ref.text.strip() for ref in compound.iterchildren('basecompoundref')
+                                    if ref.get('prot') == 'public' and ref.text]
+            if compound.get('kind') in SCOPE_KINDS:
+                # the enclosing scopes are added too, in case their own
+                # compounds were filtered out
+                scope = name
+                while scope and scope not in self.scopes:
+                    self.scopes[scope] = _parent_scope(scope)
+                    scope = self.scopes[scope]
+        for el in compound.iter('compounddef', 'memberdef', 'enumvalue'):
+            id = el.get('id')
+            if id is not None:
+                self.ids.setdefault(id, el)
+        if name is None:
+            return
+        for member in compound.iterfind('sectiondef/memberdef'):
+            key = (name, member.findtext('name'))
+            self.members.setdefault(key, []).append(member)
+            if member.get('kind') == 'function':
+                self.signatures.setdefault(key + (member_signature(member),), member)
+                if member.get('id') not in self.declarations:
+                    self.declarations[member.get('id')] = member_declaration(member, name)
+
+    def remove_compound(self, compound):
+        """Remove a compounddef from the tree and from the lookup tables, the
+        inverse of appending it to the tree and calling `add_compound`.
+        """
+        self._clear_memos()
+        name = compound.findtext('compoundname')
+        if self.compounds.get(name) is compound:
+            del self.compounds[name]
+            self.bases.pop(name, None)
+            # the scope stays in the tree: looking names up in it is harmless
+        for el in compound.iter('compounddef', 'memberdef', 'enumvalue'):
+            if self.ids.get(el.get('id')) is el:
+                del self.ids[el.get('id')]
+        for member in compound.iterfind('sectiondef/memberdef'):
+            key = (name, member.findtext('name'))
+            members = [m for m in self.members.get(key, ()) if m is not member]
+            if members:
+                self.members[key] = members
+            else:
+                self.members.pop(key, None)
+            if member.get('kind') == 'function':
+                signature = key + (member_signature(member),)
+                if self.signatures.get(signature) is member:
+                    del self.signatures[signature]
+                self.declarations.pop(member.get('id'), None)
+        if compound.getparent() is not None:
+            compound.getparent().remove(compound)
+
+    def seed_tags(self, tags, xmldir, compound_filter=None):
+        """Seed the index with the *tags* of a doxygen tagfile (see
+        `read_tagfile`) of the XML output in *xmldir*.
+
+        The compounds of the tags that are not loaded are then loaded from
+        *xmldir* when a directive looks them up, by name, with
+        `find_compound`, `find_members`, `find_overload`, `resolve`... or as
+        the bases of a class or the classes of a namespace. Looking up an id
+        with `find_id` does not load anything: the references to the other
+        compounds and members are resolved with `find_tag` instead.
+        """
+        self.tags = tags
+        self.xmldir = xmldir
+        self.compound_filter = compound_filter
+        self._tagged = {}
+        self._tag_names = {}
+        for id, tag in tags.items():
+            if tag.compound in self.excluded or id in self.excluded:
+                continue
+            self._tag_names.setdefault(tag.name, id)
+            if id == tag.compound:
+                self._tagged.setdefault(tag.name, id)
+                if tag.kind in SCOPE_KINDS:
+                    scope = tag.name
+                    while scope and scope not in self.scopes:
+                        self.scopes[scope] = _parent_scope(scope)
+                        scope = self.scopes[scope]
+        self._clear_memos()
+
+    @contextmanager
+    def without_loading(self):
+        """Context manager in which the lookups of this thread only see the
+        compounds already loaded.
+        """
+        self._local.no_loading = True
+        try:
+            yield
+        finally:
+            self._local.no_loading = False
+
+    def _load_tagged(self, name):
+        """Load the compound called *name* on demand, if it is tagged and not
+        loaded yet (see `seed_tags`).
+        """
+        if name in self.compounds or name not in self._tagged or \
+                getattr(self._local, 'no_loading', False):
+            return
+        with self._load_lock:
+            refid = self._tagged.get(name)
+            if refid is None or name in self.compounds:
+                return
+            try:
+                self._load_tagged_file(os.path.join(self.xmldir, refid + '.xml'))
+            finally:
+                # only once it is loaded, so that the lookups of the other
+                # threads wait for it instead of missing it
+                self._tagged.pop(name, None)
+
+    def _load_tagged_file(self, filename):
+        if not os.path.isfile(filename):
+            return
+        source, file_root = read_xml_file(filename, lazy_descriptions=self.lazy_descriptions)
+        nodes = []
+        filtered = {}
+        for node in file_root.iterchildren('compounddef'):
+            compoundname = node.findtext('compoundname')
+            if self.compound_filter and not self.compound_filter(node.get('kind'), compoundname):
+                _record_excluded(node, compoundname, filtered)
+            else:
+                nodes.append(node)
+        # the source is recorded before the compounds can be looked up,
+        # so that `_source_of` knows them
+        self.excluded.update(filtered)
+        self.sources[filename] = source._replace(compounds=tuple(node.get('id') for node in nodes),
+                                                 excluded=tuple(sorted(filtered)))
+        self._compound_sources = None
+        for node in nodes:
+            self.root.append(node)
+            self.add_compound(node)
+            self.loaded_on_demand.add(node.findtext('compoundname'))
+
+    def find_tag(self, id):
+        """Get the qualified name of a tagged compound or member that is not
+        loaded (see `seed_tags`), or None.
+        """
+        tag = self.tags.get(id)
+        return tag.name if tag is not None else None
+
+    def find_tagged(self, name, scope=None):
+        """Resolve the (possibly partially qualified) *name* used in *scope*
+        like `resolve`, among the tags, without loading anything. Returns the
+        `Tag` of the match, or None.
+        """
+        for prefix in self.scope_chain(scope):
+            id = self._tag_names.get('%s::%s' % (prefix, name) if prefix else name)
+            if id is not None:
+                return self.tags[id]
+        return None
+
+    def _clear_memos(self):
+        self._resolved.clear()
+        self._digests.clear()
+        self._namespace_members.clear()
+        self._ancestors.clear()
+        self._inherited.clear()
+
+    def refresh(self, files, jobs=None, compound_filter=None, excluded=None):
+        """Bring the index up to date with the doxygen XML *files*, in place.
+
+        Files whose modification time and size are unchanged since the last
+        refresh are skipped, and so are files whose contents have the same
+        digest. The compounds of the other files are removed from the tree
+        and the lookup tables, and the compounds they define now are parsed
+        and spliced in; so are the compounds of new files, while those of the
+        files that are gone are dropped. Compounds rejected by
+        *compound_filter* are left out, and their ids are recorded in
+        ``self.excluded`` along with the ids in *excluded* (those the caller
+        filtered out, see `select_xml_files`).
+
+        Returns the set of the names of the compounds that were added,
+        removed or modified.
+        """
+        with self._load_lock:
+            return self._refresh(files, jobs, compound_filter, excluded)
+
+    def _refresh(self, files, jobs, compound_filter, excluded):
+        changed = set()
+        sources = {}
+        stale = []
+        for filename in files:
+            source = self.sources.get(filename)
+            st = os.stat(filename)
+            if source is not None and (source.mtime, source.size) == (st.st_mtime_ns, st.st_size):
+                sources[filename] = source
+            else:
+                stale.append(filename)
+
+        digests = dict((f, self.sources[f].digest) for f in stale if f in self.sources)
+        self.close_files()  # the stale ones are about to be read again
+        for filename, (source, file_root) in zip(stale, read_xml_files(stale, digests, jobs,
+                                                                        self.lazy_descriptions)):
+            if file_root is None:
+                # touched, but not modified
+                old = self.sources[filename]
+                sources[filename] = source._replace(compounds=old.compounds, excluded=old.excluded)
+                continue
+            if filename in self.sources:
+                changed.update(self._remove_source(self.sources[filename]))
+            ids = []
+            filtered = {}
+            for node in file_root.iterchildren('compounddef'):
+                name = node.findtext('compoundname')
+                if compound_filter and not compound_filter(node.get('kind'), name):
+                    _record_excluded(node, name, filtered)
+                    continue
+                self.root.append(node)
+                self.add_compound(node)
+                ids.append(node.get('id'))
+                changed.add(name)
+            self.excluded.update(filtered)
+            sources[filename] = source._replace(compounds=tuple(ids), excluded=tuple(sorted(filtered)))
+
+        for filename in set(self.sources) - set(sources):
+            changed.update(self._remove_source(self.sources[filename]))
+
+        # the ids filtered out by the caller, plus those filtered out while
+        # merging the files that are still there
+        excluded = dict(excluded) if excluded is not None else {}
+        for source in sources.values():
+            for id in source.excluded:
+                if id in self.excluded:
+                    excluded.setdefault(id, self.excluded[id])
+        self.sources = sources
+        self.excluded = excluded
+        self._digests.clear()
+        self._compound_sources = None
+        changed.discard(None)
+        return changed
+
+    def _remove_source(self, source):
+        names = []
+        for id in source.compounds:
+            compound = self.ids.get(id)
+            if compound is not None and compound.tag == 'compounddef':
+                names.append(compound.findtext('compoundname'))
+                self.remove_compound(compound)
+        return names
+
+    @classmethod
+    def from_xml_files(cls, files, jobs=None, compound_filter=None, excluded=None):
+        """Merge the compounds of the given doxygen XML files into a single
+        tree and index it. Compounds rejected by *compound_filter* are left
+        out of the tree, and recorded as excluded along with *excluded*.
+        """
+        index = cls(ET.Element('root'))
+        index.changed = index.refresh(files, jobs=jobs, compound_filter=compound_filter,
+                                      excluded=excluded)
+        return index
+
+    @classmethod
+    def from_xml_stream(cls, stream, compound_filter=None, excluded=None):
+        """Index the compounds of a combined doxygen XML document read from the
+        binary file object *stream* (see `iter_compounds`), in one pass.
+        Compounds rejected by *compound_filter* are left out, and recorded as
+        excluded along with *excluded*.
+        """
+        index = cls(ET.Element('root'), excluded=dict(excluded or {}))
+        for compound in iter_compounds(stream):
+            name = compound.findtext('compoundname')
+            if compound_filter and not compound_filter(compound.get('kind'), name):
+                _record_excluded(compound, name, index.excluded)
+                continue
+            index.root.append(compound)
+            index.add_compound(compound)
+        index.changed = set(index.compounds)
+        return index
+
+    @classmethod
+    def load(cls, filename):
+        """Load an index written by `DoxygenIndex.dump` (for example by the
+        ``autodoc-doxygen-index`` command). Gzipped files are accepted as well.
+        """
+        parser = ET.XMLParser(huge_tree=True)
+        root = ET.parse(filename, parser).getroot()
+        if root.tag != INDEX_TAG or root.get('format') != INDEX_FORMAT:
+            raise ValueError('%s is not a doxygen index in format %s' % (filename, INDEX_FORMAT))
+        excluded = {}
+        for el in root.findall('excluded'):
+            excluded[el.get('refid')] = el.text
+            root.remove(el)
+        sources = {}
+        for el in root.findall('source'):
+            sources[el.get('path')] = XmlSource(int(el.get('mtime')), int(el.get('size')),
+                                                el.get('digest'), tuple((el.text or '').split()),
+                                                tuple(el.get('excluded', '').split()))
+            root.remove(el)
+        declarations = {}
+        for el in root.findall('declaration'):
+            declarations[el.get('refid')] = Declaration(el.get('template'), el.get('rtype'),
+                                                        el.get('name'), el.get('args'))
+            root.remove(el)
+        index = cls(root, excluded=excluded, signature=root.get('signature'),
+                    lazy_descriptions=root.get('lazy-descriptions') == 'yes',
+                    declarations=declarations)
+        index.sources = sources
+        return index
+
+    def dump(self, filename):
+        """Write the merged tree to *filename*, as a single XML document
+        which `DoxygenIndex.load` parses in one pass. If *filename* ends in
+        ``.gz``, the output is gzipped.
+        """
+        compression = 9 if filename.endswith('.gz') else 0
+        with ET.xmlfile(filename, encoding='utf-8', compression=compression) as xf:
+            xf.write_declaration()
+            attrib = {'format': INDEX_FORMAT}
+            if self.signature is not None:
+                attrib['signature'] = self.signature
+            if self.lazy_descriptions:
+                attrib['lazy-descriptions'] = 'yes'
+            with xf.element(INDEX_TAG, attrib):
+                for refid, name in sorted(self.excluded.items()):
+                    with xf.element('excluded', refid=refid):
+                        xf.write(name)
+                for path, source in sorted(self.sources.items()):
+                    with xf.element('source', path=path, mtime=str(source.mtime),
+                                    size=str(source.size), digest=source.digest,
+                                    excluded=' '.join(source.excluded)):
+                        xf.write(' '.join(source.compounds))
+                for refid, declaration in sorted(self.declarations.items()):
+                    xf.write(ET.Element('declaration', refid=refid, **declaration._asdict()))
+                for node in self.root:
+                    xf.write(node)
+
+    def digest(self, compound):
+        """Get a digest of the XML of the compounddef *compound*, which changes
+        whenever the compound does: the digest of the file it was read from,
+        if the file only defines this compound, or else (e.g. for a combined
+        XML file, which changes with any compound) the digest of its
+        serialization, descriptions included.
+        """
+        id = compound.get('id')
+        source = self._source_of(id)
+        if source is not None and source[1] is not None:
+            return source[1]
+        digest = self._digests.get(id)
+        if digest is None:
+            h = hashlib.sha1(ET.tostring(compound))
+            if self.lazy_descriptions:
+                # the tree only has the byte ranges of the descriptions
+                for node in compound.iter(*DESCRIPTION_TAGS):
+                    description = self.description(node.getparent(), node.tag)
+                    if description is not node:
+                        h.update(ET.tostring(description))
+            digest = self._digests[id] = h.hexdigest()
+        return digest
+
+    def description(self, element, tag):
+        """Get the *tag* description (e.g. "detaileddescription") of the
+        compounddef, memberdef or enumvalue *element*, or None.
+
+        If the index was loaded with ``lazy_descriptions``, the tree only has
+        placeholders for the descriptions, and the description is parsed from
+        its byte range in the memory-mapped XML file it came from.
+        """
+        node = element.find(tag)
+        if node is None or node.get('length') is None:
+            return node
+        compound = element if element.tag == 'compounddef' else next(element.iterancestors('compounddef'))
+        filename = self._source_of(compound.get('id'))[0]
+        offset, length = int(node.get('offset')), int(node.get('length'))
+        return ET.fromstring(self._mmap(filename)[offset:offset + length], ET.XMLParser(huge_tree=True))
+
+    def _source_of(self, id):
+        """Get the file the compound with the given id was read from, and the
+        digest of the file if it only defines this compound (or None), or
+        None if it was not read from a file.
+
+        The table is built from ``self.sources`` when it is first needed after
+        they change, under the lock, and only published once complete, so
+        that the lookups from other threads never see it partially built,
+        nor keep one built from the sources before a change.
+        """
+        table = self._compound_sources
+        if table is None:
+            with self._load_lock:
+                table = self._compound_sources
+                if table is None:
+                    table = {}
+                    for filename, source in self.sources.items():
+                        digest = source.digest if len(source.compounds) == 1 else None
+                        for compound_id in source.compounds:
+                            table[compound_id] = (filename, digest)
+                    self._compound_sources = table
+        return table.get(id)
+
+    def _mmap(self, filename):
+        with self._mmaps_lock:
+            mm = self._mmaps.get(filename)
+            if mm is None:
+                source = self.sources[filename]
+                with open(filename, 'rb') as f:
+                    st = os.fstat(f.fileno())
+                    if (st.st_mtime_ns, st.st_size) != (source.mtime, source.size):
+                        raise ValueError('%s changed since the doxygen XML was loaded: its descriptions '
+                                         'can no longer be read' % filename)
+                    mm = self._mmaps[filename] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return mm
+
+    def close_files(self):
+        """Close the memory maps opened by `description`."""
+        with self._mmaps_lock:
+            for mm in self._mmaps.values():
+                mm.close()
+            self._mmaps.clear()
+
+    def find_id(self, id):
+        """Get the compounddef, memberdef or enumvalue with the given doxygen id,
+        or None.
+        """
+        return self.ids.get(id)
+
+    def declaration(self, memberdef):
+        """Get the `Declaration` of the function *memberdef*, precomputed when
+        it was indexed.
+        """
+        declaration = self.declarations.get(memberdef.get('id'))
+        if declaration is None:
+            # e.g. a member of a compound that was removed, defined by another one too
+            compound = next(memberdef.iterancestors('compounddef'))
+            declaration = self.declarations[memberdef.get('id')] = member_declaration(
+                memberdef, compound.findtext('compoundname'))
+        return declaration
+
+    def find_compound(self, name):
+        """Get the compounddef with the given qualified name, or None.
+        """
+        self._load_tagged(name)
+        return self.compounds.get(name)
+
+    def find_members(self, compoundname, name, kind=None, sections=None):
+        """Get the memberdefs called *name* in the compound *compoundname*, in
+        document order. They can be restricted to a memberdef *kind* (e.g.
+        "function"), and to the given sectiondef kinds (e.g. "public-func").
+        """
+        self._load_tagged(compoundname)
+        return [m for m in self.members.get((compoundname, name), ())
+                if (kind is None or m.get('kind') == kind) and
+                (sections is None or m.getparent().get('kind') in sections)]
+
+    def find_overload(self, compoundname, name, args):
+        """Get the overload of the function *name* in the compound *compoundname*
+        with the argument list *args* (e.g. "(int, double) const"), or None.
+        """
+        self._load_tagged(compoundname)
+        signature = normalize_signature(args)
+        match = self.signatures.get((compoundname, name, signature))
+        if match is None:
+            # the types may be qualified differently than in the sources,
+            # e.g. "OpenMM::Context&" vs "Context&"
+            signature = _unqualified(signature)
+            for member in self.find_members(compoundname, name, kind='function') or \
+                    self.find_inherited(compoundname, name):
+                if _unqualified(member_signature(member)) == signature:
+                    return member
+        return match
+
+    def ancestors(self, name):
+        """Get the names of the public base classes of the class *name*, direct
+        and indirect, depth-first in declaration order, each once. Bases whose
+        compound was not loaded are listed, but not their own bases.
+
+        The result is memoized until the index changes.
+        """
+        try:
+            return self._ancestors[name]
+        except KeyError:
+            pass
+        return self._linearize(name, ())
+
+    def _linearize(self, name, visiting):
+        ancestors = []
+        for base in self.bases.get(name, ()):
+            self._load_tagged(base)
+            if base in visiting:
+                continue  # a cycle, which only broken XML has
+            for ancestor in [base] + self._linearize(base, visiting + (name,)):
+                if ancestor not in ancestors:
+                    ancestors.append(ancestor)
+        if not visiting:
+            self._ancestors[name] = ancestors
+        return ancestors
+
+    def inherited_members(self, name):
+        """Get the public functions that the class *name* inherits, as a list of
+        ``(name, memberdef)``, nearest base classes first. The functions hidden
+        by a function of the same name in the class or in a nearer base, and
+        the constructors, destructors and assignment operators of the bases
+        are left out.
+
+        The table of each class is built from the tables of its bases, and is
+        memoized until the index changes.
+        """
+        try:
+            return self._inherited[name]
+        except KeyError:
+            pass
+        return self._inherited_members(name, ())
+
+    def _inherited_members(self, name, visiting):
+        if name in self._inherited:
+            return self._inherited[name]
+        compound = self.compounds.get(name)
+        hidden = set() if compound is None else \
+            set(m.findtext('name') for m in compound.iterfind('sectiondef/memberdef'))
+        table = []
+        for base in self.bases.get(name, ()):
+            self._load_tagged(base)
+            base_compound = self.compounds.get(base)
+            if base_compound is None or base in visiting:
+                continue
+            short = _unqualified_name(base).split('<')[0]
+            found = [(m.findtext('name'), m) for m in base_compound.xpath(
+                'sectiondef[@kind="public-func" or @kind="public-static-func"]/memberdef[@kind="function"]')
+                if m.findtext('name') not in (short, '~' + short, 'operator=')]
+            found += self._inherited_members(base, visiting + (name,))
+            table.extend(member for member in found if member[0] not in hidden)
+            hidden.update(membername for membername, _ in found)
+        if not visiting:
+            self._inherited[name] = table
+        return table
+
+    def find_inherited(self, compoundname, name):
+        """Get the memberdefs of the public functions called *name* that the
+        class *compoundname* inherits (see `inherited_members`).
+        """
+        if not self.bases.get(compoundname):
+            return []
+        return [m for membername, m in self.inherited_members(compoundname) if membername == name]
+
+    def namespace_members(self, name):
+        """Get the members of the namespace *name* that can be documented, as
+        a dict mapping "class" to the compounddefs of its classes and structs
+        (those that were loaded), and "typedef", "enum" and "function" to its
+        memberdefs of these kinds, each in document order. Returns None if the
+        namespace was not loaded.
+
+        The members are collected in one pass over the namespace, and the
+        result is memoized until the index changes.
+        """
+        try:
+            return self._namespace_members[name]
+        except KeyError:
+            pass
+
+        namespace = self.find_compound(name)
+        if namespace is None or namespace.get('kind') != 'namespace':
+            return None
+        members = {'class': [], 'typedef': [], 'enum': [], 'function': []}
+        for child in namespace:
+            if child.tag == 'innerclass':
+                self._load_tagged(child.text)
+                compound = self.ids.get(child.get('refid'))
+                if compound is not None and compound.get('kind') in ('class', 'struct'):
+                    members['class'].append(compound)
+            elif child.tag == 'sectiondef':
+                for member in child.iterchildren('memberdef'):
+                    if member.get('kind') in members:
+                        members[member.get('kind')].append(member)
+        self._namespace_members[name] = members
+        return members
+
+    def find_object(self, name, i=0):
+        """Get the element documenting the qualified *name*: a class or other
+        compound (e.g. "NS::Cls"), a public method, possibly inherited (e.g.
+        "NS::Cls::foo", or "NS::Cls::foo(int) const" to pick an overload), a public enum (e.g.
+        "NS::Cls::Enum") or a function, enum or typedef of a namespace (e.g.
+        "NS::foo"). If several functions have that name, *i* picks one.
+        Returns None if there is no such object.
+        """
+        name, overload = split_signature(name)
+        name = name.replace('.', '::')
+
+        if '::' in name:
+            modname, objname = name.rsplit('::', 1)
+            if overload is not None:
+                return self.find_overload(modname, objname, overload)
+            for kind, sections in (('function', ('public-func', 'func')),
+                                   ('enum', ('public-type', 'enum')),
+                                   ('typedef', ('typedef',))):
+                members = self.find_members(modname, objname, kind=kind, sections=sections)
+                if members:
+                    return members[i] if i < len(members) else None
+            members = self.find_inherited(modname, objname)
+            if members:
+                return members[i] if i < len(members) else None
+
+        return self.find_compound(name)
+
+    def scope_chain(self, scope):
+        """List the scopes in which a name used in *scope* is looked up: *scope*
+        and its enclosing scopes, innermost first, ending with the global
+        scope "". Scopes that are not in the index are skipped, since nothing
+        can be found in them.
+        """
+        chain = []
+        while scope:
+            if scope in self.scopes:
+                chain.append(scope)
+                scope = self.scopes[scope]
+            else:
+                scope = _parent_scope(scope)
+        chain.append('')
+        return chain
+
+    def resolve(self, name, scope=None, i=0):
+        """Resolve the (possibly partially qualified) *name* used in *scope*,
+        the way C++ does: the name is looked up in *scope*, then in each of
+        its enclosing scopes, and the first match wins. See `find_object` for
+        the names that can be looked up.
+
+        Returns ``(qualified name, element)``, or None if there is no match.
+        The results, misses included, are memoized until the index changes.
+        """
+        key = (scope, name, i)
+        try:
+            return self._resolved[key]
+        except KeyError:
+            pass
+
+        result = None
+        for prefix in self.scope_chain(scope):
+            qualified = '%s::%s' % (prefix, name) if prefix else name
+            obj = self.find_object(qualified, i)
+            if obj is not None:
+                result = (qualified, obj)
+                break
+        if not getattr(self._local, 'no_loading', False):
+            # a miss without loading is not final
+            self._resolved[key] = result
+        return result
+
+    def find_excluded(self, id):
+        """Get the qualified name of a compound or member that was filtered
+        out while loading, or None.
+        """
+        return self.excluded.get(id)
+
+    def stats(self):
+        """Count the indexed compounds (by kind) and members.
+        """
+        kinds = {}
+        for compound in self.compounds.values():
+            kind = compound.get('kind')
+            kinds[kind] = kinds.get(kind, 0) + 1
+        return {
+            'compounds': len(self.compounds),
+            'ids': len(self.ids),
+            'members': sum(1 for el in self.ids.values() if el.tag == 'memberdef'),
+            'excluded': len(self.excluded),
+            'kinds': kinds,
+        }
+
+
+
+def _unqualified_name(name):
+    # "NS::Cls<A::B>" -> "Cls<A::B>"
+    parent = _parent_scope(name)
+    return name[len(parent) + 2:] if parent else name
+
+
+def _parent_scope(name):
+    # "NS::Cls<A::B>::Inner" -> "NS::Cls<A::B>"
+    depth = 0
+    for pos in range(len(name) - 1, 0, -1):
+        c = name[pos]
+        if c in '>)':
+            depth += 1
+        elif c in '<(':
+            depth -= 1
+        elif depth == 0 and c == ':' and name[pos - 1] == ':':
+            return name[:pos - 1]
+    return ''
+
+
+def _record_excluded(compound, name, excluded):
+    excluded[compound.get('id')] = name
+    for member in compound.iter('memberdef'):
+        excluded.setdefault(member.get('id'), '%s::%s' % (name, member.findtext('name')))
@@ -0,0 +1,164 @@
+"""Command line tool to prebuild the doxygen index.
+
+Run it right after doxygen, e.g. ::
+
+    autodoc-doxygen-index build/doxygen/xml -o build/doxygen/index.xml.gz
+
+and point the ``doxygen_index`` config value at the output, so that each
+sphinx build loads the index in one pass instead of re-ingesting the XML.
+
+With ``--inventory``, it also writes an intersphinx ``objects.inv`` of the
+classes and methods, without building the docs (see `inventory`). The input
+can then be an index written by ``-o`` as well. ::
+
+    autodoc-doxygen-index build/doxygen/index.xml.gz --inventory objects.inv
+
+With ``--check``, it looks the names of all the autodoxy* directives of the
+given sources up in the index, and lists those that are not found (see
+`validation`). ::
+
+    autodoc-doxygen-index build/doxygen/index.xml.gz --check docs/
+"""
+from __future__ import print_function, absolute_import, division
+
+import argparse
+import os
+import sys
+import time
+
+from .index import CompoundFilter, DoxygenIndex, is_index_file, select_xml_files
+from .inventory import STUB_URI, write_inventory
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog='autodoc-doxygen-index',
+        description='Parse a directory of doxygen XML output and write the index '
+                    'loaded by the doxygen_index config value of '
+                    'sphinxcontrib.autodoc_doxygen.')
+    parser.add_argument('xmldir', help='directory containing the doxygen XML output, or file '
+                                       'with the combined XML (e.g. all.xml; "-" reads it from '
+                                       'stdin), or, with --inventory, an index written by -o')
+    parser.add_argument('-o', '--output',
+                        help='file to write the index to (gzipped if it ends in .gz)')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of files to parse in parallel (default: number of CPUs)')
+    parser.add_argument('--include-kind', action='append', default=[], metavar='KIND',
+                        help='only index compounds of this kind (e.g. class, namespace); '
+                             'may be given several times')
+    parser.add_argument('--exclude-name', action='append', default=[], metavar='GLOB',
+                        help='do not index compounds whose qualified name matches this '
+                             'glob (e.g. "*::detail"); may be given several times')
+    parser.add_argument('--inventory', metavar='FILE',
+                        help='write an intersphinx inventory (objects.inv) of the classes '
+                             'and their methods to FILE')
+    parser.add_argument('--stub-uri', default=STUB_URI,
+                        help='location of the stub page of a class in the html output, '
+                             'where {name} is the stub name (default: %(default)s)')
+    parser.add_argument('--shard-threshold', type=int, default=0,
+                        help='the autodoc_doxygen_shard_threshold the docs are built with')
+    parser.add_argument('--shard-size', type=int, default=100,
+                        help='the autodoc_doxygen_shard_size the docs are built with')
+    parser.add_argument('--inherited-members', action='store_true',
+                        help='the docs are built with autodoc_doxygen_inherited_members')
+    parser.add_argument('--check', action='append', default=[], metavar='SOURCE',
+                        help='check that the names of the autodoxy* directives of SOURCE '
+                             '(a file, or a directory searched for .rst files) are in the '
+                             'index; may be given several times')
+    parser.add_argument('--project', default='', help='project name of the inventory')
+    parser.add_argument('--version', default='', help='project version of the inventory')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='do not print statistics')
+    return parser
+
+
+def main(argv=None):
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    if not args.output and not args.inventory and not args.check:
+        parser.error('at least one of -o/--output, --inventory and --check is required')
+
+    if (args.inventory or args.check) and os.path.isfile(args.xmldir) and is_index_file(args.xmldir):
+        try:
+            index = DoxygenIndex.load(args.xmldir)
+        except (IOError, OSError, ValueError) as e:
+            print('error: %s' % e, file=sys.stderr)
+            return 1
+        return _write_inventory(index, args) or _check(index, args)
+
+    compound_filter = CompoundFilter(args.include_kind, args.exclude_name)
+    t0 = time.time()
+    if args.xmldir == '-':
+        # the combined XML, e.g. piped from xsltproc combine.xslt index.xml
+        files = ['<stdin>']
+        stdin = getattr(sys.stdin, 'buffer', sys.stdin)
+        index = DoxygenIndex.from_xml_stream(stdin, compound_filter=compound_filter)
+    else:
+        if not os.path.exists(args.xmldir):
+            print('error: %s does not exist' % args.xmldir, file=sys.stderr)
+            return 1
+        files, excluded = select_xml_files(args.xmldir, compound_filter)
+        if len(files) == 0:
+            print('error: no doxygen xml output found in %s' % args.xmldir, file=sys.stderr)
+            return 1
+        index = DoxygenIndex.from_xml_files(files, jobs=args.jobs, compound_filter=compound_filter,
+                                            excluded=excluded)
+    t1 = time.time()
+    if args.output:
+        index.dump(args.output)
+    t2 = time.time()
+
+    if not args.quiet:
+        stats = index.stats()
+        print('[autodoc_doxygen] indexed %d files in %.2fs' % (len(files), t1 - t0))
+        print('[autodoc_doxygen] %d compounds, %d members, %d ids, %d excluded ids' % (
+            stats['compounds'], stats['members'], stats['ids'], stats['excluded']))
+        for kind, n in sorted(stats['kinds'].items()):
+            print('    %-12s %d' % (kind, n))
+        if args.output:
+            print('[autodoc_doxygen] wrote %s (%d bytes) in %.2fs' % (
+                args.output, os.path.getsize(args.output), t2 - t1))
+    return _write_inventory(index, args) or _check(index, args)
+
+
+def _write_inventory(index, args):
+    if not args.inventory:
+        return 0
+    t0 = time.time()
+    n = write_inventory(index, args.inventory, project=args.project, version=args.version,
+                        uri=args.stub_uri, shard_threshold=args.shard_threshold,
+                        shard_size=args.shard_size, inherited_members=args.inherited_members)
+    if not args.quiet:
+        print('[autodoc_doxygen] wrote %d inventory entries to %s in %.2fs' % (
+            n, args.inventory, time.time() - t0))
+    return 0
+
+
+def _check(index, args):
+    if not args.check:
+        return 0
+    from .autosummary.generate import find_autodoxy_in_files
+    from .validation import check_autodoxy_names
+
+    filenames = []
+    for source in args.check:
+        if os.path.isdir(source):
+            for dirpath, dirnames, names in os.walk(source):
+                dirnames.sort()
+                filenames.extend(os.path.join(dirpath, name) for name in sorted(names)
+                                 if name.endswith('.rst'))
+        else:
+            filenames.append(source)
+    items = find_autodoxy_in_files(filenames)
+    # the sources of a single project: the :project: options are ignored
+    failures = check_autodoxy_names(items, lambda project: index)
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    if not args.quiet:
+        print('[autodoc_doxygen] checked %d names in %d files: %d not found' % (
+            len(items), len(filenames), len(failures)))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
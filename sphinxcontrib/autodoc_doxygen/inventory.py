@@ -0,0 +1,133 @@
+"""Write a sphinx inventory (``objects.inv``) straight from a `DoxygenIndex`,
+without rendering any document, so that other projects can link to the API
+with intersphinx.
+
+Each class is assumed to have the stub page generated for it by
+``autodoxysummary`` (see ``autosummary/generate.py``), and its public methods
+(and inherited ones, with ``autodoc_doxygen_inherited_members``) to be
+documented on that page, which is what the ``doxyclass.rst`` template does,
+or on the method pages of the class if it is sharded. The anchors are the
+ids the sphinx cpp domain gives to the declarations; if a declaration can't
+be parsed, its entry links to the page without an anchor.
+"""
+from __future__ import print_function, absolute_import, division
+
+import re
+import zlib
+
+from .autosummary.generate import shard_methods, sharded_memberdefs
+
+try:
+    from sphinx.domains.cpp import DefinitionParser, Symbol
+except ImportError:
+    DefinitionParser = Symbol = None
+
+# default location of the stub pages, relative to the root of the html output
+STUB_URI = 'generated/{name}.html'
+
+
+class _ParserConfig(object):
+    # the config values read by the cpp domain's DefinitionParser
+    cpp_id_attributes = []
+    cpp_paren_attributes = []
+
+
+def cpp_id(declaration, objtype):
+    """Get the id (the html anchor) the sphinx cpp domain gives to the
+    *declaration* of a *objtype* ("class" or "function"), or None if it can't
+    be parsed.
+    """
+    if DefinitionParser is None:
+        return None
+    try:
+        parser = DefinitionParser(declaration, location=None, config=_ParserConfig)
+        ast = parser.parse_declaration(objtype, objtype)
+        parser.assert_end()
+        # the ids of nested names are computed from the symbol of the declaration
+        Symbol(None, None, None, None, None, None, None).add_declaration(ast, docname='inventory', line=0)
+        return ast.get_newest_id()
+    except Exception:
+        return None
+
+
+def function_declaration(memberdef, scope):
+    """The declaration of a function memberdef, qualified by *scope*, e.g.
+    "int OpenMM::Force::getForceGroup() const".
+    """
+    params = []
+    for param in memberdef.iterfind('templateparamlist/param'):
+        type = ''.join(param.find('type').itertext()) if param.find('type') is not None else ''
+        params.append(' '.join(p for p in (type, param.findtext('declname')) if p))
+    template = 'template<%s> ' % ', '.join(params) if params else ''
+    rtype = ''.join(memberdef.find('type').itertext()) if memberdef.find('type') is not None else ''
+    return '%s%s %s::%s%s' % (template, rtype, scope, memberdef.findtext('name'),
+                              memberdef.findtext('argsstring') or '')
+
+
+def iter_inventory(index, uri=STUB_URI, shard_threshold=0, shard_size=100, inherited_members=False):
+    """Generate the ``(name, role, uri)`` of the inventory entries of the
+    classes of *index* and of their public methods. *uri* is the location of
+    the stub page of a class, where ``{name}`` is replaced by the stub name.
+    *shard_threshold*, *shard_size* and *inherited_members* are the
+    ``autodoc_doxygen_shard_*`` and ``autodoc_doxygen_inherited_members``
+    config values the docs are built with.
+
+    The overloads of a method get a single entry, for the first one. The
+    cpp domain names the entries of the overloads the same (their qualified
+    name, without the parameters), and intersphinx only keeps one entry of
+    each name, so the others would only make the links go to whichever
+    overload comes last.
+    """
+    for name, compound in sorted(index.compounds.items()):
+        if compound.get('kind') != 'class':
+            continue
+        stub = name.replace('::', '.')
+        page = uri.format(name=stub)
+        yield name, 'class', _with_anchor(page, cpp_id(name, 'class'))
+
+        # the inherited methods are declared in the scope of the class
+        inherited = [m for _, m in index.inherited_members(name)] if inherited_members else []
+        members = sharded_memberdefs(compound, inherited)
+        pages = [page] * len(members)
+        if shard_threshold and len(members) > shard_threshold:
+            pages = [uri.format(name='%s.methods-%d' % (stub, i + 1))
+                     for i, chunk in enumerate(shard_methods(compound, shard_size, inherited))
+                     for _ in chunk]
+
+        seen = set()
+        for member, member_page in zip(members, pages):
+            member_name = '%s::%s' % (name, member.findtext('name'))
+            if member_name in seen:
+                continue
+            seen.add(member_name)
+            anchor = cpp_id(function_declaration(member, name), 'function')
+            yield member_name, 'function', _with_anchor(member_page, anchor)
+
+
+def _with_anchor(uri, anchor):
+    return uri + '#' + anchor if anchor else uri
+
+
+def write_inventory(index, filename, project='', version='', uri=STUB_URI,
+                    shard_threshold=0, shard_size=100, inherited_members=False):
+    """Write the inventory of *index* (see `iter_inventory`) to *filename*, in
+    the format of sphinx's ``objects.inv``. Returns the number of entries.
+    """
+    def escape(string):
+        return re.sub(r'\s+', ' ', string)
+
+    n = 0
+    with open(filename, 'wb') as f:
+        f.write(('# Sphinx inventory version 2\n'
+                 '# Project: %s\n'
+                 '# Version: %s\n'
+                 '# The remainder of this file is compressed using zlib.\n' %
+                 (escape(project), escape(version))).encode('utf-8'))
+        compressor = zlib.compressobj(9)
+        for name, role, target in iter_inventory(index, uri, shard_threshold, shard_size,
+                                                 inherited_members):
+            entry = '%s cpp:%s 1 %s -\n' % (name, role, target)
+            f.write(compressor.compress(entry.encode('utf-8')))
+            n += 1
+        f.write(compressor.flush())
+    return n
@@ -0,0 +1,168 @@
+"""Plan which doxygen compounds a build needs, so that only those are loaded.
+
+The plan starts from the names of the autodoxy* directives of the sources
+(see `find_autodoxy_in_files`; the stub pages generated from the
+autodoxysummary directives document the same compounds), which doxygen's
+``index.xml`` maps to their compounds. It then follows, in the XML of the
+compounds to document:
+
+- the public base classes of the classes, whose methods may be inherited;
+- the classes of the namespaces documented by ``autodoxynamespace``;
+
+and adds the compounds of the targets of all their ``<ref>`` elements, so
+that the references resolve, without following the references of those.
+
+The files are only scanned with regular expressions here: `load_xml_dir`
+then parses exactly the planned compounds, in parallel, and records the
+others as excluded, so that the references to them are rendered as plain
+text.
+"""
+from __future__ import print_function, absolute_import, division
+
+import hashlib
+import json
+import os
+import re
+
+from lxml import etree as ET
+
+from .index import _parent_scope, split_signature
+
+PLAN_FORMAT = 1
+
+_REF_RE = re.compile(br'<ref refid="([^"]+)"')
+_BASE_RE = re.compile(br'<basecompoundref refid="([^"]+)"[^>]*\bprot="public"')
+_INNERCLASS_RE = re.compile(br'<innerclass refid="([^"]+)"')
+
+
+def read_doxygen_index(xmldir):
+    """Read doxygen's ``index.xml`` in *xmldir*. Returns ``(names, owners)``,
+    where *names* maps the names of the compounds to their ids, and *owners*
+    maps the ids of the compounds and of their members to the id of the
+    compound defining them (a member is listed by its file too, which is
+    only its owner if no namespace or class lists it).
+    """
+    names = {}
+    owners = {}
+    for compound in ET.parse(os.path.join(xmldir, 'index.xml')).getroot().iterfind('compound'):
+        refid = compound.get('refid')
+        names.setdefault(compound.findtext('name'), refid)
+        owners[refid] = refid
+        file_scope = compound.get('kind') in ('file', 'dir')
+        for member in compound.iterfind('member'):
+            if file_scope:
+                owners.setdefault(member.get('refid'), refid)
+            else:
+                owners[member.get('refid')] = refid
+    return names, owners
+
+
+def _seeds(items, names):
+    """Get the ids of the compounds documented by the autodoxy* directive
+    *items* ``(directive, name, scope)``, and of the namespaces among them
+    documented by autodoxynamespace.
+    """
+    seeds = set()
+    namespaces = set()
+    for directive, name, scope in items:
+        name = split_signature(name)[0].replace('.', '::')
+        if directive in ('autodoxysummary', 'autodoxyenum'):
+            # looked up in the cpp:namespace scope and its enclosing scopes
+            prefixes = []
+            while scope:
+                prefixes.append(scope)
+                scope = _parent_scope(scope)
+            candidates = ['%s::%s' % (prefix, name) for prefix in prefixes] + [name]
+        else:
+            candidates = [name]
+        for candidate in candidates:
+            # a compound, or a member of a compound
+            for compound in (candidate, _parent_scope(candidate)):
+                if compound in names:
+                    seeds.add(names[compound])
+                    if directive == 'autodoxynamespace' and compound == candidate:
+                        namespaces.add(names[compound])
+    return seeds, namespaces
+
+
+def _file_stat(filename):
+    st = os.stat(filename)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def plan_compounds(xmldir, items, cache=None):
+    """Get the set of the ids of the compounds of the doxygen XML in *xmldir*
+    that the autodoxy* directive *items* ``(directive, name, scope)`` need
+    (see the module docstring), or None if *xmldir* has no ``index.xml``
+    to plan with.
+
+    If *cache* is given, the plan is saved to it, and reused as long as the
+    directive names, ``index.xml`` and the files scanned for it are
+    unchanged.
+    """
+    index_file = os.path.join(xmldir, 'index.xml')
+    if not os.path.isdir(xmldir) or not os.path.isfile(index_file):
+        return None
+
+    key = hashlib.sha1(json.dumps(sorted(set(items), key=str)).encode('utf-8')).hexdigest()
+    plan = _load_plan(cache, key, xmldir) if cache is not None else None
+    if plan is not None:
+        return plan
+
+    names, owners = read_doxygen_index(xmldir)
+    documented, namespaces = _seeds(items, names)
+    scanned = {}
+    refs = set()
+    queue = sorted(documented)
+    while queue:
+        refid = queue.pop()
+        filename = os.path.join(xmldir, refid + '.xml')
+        if not os.path.isfile(filename):
+            continue
+        scanned[refid] = _file_stat(filename)
+        with open(filename, 'rb') as f:
+            data = f.read()
+        follow = _BASE_RE.findall(data)
+        if refid in namespaces:
+            follow += _INNERCLASS_RE.findall(data)
+        for ref in follow:
+            ref = ref.decode('ascii')
+            if ref not in documented:
+                documented.add(ref)
+                queue.append(ref)
+        refs.update(_REF_RE.findall(data))
+
+    plan = set(documented)
+    plan.update(owners[ref] for ref in (r.decode('ascii') for r in refs) if ref in owners)
+    if cache is not None:
+        _save_plan(cache, {'format': PLAN_FORMAT, 'key': key, 'index': _file_stat(index_file),
+                           'scanned': scanned, 'refids': sorted(plan)})
+    return plan
+
+
+def _load_plan(cache, key, xmldir):
+    try:
+        with open(cache) as f:
+            data = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if data.get('format') != PLAN_FORMAT or data.get('key') != key:
+        return None
+    try:
+        if data['index'] != _file_stat(os.path.join(xmldir, 'index.xml')):
+            return None
+        for refid, stat in data['scanned'].items():
+            if _file_stat(os.path.join(xmldir, refid + '.xml')) != stat:
+                return None
+    except OSError:
+        return None
+    return set(data['refids'])
+
+
+def _save_plan(cache, data):
+    if not os.path.isdir(os.path.dirname(cache)):
+        os.makedirs(os.path.dirname(cache))
+    tmp = '%s.%d.tmp' % (cache, os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, cache)
@@ -0,0 +1,374 @@
+"""Optional profiling of the extension, enabled by the `autodoc_doxygen_profile`
+config value (a directory, relative to the source directory).
+
+The extension's entry points (loading the XML, generating the stub pages,
+and the autodoxy* directives) are run under cProfile. Each document gets
+its own ``docs/<docname>.pstats`` file, the loading and stub generation go
+to ``builder-inited.pstats``, and at the end of the build all of them are
+merged into ``merged.pstats``. The wall time of each directive is also
+appended to ``directives.tsv``, and the slowest ones are logged.
+
+Because every process writes its own files, this works with parallel reads.
+
+The `autodoc_doxygen_timings` config value (a JSON file, relative to the
+source directory) records the wall time of the same entry points without
+cProfile's overhead: the time spent in each kind of directive (its phase), and in each
+document, is written to the file at the end of the build. The timings of the
+documents are kept in the environment, so that the ones read by the parallel
+readers are merged back.
+
+The `autodoc_doxygen_memory` config value (a JSON file, relative to the source
+directory) turns on the memory mode: `tracemalloc` traces the allocations of
+the build, and the RSS and the traced memory are read around the loading of
+the XML, the generation of the stub pages, each autodoxysummary directive
+and the whole read phase (the `MEMORY_PHASES`). The report gives, for each
+phase, the memory it added, and the allocation sites of this package that
+made the most of it, along with the number of elements and nodes of the
+loaded doxygen XML, whose memory (allocated by libxml2) only shows in the
+RSS. Grouping a snapshot by allocation site takes seconds on a big build, so
+only the phases that run once get one (the directives' sites are part of
+the read phase). With parallel reads, only the main process is measured.
+Tracing makes the build several times slower.
+"""
+from __future__ import print_function, absolute_import, division
+
+import cProfile
+import functools
+import json
+import os
+import pstats
+import shutil
+import sys
+import time
+import tracemalloc
+
+from sphinx.util import logging
+from sphinx.util.osutil import ensuredir
+
+logger = logging.getLogger(__name__)
+
+# docname (or "builder-inited") -> cProfile.Profile, for the current process
+_profilers = {}
+# depth of the profiled calls in progress; only the outermost one toggles the
+# profiler, since only one profiler can be active at a time
+_depth = [0]
+
+# the phases measured by the memory mode, by the name of their entry point
+# (or directive); "read" is the whole read phase
+MEMORY_PHASES = frozenset(('set_doxygen_xml', 'process_generate_options', 'autodoxysummary',
+                           'autodoxyenum', 'read'))
+# the phases whose allocation sites are reported
+MEMORY_SITE_PHASES = frozenset(('set_doxygen_xml', 'process_generate_options', 'read'))
+# the number of allocation sites reported for each phase
+MEMORY_TOP_SITES = 10
+# the number of frames tracemalloc keeps, unless it was started with more
+# (e.g. ``PYTHONTRACEMALLOC=10``), in which case the allocations made by sphinx
+# on behalf of the extension are attributed to it as well. Each frame slows
+# the build down a lot.
+MEMORY_FRAMES = 1
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+MB = 1024 * 1024
+
+# phase -> measures, for the current process (see _record_memory)
+_memory = {}
+# the reading at the start of the read phase
+_read_start = [None]
+
+
+def _profile_dir(env):
+    path = env.config.autodoc_doxygen_profile
+    return os.path.join(env.srcdir, path) if path else None
+
+
+def _describe(obj):
+    """Describe a directive or documenter for the directives.tsv report."""
+    if hasattr(obj, 'objtype'):
+        # a documenter: the line is the one of its directive
+        return getattr(obj.directive, 'lineno', 0), obj.objtype, obj.name
+    content = [line.strip() for line in obj.content if line.strip()]
+    name = content[0] + (' ...' if len(content) > 1 else '') if content else ''
+    return obj.lineno, obj.name, name
+
+
+def profiled(func):
+    """Decorator to run *func* under cProfile when `autodoc_doxygen_profile` is set,
+    and to time it when `autodoc_doxygen_timings` is set. The first argument of
+    *func* must be the sphinx app, a directive or a documenter.
+    """
+    @functools.wraps(func)
+    def wrapper(obj, *args, **kwargs):
+        env = obj.env
+        if env is None or _depth[0] > 0 or not (env.config.autodoc_doxygen_profile or
+                                                  env.config.autodoc_doxygen_timings or
+                                                  env.config.autodoc_doxygen_memory):
+            return func(obj, *args, **kwargs)
+
+        docname = env.temp_data.get('docname')
+        # the kind of a directive is read before running it, since autodoxyenum
+        # replaces its name with the one of the enum
+        phase = func.__name__ if docname is None else getattr(obj, 'objtype', None) or obj.name
+        memory = None
+        if env.config.autodoc_doxygen_memory and phase in MEMORY_PHASES and tracemalloc.is_tracing():
+            memory = _memory_reading(phase)
+        profiler = None
+        if env.config.autodoc_doxygen_profile:
+            profiler = _profilers.setdefault(docname or 'builder-inited', cProfile.Profile())
+        _depth[0] += 1
+        t0 = time.time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            return func(obj, *args, **kwargs)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            elapsed = time.time() - t0
+            _depth[0] -= 1
+            if memory is not None:
+                _record_memory(phase, memory)
+            if env.config.autodoc_doxygen_timings:
+                _record_timing(env, docname, phase, elapsed)
+            if profiler is not None:
+                path = _profile_dir(env)
+                if docname is None:
+                    profiler.dump_stats(os.path.join(path, 'builder-inited.pstats'))
+                else:
+                    lineno, kind, name = _describe(obj)
+                    with open(os.path.join(path, 'directives.tsv'), 'a') as f:
+                        f.write('%.4f\t%s\t%d\t%s\t%s\n' % (elapsed, docname, lineno, kind, name))
+    return wrapper
+
+
+def _record_timing(env, docname, phase, elapsed):
+    # docname ('' outside of the documents) -> phase -> [calls, seconds]
+    if not hasattr(env, 'doxygen_timings'):
+        env.doxygen_timings = {}
+    timing = env.doxygen_timings.setdefault(docname or '', {}).setdefault(phase, [0, 0.0])
+    timing[0] += 1
+    timing[1] += elapsed
+
+
+def init_profiling(app):
+    """Clear the outputs of the previous build."""
+    app.env.doxygen_timings = {}
+    path = _profile_dir(app.env)
+    if path is None:
+        return
+    if os.path.isdir(os.path.join(path, 'docs')):
+        shutil.rmtree(os.path.join(path, 'docs'))
+    for filename in ('builder-inited.pstats', 'merged.pstats', 'directives.tsv'):
+        if os.path.isfile(os.path.join(path, filename)):
+            os.remove(os.path.join(path, filename))
+    ensuredir(path)
+    _profilers.clear()
+
+
+def dump_document_profile(app, doctree):
+    """Write the profile of the document that was just read."""
+    profiler = _profilers.pop(app.env.docname, None)
+    if profiler is None:
+        return
+    filename = os.path.join(_profile_dir(app.env), 'docs', app.env.docname + '.pstats')
+    ensuredir(os.path.dirname(filename))
+    profiler.dump_stats(filename)
+
+
+def merge_profiles(app, exception):
+    """Merge the profiles written by all the processes into merged.pstats."""
+    path = _profile_dir(app.env)
+    if path is None or exception is not None:
+        return
+
+    files = []
+    for dirpath, dirnames, filenames in os.walk(path):
+        files.extend(os.path.join(dirpath, f) for f in filenames
+                     if f.endswith('.pstats') and f != 'merged.pstats')
+    if not files:
+        return
+    stats = pstats.Stats(*sorted(files))
+    stats.dump_stats(os.path.join(path, 'merged.pstats'))
+    logger.info('[autodoc_doxygen] merged %d profiles into %s', len(files),
+                os.path.join(path, 'merged.pstats'))
+
+    report = os.path.join(path, 'directives.tsv')
+    if os.path.isfile(report):
+        with open(report) as f:
+            rows = sorted((line.rstrip('\n').split('\t') for line in f),
+                          key=lambda row: -float(row[0]))
+        for elapsed, docname, lineno, kind, name in rows[:10]:
+            logger.info('[autodoc_doxygen] %6.2fs %s:%s %s %s', float(elapsed), docname, lineno, kind, name)
+
+
+def merge_timings(app, env, docnames, other):
+    """Merge the timings of the documents read by a parallel reader."""
+    if not hasattr(other, 'doxygen_timings'):
+        return
+    if not hasattr(env, 'doxygen_timings'):
+        env.doxygen_timings = {}
+    for docname in docnames:
+        if docname in other.doxygen_timings:
+            env.doxygen_timings[docname] = other.doxygen_timings[docname]
+
+
+def write_timings(app, exception):
+    """Write the timings of the build to the `autodoc_doxygen_timings` file:
+    the number of calls and the seconds spent in each kind of entry point
+    (``phases``) and the seconds spent in each document that was read
+    (``documents``).
+    """
+    path = app.config.autodoc_doxygen_timings
+    if not path or exception is not None:
+        return
+    phases = {}
+    documents = {}
+    for docname, timings in getattr(app.env, 'doxygen_timings', {}).items():
+        for name, (calls, seconds) in timings.items():
+            phase = phases.setdefault(name, {'calls': 0, 'seconds': 0.0})
+            phase['calls'] += calls
+            phase['seconds'] += seconds
+        if docname:
+            documents[docname] = sum(seconds for calls, seconds in timings.values())
+
+    filename = os.path.join(app.srcdir, path)
+    ensuredir(os.path.dirname(filename))
+    with open(filename, 'w') as f:
+        json.dump({'phases': phases, 'documents': documents}, f, indent=2, sort_keys=True)
+
+
+def _rss():
+    """Get the resident set size of the process in bytes, or its peak where
+    the current one is unknown, or None.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in kB on linux, and in bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def _package_sites():
+    """Take a tracemalloc snapshot, and sum the sizes and counts of the
+    blocks still allocated by each line of this package (the innermost line
+    of the package in the traceback of the block), this module aside.
+    """
+    root = os.path.dirname(_PACKAGE_DIR)
+    this = os.path.splitext(os.path.abspath(__file__))[0]
+    sites = {}
+    # grouping by traceback is done once per distinct traceback, not per block
+    for stat in tracemalloc.take_snapshot().statistics('traceback'):
+        for frame in reversed(stat.traceback):
+            if frame.filename.startswith(_PACKAGE_DIR):
+                if os.path.splitext(frame.filename)[0] != this:
+                    site = sites.setdefault(
+                        '%s:%d' % (os.path.relpath(frame.filename, root), frame.lineno), [0, 0])
+                    site[0] += stat.size
+                    site[1] += stat.count
+                break
+    return sites
+
+
+def _memory_reading(phase):
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    sites = _package_sites() if phase in MEMORY_SITE_PHASES else None
+    return sites, tracemalloc.get_traced_memory()[0], _rss()
+
+
+def _record_memory(phase, start):
+    """Record the memory added by a phase of the build, since the reading
+    *start* (see `_memory_reading`).
+    """
+    start_sites, start_traced, start_rss = start
+    traced, peak = tracemalloc.get_traced_memory()
+    sites = _package_sites() if start_sites is not None else {}
+    rss = _rss()
+
+    entry = _memory.setdefault(phase, {'calls': 0, 'traced_mb': 0.0, 'peak_traced_mb': 0.0,
+                                       'rss_mb': None, 'rss_added_mb': 0.0, 'sites': {}})
+    entry['calls'] += 1
+    entry['traced_mb'] += (traced - start_traced) / MB
+    entry['peak_traced_mb'] = max(entry['peak_traced_mb'], peak / MB)
+    if rss is not None:
+        entry['rss_mb'] = max(entry['rss_mb'] or 0, rss / MB)
+        if start_rss is not None:
+            entry['rss_added_mb'] += (rss - start_rss) / MB
+    for name, (size, count) in sites.items():
+        start_size, start_count = start_sites.get(name, (0, 0))
+        if size > start_size:
+            site = entry['sites'].setdefault(name, [0, 0])
+            site[0] += size - start_size
+            site[1] += count - start_count
+
+
+def start_memory_profiling(app, config):
+    """Start tracing the allocations, if `autodoc_doxygen_memory` is set."""
+    _memory.clear()
+    _read_start[0] = None
+    if config.autodoc_doxygen_memory and not tracemalloc.is_tracing():
+        tracemalloc.start(MEMORY_FRAMES)
+
+
+def memory_before_read(app, env, docnames):
+    if app.config.autodoc_doxygen_memory and tracemalloc.is_tracing():
+        _read_start[0] = _memory_reading('read')
+
+
+def memory_after_read(app, env):
+    if _read_start[0] is not None:
+        _record_memory('read', _read_start[0])
+        _read_start[0] = None
+
+
+def doxygen_xml_counts():
+    """Count the compounds, members, elements and nodes (elements, texts and
+    tails) of the doxygen XML loaded for each project.
+    """
+    from . import get_doxygen_index, setup
+    indexes = dict(getattr(setup, 'DOXYGEN_INDEXES', None) or {})
+    if not indexes:
+        indexes[''] = get_doxygen_index()
+    counts = {}
+    for project, index in indexes.items():
+        elements = nodes = 0
+        for el in index.root.iter():
+            elements += 1
+            nodes += 1 + (el.text is not None) + (el.tail is not None)
+        stats = index.stats()
+        counts[project] = {'compounds': stats['compounds'], 'members': stats['members'],
+                           'elements': elements, 'nodes': nodes}
+    return counts
+
+
+def write_memory_report(app, exception):
+    """Write the measures of the memory mode to the `autodoc_doxygen_memory`
+    file, and log the memory added by each phase and its top allocation
+    site.
+    """
+    path = app.config.autodoc_doxygen_memory
+    if not path or exception is not None or not tracemalloc.is_tracing():
+        return
+    phases = {}
+    for phase, entry in _memory.items():
+        sites = sorted(entry['sites'].items(), key=lambda item: -item[1][0])[:MEMORY_TOP_SITES]
+        phases[phase] = dict((k, round(v, 2) if isinstance(v, float) else v)
+                             for k, v in entry.items() if k != 'sites')
+        phases[phase]['top'] = [{'site': name, 'size_kb': round(size / 1024, 1), 'count': count}
+                                for name, (size, count) in sites]
+        logger.info('[autodoc_doxygen] memory: %s (%d calls): RSS %s MB, traced %+.1f MB (peak %.1f MB)%s',
+                    phase, entry['calls'],
+                    '%.1f' % entry['rss_mb'] if entry['rss_mb'] is not None else '?',
+                    entry['traced_mb'], entry['peak_traced_mb'],
+                    ', most by %s' % sites[0][0] if sites else '')
+
+    filename = os.path.join(app.srcdir, path)
+    ensuredir(os.path.dirname(filename))
+    with open(filename, 'w') as f:
+        json.dump({'phases': phases, 'doxygen': doxygen_xml_counts()}, f, indent=2, sort_keys=True)
+    tracemalloc.stop()
@@ -0,0 +1,96 @@
+"""Resolve the cpp cross-references that the cpp domain can't, with the doxygen
+index.
+
+The descriptions refer to a lot of objects that are not documented on any
+page (private members, classes without a stub page...). Rather than leaving
+sphinx to warn about each of them, the `missing-reference` handler looks the
+target up in the index: if it is part of a class that has a generated stub
+page, the reference links to that page, and otherwise it is rendered as
+literal text. Targets the index doesn't know are left alone.
+"""
+from __future__ import print_function, absolute_import, division
+
+from sphinx.util.nodes import make_refnode
+
+from . import cpp_scope_name, get_doxygen_index, setup
+from .index import split_signature
+from .inventory import cpp_id
+
+# (scope, target) -> (docname, anchor, qualified name), (None, None, qualified
+# name) for the targets rendered as literal text, or None for the targets
+# unknown to the index; for the current build
+_resolved = {}
+# stub name (e.g. "OpenMM.Force") -> docname (e.g. "generated/OpenMM.Force")
+_stub_docnames = {}
+
+
+def clear_reference_cache(app, env):
+    """Forget the resolutions of the previous build, once the documents are read."""
+    _resolved.clear()
+    _stub_docnames.clear()
+
+
+def _indexes():
+    index = get_doxygen_index()
+    return [index] + [i for i in (getattr(setup, 'DOXYGEN_INDEXES', None) or {}).values()
+                      if i is not index]
+
+
+def _find_stub(env, compoundname):
+    if not _stub_docnames:
+        for docname in sorted(env.found_docs):
+            _stub_docnames.setdefault(docname.rsplit('/', 1)[-1], docname)
+    return _stub_docnames.get(compoundname.replace('::', '.'))
+
+
+def _resolve(env, scope, target):
+    name = split_signature(target)[0]
+    for index in _indexes():
+        # the compounds that are only tagged are not loaded for a reference
+        with index.without_loading():
+            found = index.resolve(name, scope)
+        if found is not None:
+            qualified, element = found
+            compound = element if element.tag == 'compounddef' else \
+                next(element.iterancestors('compounddef'), None)
+            if compound is None:
+                return None, None, qualified
+            compoundname, kind = compound.findtext('compoundname'), compound.get('kind')
+            break
+        tag = index.find_tagged(name, scope)
+        if tag is not None:
+            qualified = tag.name
+            compound = index.tags[tag.compound]
+            compoundname, kind = compound.name, compound.kind
+            break
+    else:
+        return None
+
+    if kind != 'class':
+        return None, None, qualified
+    docname = _find_stub(env, compoundname)
+    if docname is None:
+        return None, None, qualified
+    # members that the cpp domain could not find are not documented on the
+    # page, so only the class itself gets an anchor
+    anchor = cpp_id(qualified, 'class') if qualified == compoundname else None
+    return docname, anchor, qualified
+
+
+def resolve_missing_reference(app, env, node, contnode):
+    """Handler of the `missing-reference` event for the cpp domain."""
+    if node.get('refdomain') != 'cpp':
+        return None
+    target = node.get('reftarget', '')
+    key = (cpp_scope_name(node.get('cpp:parent_key')), target)
+    try:
+        result = _resolved[key]
+    except KeyError:
+        result = _resolved[key] = _resolve(env, key[0], target)
+
+    if result is None:
+        return None  # not a doxygen object: let sphinx warn about it
+    docname, anchor, qualified = result
+    if docname is None:
+        return contnode
+    return make_refnode(app.builder, node['refdoc'], docname, anchor, contnode, qualified)
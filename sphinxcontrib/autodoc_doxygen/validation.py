@@ -0,0 +1,120 @@
+"""Check the names of all the autodoxy* directives against the doxygen index,
+before sphinx reads any document.
+
+A misspelled or removed name otherwise only fails the build once sphinx
+reads the document using it, which can be minutes into a large build, and
+only the first failure is reported. With ``autodoc_doxygen_validate =
+True``, `validate_autodoxy_names` scans the sources at ``builder-inited``,
+resolves each distinct name once, and reports all the failures in a single
+error. The ``--check`` option of ``autodoc-doxygen-index`` does the same
+without sphinx.
+"""
+from __future__ import print_function, absolute_import, division
+
+import os
+
+from sphinx.errors import ExtensionError
+from sphinx.util import logging
+
+from . import get_doxygen_index
+from .autodoc import DoxygenMethodDocumenter, DoxygenFunctionDocumenter
+from .autosummary.generate import find_autodoxy_in_files
+from .index import split_signature
+
+logger = logging.getLogger(__name__)
+
+
+def _find_compound(index, name, scope, kind=None):
+    compound = index.find_compound(split_signature(name)[0].replace('.', '::'))
+    if compound is None or (kind is not None and compound.get('kind') != kind):
+        return None
+    return compound
+
+
+def _find_member(index, name, kind, sections=None):
+    name, overload = split_signature(name)
+    name = name.replace('.', '::')
+    if '::' not in name:
+        return None
+    modname, objname = name.rsplit('::', 1)
+    if kind == 'function':
+        if overload is not None:
+            return index.find_overload(modname, objname, overload)
+        members = index.find_members(modname, objname, kind=kind, sections=sections) or \
+            index.find_inherited(modname, objname)
+    else:
+        members = index.find_members(modname, objname, kind=kind)
+    return members[0] if members else None
+
+
+def _resolve(index, name, scope, kinds):
+    # like `import_by_name`, in the cpp:namespace in effect
+    found = index.resolve(name, scope)
+    if found is None:
+        return None
+    obj = found[1]
+    return obj if obj.tag == 'compounddef' or obj.get('kind') in kinds else None
+
+
+# directive -> function(index, name, scope) returning the element it documents,
+# the way the directive looks it up, or None
+_FINDERS = {
+    'autodoxyclass': _find_compound,
+    'autodoxynamespace': lambda index, name, scope: _find_compound(index, name, scope, 'namespace'),
+    'autodoxymethod': lambda index, name, scope: _find_member(
+        index, name, 'function', DoxygenMethodDocumenter.sections),
+    'autodoxyfunction': lambda index, name, scope: _find_member(
+        index, name, 'function', DoxygenFunctionDocumenter.sections),
+    'autodoxytypedef': lambda index, name, scope: _find_member(index, name, 'typedef'),
+    'autodoxysummary': lambda index, name, scope: _resolve(index, name, scope, ('function',)),
+    'autodoxyenum': lambda index, name, scope: _resolve(index, name, scope, ('enum',)),
+}
+
+
+def check_autodoxy_names(items, get_index=get_doxygen_index):
+    """Look the names of the autodoxy* directives *items* (as returned by
+    `find_autodoxy_in_lines`) up in the doxygen index of their project,
+    given by *get_index*, the way the directives do.
+
+    Each distinct name is only looked up once. Returns the list of the
+    failures, as "filename:lineno: message" strings, in the order of
+    *items*.
+    """
+    failures = []
+    errors = {}
+    for directive, name, project, scope, filename, lineno in items:
+        key = (directive, name, project, scope)
+        if key not in errors:
+            errors[key] = _check_name(directive, name, project, scope, get_index)
+        if errors[key] is not None:
+            failures.append('%s:%d: %s' % (filename, lineno, errors[key]))
+    return failures
+
+
+def _check_name(directive, name, project, scope, get_index):
+    try:
+        index = get_index(project)
+    except ExtensionError as e:
+        return '%s %s: %s' % (directive, name, e.args[0].replace('[autodoc_doxygen] ', ''))
+    if _FINDERS[directive](index, name, scope) is None:
+        where = ' in %s' % scope if scope and directive in ('autodoxysummary', 'autodoxyenum') else ''
+        return '%s %s: not found in the doxygen index%s' % (directive, name, where)
+    return None
+
+
+def validate_autodoxy_names(app):
+    """Check the names of the autodoxy* directives of all the sources before
+    they are read, if the ``autodoc_doxygen_validate`` config value is set,
+    and raise an `ExtensionError` listing all the names that are not found.
+    """
+    if not app.config.autodoc_doxygen_validate:
+        return
+    env = app.builder.env
+    filenames = [env.doc2path(docname) for docname in sorted(env.found_docs)]
+    items = find_autodoxy_in_files([f for f in filenames if os.path.isfile(f)])
+    failures = check_autodoxy_names(
+        [item[:4] + (os.path.relpath(item[4], app.srcdir),) + item[5:] for item in items])
+    if failures:
+        raise ExtensionError('[autodoc_doxygen] %d autodoxy directive names not found:\n%s' % (
+            len(failures), '\n'.join(failures)))
+    logger.info('[autodoc_doxygen] checked %d autodoxy directive names' % len(items))
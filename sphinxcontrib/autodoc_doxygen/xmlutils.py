@@ -1,78 +1,183 @@
 from __future__ import print_function, absolute_import, division
-from . import get_doxygen_root
+from . import get_doxygen_index
 
 
-def format_xml_paragraph(xmlnode):
+def format_xml_paragraph(xmlnode, index=None):
     """Format an Doxygen XML segment (principally a detaileddescription)
     as a paragraph for inclusion in the rst document
 
     Parameters
     ----------
     xmlnode
+    index
+        The `DoxygenIndex` used to resolve references. Defaults to the
+        index of the default project.
 
     Returns
     -------
     lines
         A list of lines.
     """
-    return [l.rstrip() for l in _DoxygenXmlParagraphFormatter().generic_visit(xmlnode).lines]
+    if len(xmlnode) == 0:
+        return ['']  # the text of the node itself is not part of the paragraph
+    formatter = _DoxygenXmlParagraphFormatter(index)
+    formatter.generic_visit(xmlnode)
+    return [''.join(line).rstrip() for line in formatter.lines]
+
+
+def ref_name(index, refid):
+    """Get the qualified name a ``<ref>`` to *refid* links to: the name of the
+    compound or member of *index*, or of its tag if it is not loaded (see
+    `DoxygenIndex.find_tag`), '' if it is unknown, or None if the target was
+    deliberately not loaded (see `DoxygenIndex.find_excluded`).
+    """
+    ref = index.find_id(refid)
+    if ref is None:
+        if index.find_excluded(refid) is not None:
+            return None
+        # a compound or member of the tagfile that is not loaded
+        return index.find_tag(refid) or ''
+    if ref.tag == 'memberdef':
+        parent = next(ref.iterancestors('compounddef')).findtext('compoundname')
+        return parent + '::' + ref.findtext('name')
+    elif ref.tag == 'compounddef':
+        return ref.findtext('./compoundname') or ''
+    elif ref.tag == 'enumvalue':
+        name_node = ref.find('./name')
+        return name_node.text if name_node is not None else ''
+    raise NotImplementedError(ref.tag)
 
 
 class _DoxygenXmlParagraphFormatter(object):
     # This class follows the model of the stdlib's ast.NodeVisitor for tree traversal
     # where you dispatch on the element type to a different method for each node
-    # during the traverse.
+    # during the traverse. The methods are looked up once, in the `visitors` table
+    # (built from the visit_* methods below the class). Elements without a visitor
+    # only have their children visited.
 
-    # It's supposed to handle paragraphs, references, preformatted text (code blocks), and lists.
+    # It's supposed to handle paragraphs, references, preformatted text (code blocks),
+    # lists, tables, links, formulas and some inline markup.
 
-    def __init__(self):
-        self.lines = ['']
+    # The output is built in a single pass over the tree: each line is a list of
+    # fragments, joined at the end. Nested structures (parameter lists, list items,
+    # table cells...) are rendered at the end of the output like anything else,
+    # then taken back out (see `begin` and `end`) to be indented or prefixed.
+
+    visitors = {}  # tag -> unbound visit_* method
+
+    def __init__(self, index=None):
+        self.index = index
+        self.lines = [[]]
         self.continue_line = False
+        # a paragraph without text starts on a new line only if it writes inline text
+        self.pending_paragraph = False
 
     def visit(self, node):
-        method = 'visit_' + node.tag
-        visitor = getattr(self, method, self.generic_visit)
-        return visitor(node)
+        visitor = self.visitors.get(node.tag)
+        if visitor is None:
+            self.generic_visit(node)
+        else:
+            visitor(self, node)
 
     def generic_visit(self, node):
-        for child in node.getchildren():
-            self.visit(child)
-        return self
-
-    def visit_ref(self, node):
-        ref = get_doxygen_root().findall('.//*[@id="%s"]' % node.get('refid'))
-        if ref:
-            ref = ref[0]
-            if ref.tag == 'memberdef':
-                parent = ref.xpath('./ancestor::compounddef/compoundname')[0].text
-                name = ref.find('./name').text
-                real_name = parent + '::' + name
-            elif ref.tag in ('compounddef', 'enumvalue'):
-                name_node = ref.find('./name')
-                real_name = name_node.text if name_node is not None else ''
+        visitors = self.visitors
+        for child in node:
+            visitor = visitors.get(child.tag)
+            if visitor is None:
+                self.generic_visit(child)
             else:
-                raise NotImplementedError(ref.tag)
-        else:
-            real_name = None
+                visitor(self, child)
+
+    def write(self, text):
+        """Append *text* to the current line."""
+        if self.pending_paragraph:
+            self.pending_paragraph = False
+            self.lines.append([])
+        self.lines[-1].append(text)
+
+    def write_inline(self, markup, tail):
+        """Append inline *markup* and the text following it to the current
+        line, escaping the whitespace reST requires around the markup.
+        """
+        line = self.lines[-1]
+        if not self.pending_paragraph and line and line[-1] and not line[-1][-1].isspace() \
+                and line[-1][-1] not in '([{<"\'-/':
+            markup = '\\ ' + markup
+        if tail and not tail[0].isspace() and tail[0] not in '.,;:!?)]}>"\'-/\\':
+            markup += '\\ '
+        self.write(markup + (tail or ''))
+
+    def newline(self, text=''):
+        """Start a new line with *text*."""
+        self.pending_paragraph = False
+        self.lines.append([text])
 
-        val = [':cpp:any:`', node.text]
+    def extend(self, lines):
+        self.pending_paragraph = False
+        self.lines.extend([line] for line in lines)
+
+    def begin(self):
+        """Start rendering a nested structure on a new line. Returns the mark
+        to pass to `end`.
+        """
+        mark = (len(self.lines), self.continue_line)
+        self.newline()
+        self.continue_line = False
+        return mark
+
+    def end(self, mark):
+        """Take the lines rendered since `begin` returned *mark* out of the
+        output, and return them.
+        """
+        start, self.continue_line = mark
+        lines = [''.join(line) for line in self.lines[start:]]
+        del self.lines[start:]
+        self.pending_paragraph = False
+        return lines
+
+    def render_nested(self, node):
+        """Render the children of *node* as a nested structure, without its
+        leading and trailing blank lines.
+        """
+        mark = self.begin()
+        self.generic_visit(node)
+        lines = self.end(mark)
+        while lines and not lines[0].strip():
+            lines.pop(0)
+        while lines and not lines[-1].strip():
+            lines.pop()
+        return lines
+
+    def write_tail(self, node):
+        """Continue the text after a block element on a new line."""
+        self.newline((node.tail or '').lstrip())
+        self.continue_line = False
+
+    def visit_ref(self, node):
+        index = self.index
+        if index is None:
+            index = self.index = get_doxygen_index()
+        real_name = ref_name(index, node.get('refid'))
+        if real_name is None:
+            # the target was deliberately not loaded, so it won't be documented
+            # anywhere: render the reference as plain text
+            self.write((node.text or '') + (node.tail or ''))
+            return
         if real_name:
-            val.extend((' <', real_name, '>`'))
+            self.write(':cpp:any:`%s <%s>`%s' % (node.text or '', real_name, node.tail or ''))
         else:
-            val.append('`')
-        if node.tail is not None:
-            val.append(node.tail)
-
-        self.lines[-1] += ''.join(val)
+            self.write(':cpp:any:`%s`%s' % (node.text or '', node.tail or ''))
 
     def visit_para(self, node):
         if node.text is not None:
             if self.continue_line:
-                self.lines[-1] += node.text
+                self.write(node.text)
             else:
-                self.lines.append(node.text)
+                self.newline(node.text)
+        elif not self.continue_line:
+            self.pending_paragraph = True
         self.generic_visit(node)
-        self.lines.append('')
+        self.newline()
         self.continue_line = False
 
     def visit_parametername(self, node):
@@ -81,35 +186,89 @@ class _DoxygenXmlParagraphFormatter(object):
         else:
             direction = ''
 
-        self.lines.append('**%s** -- %s' % (
-            node.text, direction))
+        self.newline('**%s** -- %s' % (node.text, direction))
         self.continue_line = True
 
     def visit_parameterlist(self, node):
-        lines = [l for l in type(self)().generic_visit(node).lines if l is not '']
-        self.lines.extend([':parameters:', ''] + ['* %s' % l for l in lines] + [''])
+        mark = self.begin()
+        self.generic_visit(node)
+        lines = [l for l in self.end(mark) if l != '']
+        self.extend([':parameters:', ''] + ['* %s' % l for l in lines] + [''])
 
     def visit_simplesect(self, node):
         if node.get('kind') == 'return':
-            self.lines.append(':returns: ')
+            self.newline(':returns: ')
             self.continue_line = True
         self.generic_visit(node)
 
+    def visit_itemizedlist(self, node):
+        self.render_list(node, '- ')
+
+    def visit_orderedlist(self, node):
+        self.render_list(node, '#. ')
+
+    def render_list(self, node, marker):
+        self.newline()
+        for item in node.iterchildren('listitem'):
+            self.render_list_item(item, marker)
+        self.newline()
+        self.write_tail(node)
+
     def visit_listitem(self, node):
-        self.lines.append('   - ')
-        self.continue_line = True
-        self.generic_visit(node)
+        # an item outside of a list
+        self.render_list_item(node, '- ')
+        self.newline()
+
+    def render_list_item(self, node, marker):
+        lines = self.render_nested(node) or ['']
+        indent = ' ' * len(marker)
+        self.extend([marker + lines[0]] + [indent + l if l else l for l in lines[1:]])
+
+    def visit_variablelist(self, node):
+        # a definition list: the terms are in varlistentry elements, each
+        # followed by the listitem defining it
+        self.newline()
+        for child in node.iterchildren('varlistentry', 'listitem'):
+            if child.tag == 'varlistentry':
+                self.extend([' '.join(self.render_nested(child))])
+            else:
+                self.extend(['   ' + l if l else l for l in self.render_nested(child)])
+        self.newline()
+        self.write_tail(node)
+
+    def visit_table(self, node):
+        rows = []
+        header_rows = 0
+        for row in node.iterchildren('row'):
+            entries = list(row.iterchildren('entry'))
+            if len(rows) == header_rows and entries and all(e.get('thead') == 'yes' for e in entries):
+                header_rows += 1
+            rows.append([self.render_nested(entry) for entry in entries])
+
+        caption = node.findtext('caption')
+        self.newline()
+        self.extend(['.. list-table::' + (' ' + caption.strip() if caption else '')])
+        if header_rows:
+            self.extend(['   :header-rows: %d' % header_rows])
+        self.extend([''])
+        for row in rows:
+            for i, lines in enumerate(row):
+                lines = lines or ['']
+                self.extend(['%s- %s' % ('   * ' if i == 0 else '     ', lines[0])] +
+                            ['       ' + l if l else l for l in lines[1:]])
+        self.newline()
+        self.write_tail(node)
 
     def visit_preformatted(self, node):
         segment = [node.text if node.text is not None else '']
-        for n in node.getchildren():
-            segment.append(n.text)
+        for n in node:
+            segment.append(n.text or '')
             if n.tail is not None:
                 segment.append(n.tail)
 
         lines = ''.join(segment).split('\n')
-        self.lines.extend(('.. code-block:: C++', ''))
-        self.lines.extend(['  ' + l for l in lines])
+        self.extend(('.. code-block:: C++', ''))
+        self.extend(['  ' + l for l in lines])
 
     def visit_computeroutput(self, node):
         c = node.find('preformatted')
@@ -118,11 +277,54 @@ class _DoxygenXmlParagraphFormatter(object):
         return self.visit_preformatted(node)
 
     def visit_xrefsect(self, node):
-        if node.find('xreftitle').text == 'Deprecated':
-            sublines = type(self)().generic_visit(node).lines
-            self.lines.extend(['.. admonition:: Deprecated'] + ['   ' + s for s in sublines])
-        else:
-            raise ValueError(node)
+        title = node.findtext('xreftitle') or ''
+        mark = self.begin()
+        self.generic_visit(node)
+        sublines = self.end(mark)
+        self.extend(['.. admonition:: %s' % title] + ['   ' + s for s in sublines])
 
     def visit_subscript(self, node):
-        self.lines[-1] += '\ :sub:`%s` %s' % (node.text, node.tail)
+        self.write('\\ :sub:`%s` %s' % (node.text, node.tail or ''))
+
+    def visit_superscript(self, node):
+        self.write('\\ :sup:`%s` %s' % (node.text, node.tail or ''))
+
+    def visit_anchor(self, node):
+        if node.tail:
+            self.write(node.tail)
+
+    def visit_linebreak(self, node):
+        # the line goes on: a line break would end the item of a parameter list
+        self.write(' ' + (node.tail or ''))
+
+    def visit_bold(self, node):
+        text = ''.join(node.itertext()).strip()
+        self.write_inline('**%s**' % text if text else '', node.tail)
+
+    def visit_emphasis(self, node):
+        text = ''.join(node.itertext()).strip()
+        self.write_inline('*%s*' % text if text else '', node.tail)
+
+    def visit_ulink(self, node):
+        url = node.get('url', '')
+        text = ''.join(node.itertext()).strip()
+        if text and text != url:
+            self.write_inline('`%s <%s>`__' % (text, url), node.tail)
+        else:
+            self.write_inline(url, node.tail)
+
+    def visit_formula(self, node):
+        text = (node.text or '').strip()
+        if len(text) > 1 and text.startswith('$') and text.endswith('$'):
+            self.write_inline(':math:`%s`' % text[1:-1].strip(), node.tail)
+            return
+        if text.startswith('\\[') and text.endswith('\\]'):
+            text = text[2:-2].strip()
+        self.newline()
+        self.extend(['.. math::', ''] + ['   ' + l.strip() for l in text.split('\n')] + [''])
+        self.write_tail(node)
+
+
+_DoxygenXmlParagraphFormatter.visitors = dict(
+    (name[len('visit_'):], method) for name, method in vars(_DoxygenXmlParagraphFormatter).items()
+    if name.startswith('visit_'))
@@ -0,0 +1,48 @@
+import importlib.util
+import os
+
+spec = importlib.util.spec_from_file_location(
+    'benchmark', os.path.join(os.path.dirname(__file__), '..', 'examples', 'openmm', 'benchmark.py'))
+benchmark = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(benchmark)
+
+
+def run(wall, peak_rss_mb=100.0, documents_read=7):
+    return {'wall': wall, 'peak_rss_mb': peak_rss_mb, 'documents_read': documents_read}
+
+
+def test_compare_thresholds():
+    baseline = {'runs': {'cold': run(10.0), 'warm': run(1.0)}}
+    thresholds = {'wall': 0.25, 'peak_rss_mb': 0.20}
+
+    # within the threshold plus the slack: 10 * 1.25 + 0.25 and 1 * 1.25 + 0.25
+    assert benchmark.compare({'cold': run(12.75), 'warm': run(1.5)}, baseline, thresholds) == []
+    assert benchmark.compare({'cold': run(12.8), 'warm': run(1.55)}, baseline, thresholds) == [
+        'cold: wall 12.8 > 10.0 (+28%)', 'warm: wall 1.55 > 1.0 (+55%)']
+    # 100 * 1.2 + 5 MB
+    assert benchmark.compare({'cold': run(10.0, 125.0)}, baseline, thresholds) == []
+    assert benchmark.compare({'cold': run(10.0, 125.5)}, baseline, thresholds) == [
+        'cold: peak_rss_mb 125.5 > 100.0 (+25%)']
+    # without slack
+    assert benchmark.compare({'warm': run(1.3)}, baseline, thresholds, slack={}) == [
+        'warm: wall 1.3 > 1.0 (+30%)']
+
+
+def test_compare_missing_values():
+    thresholds = {'wall': 0.25, 'peak_rss_mb': 0.20}
+    # the peak RSS is unknown on some platforms, in the results or the baseline
+    baseline = {'runs': {'cold': run(10.0, None)}}
+    assert benchmark.compare({'cold': run(10.0, 500.0)}, baseline, thresholds) == []
+    baseline = {'runs': {'cold': run(10.0)}}
+    assert benchmark.compare({'cold': run(10.0, None)}, baseline, thresholds) == []
+    # runs missing on either side are not compared
+    assert benchmark.compare({'warm': run(100.0)}, baseline, thresholds) == []
+
+
+def test_compare_documents_read():
+    baseline = {'runs': {'touched': run(1.0, documents_read=2)}}
+    thresholds = {'wall': 0.25}
+    assert benchmark.compare({'touched': run(1.0, documents_read=2)}, baseline, thresholds) == []
+    assert benchmark.compare({'touched': run(1.0, documents_read=1)}, baseline, thresholds) == []
+    assert benchmark.compare({'touched': run(1.0, documents_read=7)}, baseline, thresholds) == [
+        'touched: 7 documents read instead of 2']
@@ -1,5 +1,7 @@
 from lxml import etree as ET
+from sphinxcontrib.autodoc_doxygen.index import DoxygenIndex
 from sphinxcontrib.autodoc_doxygen.xmlutils import format_xml_paragraph
+import sphinxcontrib.autodoc_doxygen
 
 
 
@@ -246,3 +248,87 @@ Get the force field parameters for an angle term.
 
 '''
     assert '\n'.join(format_xml_paragraph(node)) == expected
+
+
+def test_excluded_ref():
+    root = ET.Element('root')
+    index = DoxygenIndex(root, excluded={'namespaceOpenMM_1_1detail': 'OpenMM::detail'})
+    setup = sphinxcontrib.autodoc_doxygen.setup
+    setup.DOXYGEN_ROOT, setup.DOXYGEN_INDEX = root, index
+    try:
+        node = ET.fromstring('<detaileddescription><para>See <ref refid="namespaceOpenMM_1_1detail" '
+                             'kindref="compound">detail</ref> and <ref refid="classOpenMM_1_1Force" '
+                             'kindref="compound">Force</ref>.</para></detaileddescription>')
+        assert format_xml_paragraph(node) == ['', 'See detail and :cpp:any:`Force`.', '']
+    finally:
+        del setup.DOXYGEN_ROOT, setup.DOXYGEN_INDEX
+
+
+def test_inline_markup():
+    node = ET.fromstring('''<detaileddescription>
+<para><bold>Note:</bold> the energy is <emphasis>not</emphasis> conserved (see <ulink url="http://docs.openmm.org">the manual</ulink> or <ulink url="http://openmm.org">http://openmm.org</ulink>). It is <formula id="0">$E = k x^2$</formula>, or<formula id="1">\\[ E = k x \\]</formula> otherwise.</para>
+</detaileddescription>''')
+
+    expected = '''
+**Note:** the energy is *not* conserved (see `the manual <http://docs.openmm.org>`__ or http://openmm.org). It is :math:`E = k x^2`, or
+
+.. math::
+
+   E = k x
+
+otherwise.
+'''
+    assert '\n'.join(format_xml_paragraph(node, DoxygenIndex(ET.Element('root')))) == expected
+
+
+def test_lists():
+    node = ET.fromstring('''<detaileddescription>
+<para>The steps are:<orderedlist>
+<listitem><para>Compute the forces.</para></listitem>
+<listitem><para>Update the velocities, either:</para><itemizedlist>
+<listitem><para>globally</para></listitem>
+<listitem><para>per degree of freedom</para></listitem>
+</itemizedlist></listitem>
+</orderedlist>Then repeat.</para>
+</detaileddescription>''')
+
+    expected = '''
+The steps are:
+
+#. Compute the forces.
+#. Update the velocities, either:
+
+
+   - globally
+   - per degree of freedom
+
+Then repeat.
+'''
+    assert '\n'.join(format_xml_paragraph(node, DoxygenIndex(ET.Element('root')))) == expected
+
+
+def test_table():
+    node = ET.fromstring('''<detaileddescription>
+<para><table rows="3" cols="2"><row>
+<entry thead="yes"><para>Method</para></entry><entry thead="yes"><para>Cutoff</para></entry></row>
+<row><entry thead="no"><para>NoCutoff</para></entry><entry thead="no"><para>no</para></entry></row>
+<row><entry thead="no"><para>CutoffPeriodic</para></entry><entry thead="no"><para>yes, <bold>periodic</bold></para></entry></row>
+</table>
+</para>
+</detaileddescription>''')
+
+    expected = '''
+
+.. list-table::
+   :header-rows: 1
+
+   * - Method
+     - Cutoff
+   * - NoCutoff
+     - no
+   * - CutoffPeriodic
+     - yes, **periodic**
+
+
+'''
+    assert '\n'.join(format_xml_paragraph(node, DoxygenIndex(ET.Element('root')))) == expected
@@ -0,0 +1,234 @@
+import lxml.etree as ET
+
+import sphinxcontrib.autodoc_doxygen
+from sphinxcontrib.autodoc_doxygen.autosummary.generate import generate_autosummary_docs
+from sphinxcontrib.autodoc_doxygen.inventory import iter_inventory
+
+
+CLASS_XML = '''
+<root>
+  <compounddef id="classOpenMM_1_1Force" kind="class" language="C++" prot="public">
+    <compoundname>OpenMM::Force</compoundname>
+    <sectiondef kind="public-func">
+      <memberdef kind="function" id="classOpenMM_1_1Force_1a1" prot="public" static="no">
+        <type>int</type>
+        <definition>int OpenMM::Force::getForceGroup</definition>
+        <argsstring>() const </argsstring>
+        <name>getForceGroup</name>
+      </memberdef>
+    </sectiondef>
+  </compounddef>
+</root>'''
+
+SOURCE = '''
+.. autodoxysummary::
+   :toctree: generated/
+   :template: custom.rst
+
+   OpenMM::Force
+'''
+
+
+def test_stub_staleness(tmpdir):
+    setup = sphinxcontrib.autodoc_doxygen.setup
+    setup.DOXYGEN_ROOT = ET.fromstring(CLASS_XML)
+    try:
+        tmpdir.join('index.rst').write(SOURCE)
+        templates = tmpdir.mkdir('templates')
+        templates.join('custom.rst').write('{{ fullname }}\n{% include "methods.rst" %}\n')
+        templates.join('methods.rst').write('{{ methods|join(",") }}')
+        stub = tmpdir.join('generated', 'OpenMM.Force.rst')
+
+        def generate():
+            generate_autosummary_docs(['index.rst'], base_path=str(tmpdir), template_dir=str(templates),
+                                      cache_dir=str(tmpdir.join('cache')))
+
+        generate()
+        assert stub.read() == 'OpenMM::Force\ngetForceGroup'
+        assert tmpdir.join('cache', 'jinja').listdir()
+
+        # unchanged template and values: the stub is kept as is
+        stub.write('edited')
+        generate()
+        assert stub.read() == 'edited'
+
+        # a change in an included template regenerates the stub
+        templates.join('methods.rst').write('methods: {{ methods|join(",") }}')
+        generate()
+        assert stub.read() == 'OpenMM::Force\nmethods: getForceGroup'
+
+        # stubs that were not generated by us are never overwritten
+        tmpdir.join('cache', 'stubs.json').write('{}')
+        stub.write('handwritten')
+        templates.join('methods.rst').write('')
+        generate()
+        assert stub.read() == 'handwritten'
+    finally:
+        del setup.DOXYGEN_ROOT
+
+
+def test_sharded_class(tmpdir):
+    setup = sphinxcontrib.autodoc_doxygen.setup
+    setup.DOXYGEN_ROOT = ET.fromstring(CLASS_XML.replace(
+        '</sectiondef>',
+        '<memberdef kind="function" id="f2"><type>void</type><argsstring>()</argsstring><name>a</name></memberdef>'
+        '<memberdef kind="function" id="f3"><type>void</type><argsstring>()</argsstring><name>b</name></memberdef>'
+        '</sectiondef>'))
+    try:
+        tmpdir.join('index.rst').write(SOURCE.replace('   :template: custom.rst\n', ''))
+        generate_autosummary_docs(['index.rst'], base_path=str(tmpdir), shard_threshold=2, shard_size=2)
+
+        generated = tmpdir.join('generated')
+        assert sorted(generated.listdir(), key=str) == [
+            generated.join(f) for f in ('OpenMM.Force.methods-1.rst', 'OpenMM.Force.methods-2.rst', 'OpenMM.Force.rst')]
+        page = generated.join('OpenMM.Force.rst').read()
+        assert ':members:' not in page
+        assert 'OpenMM.Force.methods-1\n      OpenMM.Force.methods-2\n' in page
+        shard = generated.join('OpenMM.Force.methods-2.rst').read()
+        assert '.. cpp:namespace:: OpenMM::Force' in shard
+        assert '.. autodoxymethod:: OpenMM::Force::b' in shard
+    finally:
+        del setup.DOXYGEN_ROOT
+
+
+SHARDED_XML = '''
+<root>
+  <compounddef id="classNS_1_1Base" kind="class">
+    <compoundname>NS::Base</compoundname>
+    <sectiondef kind="public-func">
+      <memberdef kind="function" id="b1"><type>void</type><argsstring>()</argsstring><name>b</name></memberdef>
+    </sectiondef>
+  </compounddef>
+  <compounddef id="classNS_1_1Derived" kind="class">
+    <compoundname>NS::Derived</compoundname>
+    <basecompoundref prot="public">NS::Base</basecompoundref>
+    <sectiondef kind="public-func">
+      <memberdef kind="function" id="d1"><type>void</type><argsstring>()</argsstring><name>a</name></memberdef>
+    </sectiondef>
+    <sectiondef kind="public-static-func">
+      <memberdef kind="function" id="d2" static="yes"><type>void</type><argsstring>()</argsstring><name>s</name></memberdef>
+    </sectiondef>
+  </compounddef>
+</root>'''
+
+
+def test_shard_threshold_counts(tmpdir):
+    # the static and inherited methods count towards the threshold, since
+    # they go on the method pages, and the inventory links to those pages
+    setup = sphinxcontrib.autodoc_doxygen.setup
+    setup.DOXYGEN_ROOT = ET.fromstring(SHARDED_XML)
+    try:
+        tmpdir.join('index.rst').write('.. autodoxysummary::\n   :toctree: generated/\n\n   NS::Derived\n')
+        generate_autosummary_docs(['index.rst'], base_path=str(tmpdir), shard_threshold=2, shard_size=2,
+                                  inherited_members=True)
+        generated = tmpdir.join('generated')
+        assert '.. autodoxymethod:: NS::Derived::s' in generated.join('NS.Derived.methods-1.rst').read()
+        assert '.. autodoxymethod:: NS::Derived::b' in generated.join('NS.Derived.methods-2.rst').read()
+
+        index = sphinxcontrib.autodoc_doxygen.get_doxygen_index()
+        pages = dict((name, uri.split('#')[0]) for name, role, uri in iter_inventory(
+            index, shard_threshold=2, shard_size=2, inherited_members=True))
+        assert pages['NS::Derived::a'] == pages['NS::Derived::s'] == 'generated/NS.Derived.methods-1.html'
+        assert pages['NS::Derived::b'] == 'generated/NS.Derived.methods-2.html'
+
+        # without the inherited methods, the class is not sharded
+        pages = dict((name, uri.split('#')[0]) for name, role, uri in iter_inventory(
+            index, shard_threshold=2, shard_size=2))
+        assert pages['NS::Derived::s'] == 'generated/NS.Derived.html'
+        assert 'NS::Derived::b' not in pages
+    finally:
+        del setup.DOXYGEN_ROOT, setup.DOXYGEN_INDEX
+
+
+CHECKED_SOURCE = '''
+.. autodoxyclass:: OpenMM::Force
+
+.. autodoxymethod:: OpenMM::Force::getForceGroup() const
+.. autodoxymethod:: OpenMM::Force::setForceGroup
+
+.. cpp:namespace:: OpenMM
+
+.. autodoxysummary::
+   :toctree: generated/
+
+   Force
+   ~Force::getForceGroup
+   Missing
+
+.. autodoxynamespace:: OpenMM
+   :project: other
+'''
+
+
+def test_check_autodoxy_names(tmpdir):
+    from sphinxcontrib.autodoc_doxygen.autosummary.generate import find_autodoxy_in_lines
+    from sphinxcontrib.autodoc_doxygen.indexer import main
+    from sphinxcontrib.autodoc_doxygen.validation import check_autodoxy_names
+
+    items = find_autodoxy_in_lines(CHECKED_SOURCE.splitlines(), filename='index.rst')
+    assert items == [
+        ('autodoxyclass', 'OpenMM::Force', None, None, 'index.rst', 2),
+        ('autodoxymethod', 'OpenMM::Force::getForceGroup() const', None, None, 'index.rst', 4),
+        ('autodoxymethod', 'OpenMM::Force::setForceGroup', None, None, 'index.rst', 5),
+        ('autodoxysummary', 'Force', None, 'OpenMM', 'index.rst', 12),
+        ('autodoxysummary', 'Force::getForceGroup', None, 'OpenMM', 'index.rst', 13),
+        ('autodoxysummary', 'Missing', None, 'OpenMM', 'index.rst', 14),
+        ('autodoxynamespace', 'OpenMM', 'other', 'OpenMM', 'index.rst', 16),
+    ]
+
+    setup = sphinxcontrib.autodoc_doxygen.setup
+    setup.DOXYGEN_ROOT = ET.fromstring(CLASS_XML)
+    try:
+        # all the failures are reported at once
+        assert check_autodoxy_names(items) == [
+            'index.rst:5: autodoxymethod OpenMM::Force::setForceGroup: not found in the doxygen index',
+            'index.rst:14: autodoxysummary Missing: not found in the doxygen index in OpenMM',
+            'index.rst:16: autodoxynamespace OpenMM: not found in the doxygen index',
+        ]
+    finally:
+        del setup.DOXYGEN_ROOT
+
+    xmldir = tmpdir.mkdir('xml')
+    xmldir.join('classOpenMM_1_1Force.xml').write(
+        '<doxygen>%s</doxygen>' % CLASS_XML.strip()[len('<root>'):-len('</root>')])
+    tmpdir.join('index.rst').write(CHECKED_SOURCE)
+    assert main([str(xmldir), '--check', str(tmpdir), '-q']) == 1
+    tmpdir.join('index.rst').write(SOURCE)
+    assert main([str(xmldir), '--check', str(tmpdir.join('index.rst')), '-q']) == 0
+
+
+EXAMPLES_SOURCE = '''
+The class is documented with::
+
+    .. autodoxyclass:: OpenMM::Missing
+
+and the summary with
+
+.. code-block:: rst
+
+   .. cpp:namespace:: Other
+
+   .. autodoxysummary::
+
+      Missing
+
+.. a comment
+   .. autodoxymethod:: OpenMM::Force::missing
+
+.. note::
+
+   .. autodoxyclass:: OpenMM::Force
+
+      ::
+
+         .. autodoxyclass:: OpenMM::Missing
+'''
+
+
+def test_find_autodoxy_skips_examples():
+    from sphinxcontrib.autodoc_doxygen.autosummary.generate import find_autodoxy_in_lines
+
+    # the directives shown in literal blocks and comments are not documented
+    assert find_autodoxy_in_lines(EXAMPLES_SOURCE.splitlines(), filename='index.rst') == [
+        ('autodoxyclass', 'OpenMM::Force', None, None, 'index.rst', 21),
+    ]
@@ -0,0 +1,564 @@
+import hashlib
+import io
+import json
+import os
+import posixpath
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import lxml.etree as ET
+import pytest
+from mock import Mock
+from sphinx.errors import ExtensionError
+from sphinx.util.inventory import InventoryFile
+
+import sphinxcontrib.autodoc_doxygen
+from sphinxcontrib.autodoc_doxygen import (
+    get_doxygen_index, get_outdated_docs, note_doxygen_compound, start_doxygen_xml)
+from sphinxcontrib.autodoc_doxygen.index import (
+    CompoundFilter, DoxygenIndex, Tag, is_index_file, list_xml_files, load_xml_dir, normalize_signature,
+    read_tagfile, select_xml_files, split_signature)
+from sphinxcontrib.autodoc_doxygen.autosummary import import_by_name
+from sphinxcontrib.autodoc_doxygen.indexer import main
+from sphinxcontrib.autodoc_doxygen.inventory import iter_inventory
+from sphinxcontrib.autodoc_doxygen.prefetch import plan_compounds
+
+
+CLASS_XML = '''<?xml version='1.0' encoding='UTF-8' standalone='no'?>
+<doxygen version="1.8.9.1">
+  <compounddef id="classOpenMM_1_1Force" kind="class" language="C++" prot="public">
+    <compoundname>OpenMM::Force</compoundname>
+    <sectiondef kind="public-func">
+      <memberdef kind="function" id="classOpenMM_1_1Force_1a1" prot="public" static="no">
+        <type>int</type>
+        <definition>int OpenMM::Force::getForceGroup</definition>
+        <argsstring>() const </argsstring>
+        <name>getForceGroup</name>
+      </memberdef>
+    </sectiondef>
+  </compounddef>
+</doxygen>
+'''
+
+NAMESPACE_XML = '''<?xml version='1.0' encoding='UTF-8' standalone='no'?>
+<doxygen version="1.8.9.1">
+  <compounddef id="namespaceOpenMM" kind="namespace">
+    <compoundname>OpenMM</compoundname>
+    <innerclass refid="classOpenMM_1_1Force" prot="public">OpenMM::Force</innerclass>
+  </compounddef>
+</doxygen>
+'''
+
+INDEX_XML = '''<?xml version='1.0' encoding='UTF-8' standalone='no'?>
+<doxygenindex version="1.8.9.1">
+  <compound refid="classOpenMM_1_1Force" kind="class"><name>OpenMM::Force</name>
+    <member refid="classOpenMM_1_1Force_1a1" kind="function"><name>getForceGroup</name></member>
+  </compound>
+  <compound refid="namespaceOpenMM" kind="namespace"><name>OpenMM</name>
+  </compound>
+</doxygenindex>
+'''
+
+
+def write_xml_dir(tmpdir):
+    tmpdir.join('classOpenMM_1_1Force.xml').write(CLASS_XML)
+    tmpdir.join('namespaceOpenMM.xml').write(NAMESPACE_XML)
+    tmpdir.join('._namespaceOpenMM.xml').write('')
+    return str(tmpdir)
+
+
+def test_from_xml_files(tmpdir):
+    files = list_xml_files(write_xml_dir(tmpdir))
+    assert [os.path.basename(f) for f in files] == ['classOpenMM_1_1Force.xml', 'namespaceOpenMM.xml']
+
+    index = DoxygenIndex.from_xml_files(files, jobs=2)
+    assert index.find_compound('OpenMM::Force').get('id') == 'classOpenMM_1_1Force'
+    assert index.find_id('classOpenMM_1_1Force_1a1').findtext('name') == 'getForceGroup'
+    assert index.find_id('missing') is None
+    assert index.stats() == {'compounds': 2, 'ids': 3, 'members': 1, 'excluded': 0,
+                             'kinds': {'class': 1, 'namespace': 1}}
+
+
+def test_select_xml_files(tmpdir):
+    xmldir = write_xml_dir(tmpdir)
+    tmpdir.join('index.xml').write(INDEX_XML)
+
+    files, excluded = select_xml_files(xmldir, CompoundFilter(exclude_names=['*::Force']))
+    assert [os.path.basename(f) for f in files] == ['namespaceOpenMM.xml']
+    assert excluded == {'classOpenMM_1_1Force': 'OpenMM::Force',
+                        'classOpenMM_1_1Force_1a1': 'OpenMM::Force::getForceGroup'}
+
+    files, excluded = select_xml_files(xmldir, CompoundFilter(include_kinds=['class']))
+    assert [os.path.basename(f) for f in files] == ['classOpenMM_1_1Force.xml']
+    assert excluded == {'namespaceOpenMM': 'OpenMM'}
+
+    # without a filter, every file is loaded, index.xml included
+    files, excluded = select_xml_files(xmldir, CompoundFilter())
+    assert len(files) == 3 and excluded == {}
+
+
+def test_filter_without_index_xml(tmpdir):
+    files = list_xml_files(write_xml_dir(tmpdir))
+    index = DoxygenIndex.from_xml_files(files, compound_filter=CompoundFilter(include_kinds=['namespace']))
+    assert list(index.compounds) == ['OpenMM']
+    assert index.find_excluded('classOpenMM_1_1Force_1a1') == 'OpenMM::Force::getForceGroup'
+
+
+def test_dump_and_load(tmpdir):
+    index = DoxygenIndex.from_xml_files(list_xml_files(write_xml_dir(tmpdir)))
+    for filename in ('index.xml', 'index.xml.gz'):
+        path = str(tmpdir.join(filename))
+        index.dump(path)
+        loaded = DoxygenIndex.load(path)
+        assert sorted(loaded.compounds) == ['OpenMM', 'OpenMM::Force']
+        assert sorted(loaded.ids) == sorted(index.ids)
+
+
+def test_load_xml_dir_cache(tmpdir):
+    xmldir = write_xml_dir(tmpdir.mkdir('xml'))
+    cache = str(tmpdir.join('cache', 'index.xml'))
+
+    index = load_xml_dir(xmldir, cache=cache)
+    assert os.path.isfile(cache)
+    cached = load_xml_dir(xmldir, cache=cache)
+    assert cached.signature == index.signature
+    assert sorted(cached.compounds) == sorted(index.compounds)
+
+    # a different filter, or a modified file, invalidates the cache
+    filtered = load_xml_dir(xmldir, CompoundFilter(include_kinds=['class']), cache=cache)
+    assert list(filtered.compounds) == ['OpenMM::Force']
+    tmpdir.join('xml', 'namespaceOpenMM.xml').write(NAMESPACE_XML.replace('OpenMM<', 'OpenMM2<'))
+    assert 'OpenMM2' in load_xml_dir(xmldir, cache=cache).compounds
+
+    assert load_xml_dir(str(tmpdir.mkdir('empty')), cache=cache) is None
+
+
+def test_combined_xml(tmpdir, monkeypatch):
+    combined = '<doxygen>%s%s</doxygen>' % tuple(
+        xml.split('?>', 1)[1].replace('<doxygen version="1.8.9.1">', '').replace('</doxygen>', '')
+        for xml in (CLASS_XML, NAMESPACE_XML))
+    tmpdir.join('all.xml').write(combined)
+    all_xml = str(tmpdir.join('all.xml'))
+
+    index = DoxygenIndex.from_xml_stream(io.BytesIO(combined.encode('utf-8')),
+                                         compound_filter=CompoundFilter(include_kinds=['class']))
+    assert list(index.compounds) == ['OpenMM::Force']
+    assert index.find_excluded('namespaceOpenMM') == 'OpenMM'
+
+    for stream_size in (sphinxcontrib.autodoc_doxygen.index.STREAM_SIZE, 0):
+        monkeypatch.setattr(sphinxcontrib.autodoc_doxygen.index, 'STREAM_SIZE', stream_size)
+        index = load_xml_dir(all_xml)
+        assert sorted(index.compounds) == ['OpenMM', 'OpenMM::Force']
+        assert [el.tag for el in index.root] == ['compounddef', 'compounddef']
+        assert index.sources[all_xml].compounds == ('classOpenMM_1_1Force', 'namespaceOpenMM')
+    assert not is_index_file(all_xml)
+
+    # each compound of the combined file has a digest of its own, which only
+    # changes with the compound, descriptions included
+    for lazy_descriptions in (False, True):
+        digests = []
+        for description in ('Namespace.', 'Namespace!', 'Namespace!'):
+            tmpdir.join('all.xml').write(combined.replace(
+                '<compoundname>OpenMM</compoundname>',
+                '<compoundname>OpenMM</compoundname><briefdescription><para>%s</para></briefdescription>'
+                % description))
+            index = load_xml_dir(all_xml, lazy_descriptions=lazy_descriptions)
+            digests.append([index.digest(index.find_compound(name)) for name in ('OpenMM::Force', 'OpenMM')])
+            index.close_files()
+        assert digests[0][0] == digests[1][0] == digests[2][0]
+        assert digests[0][1] != digests[1][1] == digests[2][1]
+
+
+def test_refresh(tmpdir):
+    xmldir = write_xml_dir(tmpdir.mkdir('xml'))
+    cache = str(tmpdir.join('cache', 'index.xml'))
+    index = load_xml_dir(xmldir, cache=cache)
+    assert index.changed == {'OpenMM', 'OpenMM::Force'}
+
+    # touched but identical files are not parsed again
+    os.utime(str(tmpdir.join('xml', 'namespaceOpenMM.xml')), (0, 0))
+    assert load_xml_dir(xmldir, cache=cache).changed == set()
+
+    # a modified file replaces its compound, in place
+    tmpdir.join('xml', 'classOpenMM_1_1Force.xml').write(
+        CLASS_XML.replace('getForceGroup', 'getGroup').replace('_1a1', '_1a2'))
+    refreshed = load_xml_dir(xmldir, cache=cache, previous=index)
+    assert refreshed is index and index.changed == {'OpenMM::Force'}
+    assert index.find_id('classOpenMM_1_1Force_1a1') is None
+    assert index.find_members('OpenMM::Force', 'getForceGroup') == []
+    assert index.find_id('classOpenMM_1_1Force_1a2').findtext('name') == 'getGroup'
+    assert len(index.root) == 2
+    assert load_xml_dir(xmldir, cache=cache).find_overload('OpenMM::Force', 'getGroup', '() const') is not None
+
+    # so does a removed file
+    tmpdir.join('xml', 'namespaceOpenMM.xml').remove()
+    assert load_xml_dir(xmldir, cache=cache, previous=index).changed == {'OpenMM'}
+    assert list(index.compounds) == ['OpenMM::Force']
+
+
+def test_get_outdated_docs(tmpdir):
+    index = DoxygenIndex.from_xml_files(list_xml_files(write_xml_dir(tmpdir)))
+    env = Mock(docname='api')
+    del env.doxygen_compounds
+    note_doxygen_compound(env, index, index.find_id('classOpenMM_1_1Force_1a1'))
+    assert env.doxygen_compounds == {'api': {('', 'OpenMM::Force')}}
+    setup = sphinxcontrib.autodoc_doxygen.setup
+    try:
+        setup.DOXYGEN_CHANGED = {('', 'OpenMM')}
+        assert get_outdated_docs(None, env, set(), set(), set()) == []
+        setup.DOXYGEN_CHANGED = {('', 'OpenMM::Force')}
+        assert get_outdated_docs(None, env, set(), set(), set()) == ['api']
+    finally:
+        del setup.DOXYGEN_CHANGED
+
+
+def test_resolve(tmpdir):
+    index = DoxygenIndex.from_xml_files(list_xml_files(write_xml_dir(tmpdir)))
+    assert index.scopes == {'OpenMM': '', 'OpenMM::Force': 'OpenMM'}
+    assert index.scope_chain('OpenMM::Force::Unknown') == ['OpenMM::Force', 'OpenMM', '']
+
+    force = index.find_compound('OpenMM::Force')
+    assert index.resolve('Force', 'OpenMM::Force') == ('OpenMM::Force', force)
+    assert index.resolve('getForceGroup', 'OpenMM::Force')[0] == 'OpenMM::Force::getForceGroup'
+    assert index.resolve('Force::getForceGroup() const', 'OpenMM')[0] == 'OpenMM::Force::getForceGroup() const'
+    assert index.resolve('Force') is None
+    # misses are memoized too, until the index changes
+    assert ('OpenMM', 'Missing', 0) not in index._resolved
+    assert index.resolve('Missing', 'OpenMM') is None
+    assert index._resolved[('OpenMM', 'Missing', 0)] is None
+    index.remove_compound(force)
+    assert index._resolved == {} and index.resolve('Force', 'OpenMM') is None
+
+
+def test_import_by_name(tmpdir):
+    index = DoxygenIndex.from_xml_files(list_xml_files(write_xml_dir(tmpdir)))
+    setup = sphinxcontrib.autodoc_doxygen.setup
+    setup.DOXYGEN_ROOT, setup.DOXYGEN_INDEX = index.root, index
+    try:
+        # the current scope, as set by ".. cpp:namespace:: OpenMM"
+        env = Mock(ref_context={'cpp:parent_key': Mock(data=[('OpenMM', None, 'id')])})
+        prefixes = [None]
+        assert import_by_name('Force', env=env, prefixes=prefixes)[0] == 'OpenMM::Force'
+        assert import_by_name('Force::getForceGroup', env=env)[0] == 'OpenMM::Force.getForceGroup'
+        assert prefixes == [None]
+        with pytest.raises(ImportError):
+            import_by_name('Force')
+    finally:
+        del setup.DOXYGEN_ROOT, setup.DOXYGEN_INDEX
+
+
+def test_get_doxygen_index_projects(tmpdir):
+    index_a = DoxygenIndex.from_xml_files(list_xml_files(write_xml_dir(tmpdir)))
+    index_b = DoxygenIndex(index_a.root.makeelement('root'))
+    setup = sphinxcontrib.autodoc_doxygen.setup
+    setup.DOXYGEN_ROOT, setup.DOXYGEN_INDEX = index_a.root, index_a
+    setup.DOXYGEN_INDEXES = {'a': index_a, 'b': index_b}
+    try:
+        assert get_doxygen_index() is index_a
+        assert get_doxygen_index('b') is index_b
+        with pytest.raises(ExtensionError):
+            get_doxygen_index('c')
+        # with a single project, the project name is ignored
+        setup.DOXYGEN_INDEXES = {}
+        assert get_doxygen_index('c') is index_a
+    finally:
+        del setup.DOXYGEN_ROOT, setup.DOXYGEN_INDEX, setup.DOXYGEN_INDEXES
+
+
+def test_async_loading(tmpdir):
+    app = Mock()
+    app.doctreedir = str(tmpdir.join('doctrees'))
+    app.config = Mock(doxygen_xml=write_xml_dir(tmpdir.mkdir('xml')), doxygen_index='',
+                      doxygen_default_project='', doxygen_xml_include_kinds=[],
+                      doxygen_xml_exclude_names=[], doxygen_xml_async=True,
+                      doxygen_xml_prefetch=False, doxygen_tagfile='')
+    setup = sphinxcontrib.autodoc_doxygen.setup
+    try:
+        start_doxygen_xml(app, app.config)
+        assert get_doxygen_index().find_compound('OpenMM::Force') is not None
+        assert setup.DOXYGEN_FUTURE is None
+    finally:
+        del setup.DOXYGEN_ROOT, setup.DOXYGEN_INDEX, setup.DOXYGEN_INDEXES, setup.DOXYGEN_FUTURE
+        del setup.DOXYGEN_CHANGED, setup.DOXYGEN_LOADED
+
+
+def test_cli(tmpdir):
+    xmldir = write_xml_dir(tmpdir.mkdir('xml'))
+    output = str(tmpdir.join('index.xml'))
+    assert main([xmldir, '-o', output, '-q']) == 0
+    assert DoxygenIndex.load(output).find_compound('OpenMM::Force') is not None
+
+    assert main([xmldir, '-o', output, '-q', '--include-kind', 'class']) == 0
+    index = DoxygenIndex.load(output)
+    assert list(index.compounds) == ['OpenMM::Force']
+    assert index.find_excluded('namespaceOpenMM') == 'OpenMM'
+    assert main([str(tmpdir.join('nonexistent')), '-o', output, '-q']) == 1
+
+
+def test_cli_inventory(tmpdir):
+    xmldir = write_xml_dir(tmpdir.mkdir('xml'))
+    output, inventory = str(tmpdir.join('index.xml')), str(tmpdir.join('objects.inv'))
+    assert main([xmldir, '-o', output, '-q']) == 0
+    assert is_index_file(output)
+    assert main([output, '--inventory', inventory, '--project', 'OpenMM', '-q']) == 0
+
+    with open(inventory, 'rb') as f:
+        entries = InventoryFile.load(f, 'https://example.org', posixpath.join)
+    assert entries['cpp:class']['OpenMM::Force'][2] == \
+        'https://example.org/generated/OpenMM.Force.html#_CPPv4N6OpenMM5ForceE'
+    assert entries['cpp:function']['OpenMM::Force::getForceGroup'][2] == \
+        'https://example.org/generated/OpenMM.Force.html#_CPPv4NK6OpenMM5Force13getForceGroupEv'
+    assert entries['cpp:function']['OpenMM::Force::getForceGroup'][0] == 'OpenMM'
+
+
+def test_inventory_overloads():
+    root = ET.fromstring('<root>%s</root>' % class_xml(
+        'NS::Cls', [], [('foo', 'f1', '(int)'), ('foo', 'f2', '(double)'), ('bar', 'b1')]))
+    entries = list(iter_inventory(DoxygenIndex(root)))
+    # a single entry for the overloads, linking to the first one
+    assert [name for name, role, uri in entries] == ['NS::Cls', 'NS::Cls::foo', 'NS::Cls::bar']
+    assert entries[1][2] == 'generated/NS.Cls.html#_CPPv4N2NS3Cls3fooEi'
+
+
+def test_normalize_signature():
+    assert normalize_signature('( const Force &force, int n=0 ) const =0') == '(const Force&, int) const'
+    assert normalize_signature('(void)') == '()'
+    assert normalize_signature('(std::map<std::string, double> m, unsigned long)') == \
+        '(std::map<std::string,double>, unsigned long)'
+    assert normalize_signature('(T value) &&') == '(T) &&'
+    assert split_signature('NS::Cls::foo(const std::string&) const') == ('NS::Cls::foo', '(const std::string&) const')
+    assert split_signature('NS::Cls::operator()(int)') == ('NS::Cls::operator()', '(int)')
+    assert split_signature('NS::Cls') == ('NS::Cls', None)
+
+
+def function_xml(compound, name, id, args='()', section='public-func'):
+    return '''
+    <sectiondef kind="%s">
+      <memberdef kind="function" id="%s" prot="public" static="no">
+        <type>void</type>
+        <definition>void %s::%s</definition>
+        <argsstring>%s</argsstring>
+        <name>%s</name>%s
+      </memberdef>
+    </sectiondef>''' % (section, id, compound, name, args, name,
+                        ''.join('<param><type>%s</type></param>' % t for t in args.strip('()').split(',') if t))
+
+
+def class_xml(name, bases, functions):
+    return '<compounddef id="%s" kind="class"><compoundname>%s</compoundname>%s%s</compounddef>' % (
+        name.replace('::', '_1_1'), name,
+        ''.join('<basecompoundref prot="%s">%s</basecompoundref>' % (prot, base) for base, prot in bases),
+        ''.join(function_xml(name, *f) for f in functions))
+
+
+def test_inherited_members():
+    root = ET.fromstring('<root>%s</root>' % ''.join([
+        class_xml('NS::Base', [], [('Base', 'b0'), ('~Base', 'b1'), ('getA', 'b2'), ('foo', 'b3', '(int)'),
+                                   ('foo', 'b4', '(double)')]),
+        class_xml('NS::Mixin', [], [('getA', 'm1'), ('mix', 'm2')]),
+        class_xml('NS::Mid', [('NS::Base', 'public')], [('foo', 'i1', '()', 'private-func'), ('bar', 'i2')]),
+        class_xml('NS::Derived', [('NS::Mid', 'public'), ('NS::Mixin', 'public'), ('NS::Hidden', 'private'),
+                                  ('std::exception', 'public')], [('baz', 'd1')]),
+        class_xml('NS::Plain', [('NS::Base', 'public')], []),
+    ]))
+    index = DoxygenIndex(root)
+    assert index.bases['NS::Derived'] == ['NS::Mid', 'NS::Mixin', 'std::exception']
+    assert index.ancestors('NS::Derived') == ['NS::Mid', 'NS::Base', 'NS::Mixin', 'std::exception']
+    assert index.ancestors('NS::Base') == []
+
+    # the private foo of Mid hides the foos of Base, and getA of Base (nearer) hides the one of Mixin
+    assert [(name, m.get('id')) for name, m in index.inherited_members('NS::Derived')] == [
+        ('bar', 'i2'), ('getA', 'b2'), ('mix', 'm2')]
+    assert [m.get('id') for _, m in index.inherited_members('NS::Mid')] == ['b2']
+    assert [m.get('id') for _, m in index.inherited_members('NS::Plain')] == ['b2', 'b3', 'b4']
+    assert index.inherited_members('NS::Derived') is index.inherited_members('NS::Derived')
+
+    assert index.find_object('NS::Derived::getA').get('id') == 'b2'
+    assert index.find_object('NS::Plain::foo', i=1).get('id') == 'b4'
+    assert index.find_overload('NS::Plain', 'foo', '(double)').get('id') == 'b4'
+    assert index.find_object('NS::Derived::foo') is None
+
+    # the tables are built again when the index changes
+    index.remove_compound(index.find_compound('NS::Mid'))
+    assert index.ancestors('NS::Derived') == ['NS::Mid', 'NS::Mixin', 'std::exception']
+    assert [m.get('id') for _, m in index.inherited_members('NS::Derived')] == ['m1', 'm2']
+
+
+def test_lazy_descriptions(tmpdir):
+    xmldir = tmpdir.mkdir('xml')
+    xmldir.join('classOpenMM_1_1Force.xml').write(CLASS_XML.replace(
+        '<name>getForceGroup</name>',
+        '<name>getForceGroup</name>\n'
+        '        <briefdescription>\n        </briefdescription>\n'
+        '        <detaileddescription><para>Get the <ref refid="classOpenMM_1_1Force">force</ref> '
+        'group.</para></detaileddescription>'))
+    cache = str(tmpdir.join('cache', 'index.xml'))
+    index = load_xml_dir(str(xmldir), cache=cache, lazy_descriptions=True)
+    member = index.find_object('OpenMM::Force::getForceGroup')
+    placeholder = member.find('detaileddescription')
+    assert len(placeholder) == 0 and placeholder.get('length') is not None
+    assert index.description(member, 'briefdescription').get('length') is None
+
+    description = index.description(member, 'detaileddescription')
+    assert ET.tostring(description) == (b'<detaileddescription><para>Get the <ref refid="classOpenMM_1_1Force">'
+                                        b'force</ref> group.</para></detaileddescription>')
+    assert index.description(member, 'inbodydescription') is None
+
+    # the placeholders are cached, with the setting
+    cached = load_xml_dir(str(xmldir), cache=cache, lazy_descriptions=True)
+    assert cached.lazy_descriptions and cached.changed == set()
+    member = cached.find_object('OpenMM::Force::getForceGroup')
+    assert len(cached.description(member, 'detaileddescription')) == 1
+    assert len(load_xml_dir(str(xmldir), cache=cache).find_object(
+        'OpenMM::Force::getForceGroup').find('detaileddescription')) == 1
+
+    # the offsets are only valid for the file that was loaded
+    index.close_files()
+    xmldir.join('classOpenMM_1_1Force.xml').write('<doxygen/>')
+    with pytest.raises(ValueError):
+        index.description(index.find_object('OpenMM::Force::getForceGroup'), 'detaileddescription')
+
+
+def test_plan_compounds(tmpdir):
+    def compound(name, kind='class', body=''):
+        id = '%s%s' % (kind, name.replace('::', '_1_1'))
+        tmpdir.join(id + '.xml').write('<doxygen><compounddef id="%s" kind="%s"><compoundname>%s</compoundname>'
+                                       '%s</compounddef></doxygen>' % (id, kind, name, body))
+        return '<compound refid="%s" kind="%s"><name>%s</name></compound>' % (id, kind, name)
+
+    def ref(id):
+        return '<detaileddescription><para><ref refid="%s" kindref="member">x</ref></para></detaileddescription>' % id
+
+    tmpdir.join('index.xml').write('<doxygenindex>%s%s</doxygenindex>' % (''.join([
+        compound('NS::Derived', body='<basecompoundref refid="classNS_1_1Base" prot="public" virt="non-virtual">'
+                                     'NS::Base</basecompoundref>' + ref('classNS_1_1Other_1a1')),
+        compound('NS::Base', body=ref('classNS_1_1Far')),
+        compound('NS::Other', body=ref('classNS_1_1Unrelated')),
+        compound('NS::Far'),
+        compound('NS::Unrelated'),
+        compound('NS', kind='namespace', body='<innerclass refid="classNS_1_1Unrelated" prot="public">'
+                                              'NS::Unrelated</innerclass>'),
+    ]), '<compound refid="classNS_1_1Other" kind="class"><name>NS::Other</name>'
+        '<member refid="classNS_1_1Other_1a1" kind="function"><name>run</name></member></compound>'))
+    cache = str(tmpdir.join('cache', 'plan.json'))
+
+    # the bases are documented too, but the references of the targets of the references are not followed
+    items = [('autodoxysummary', 'Derived::getA', 'NS')]
+    assert plan_compounds(str(tmpdir), items, cache=cache) == {
+        'classNS_1_1Derived', 'classNS_1_1Base', 'classNS_1_1Far', 'classNS_1_1Other'}
+    assert plan_compounds(str(tmpdir), [('autodoxynamespace', 'NS', None)]) == {
+        'namespaceNS', 'classNS_1_1Unrelated'}
+    assert plan_compounds(str(tmpdir.join('missing')), items) is None
+
+    index = load_xml_dir(str(tmpdir), refids={'classNS_1_1Derived', 'classNS_1_1Base'})
+    assert sorted(index.compounds) == ['NS::Base', 'NS::Derived']
+    assert index.find_excluded('classNS_1_1Other_1a1') == 'NS::Other::run'
+
+    # the cached plan is used until a scanned file changes
+    with open(cache) as f:
+        assert len(json.load(f)['refids']) == 4
+    compound('NS::Derived')
+    os.utime(str(tmpdir.join('classNS_1_1Derived.xml')), (0, 0))
+    assert plan_compounds(str(tmpdir), items, cache=cache) == {'classNS_1_1Derived'}
+
+
+TAGFILE = '''<?xml version='1.0' encoding='UTF-8' standalone='yes' ?>
+<tagfile>
+  <compound kind="class">
+    <name>OpenMM::Force</name>
+    <filename>classOpenMM_1_1Force.html</filename>
+    <member kind="function">
+      <type>int</type>
+      <name>getForceGroup</name>
+      <anchorfile>classOpenMM_1_1Force.html</anchorfile>
+      <anchor>a1</anchor>
+      <arglist>() const</arglist>
+    </member>
+  </compound>
+  <compound kind="namespace">
+    <name>OpenMM</name>
+    <filename>namespaceOpenMM</filename>
+    <class kind="class">OpenMM::Force</class>
+  </compound>
+</tagfile>
+'''
+
+
+def test_tagfile(tmpdir):
+    xmldir = write_xml_dir(tmpdir.mkdir('xml'))
+    tmpdir.join('xml', 'index.xml').write(INDEX_XML)
+    tmpdir.join('openmm.tag').write(TAGFILE)
+    tags = read_tagfile(str(tmpdir.join('openmm.tag')))
+    assert tags == {
+        'classOpenMM_1_1Force': Tag('OpenMM::Force', 'class', 'classOpenMM_1_1Force'),
+        'classOpenMM_1_1Force_1a1': Tag('OpenMM::Force::getForceGroup', 'function', 'classOpenMM_1_1Force'),
+        'namespaceOpenMM': Tag('OpenMM', 'namespace', 'namespaceOpenMM'),
+    }
+
+    cache = str(tmpdir.join('cache', 'index.xml'))
+    index = load_xml_dir(xmldir, cache=cache, on_demand=True)
+    index.seed_tags(tags, xmldir)
+    assert index.compounds == {} and index.excluded == {}
+
+    # the references don't load anything
+    assert index.find_id('classOpenMM_1_1Force_1a1') is None
+    assert index.find_tag('classOpenMM_1_1Force_1a1') == 'OpenMM::Force::getForceGroup'
+    with index.without_loading():
+        assert index.resolve('Force', 'OpenMM') is None
+    assert index.find_tagged('Force::getForceGroup', 'OpenMM').name == 'OpenMM::Force::getForceGroup'
+    assert index.compounds == {}
+
+    # the directives do
+    assert index.resolve('Force::getForceGroup', 'OpenMM')[0] == 'OpenMM::Force::getForceGroup'
+    assert index.loaded_on_demand == {'OpenMM::Force'}
+    assert index.find_id('classOpenMM_1_1Force_1a1') is not None
+    assert index.namespace_members('OpenMM')['class'] == [index.find_compound('OpenMM::Force')]
+
+    # the next build loads them up front
+    index.dump(cache)
+    index = load_xml_dir(xmldir, cache=cache, on_demand=True)
+    assert sorted(index.compounds) == ['OpenMM', 'OpenMM::Force']
+
+
+def test_concurrent_on_demand_descriptions(tmpdir):
+    # the threads load compounds on demand while the others read the
+    # descriptions and digests of those already loaded
+    xmldir = tmpdir.mkdir('xml')
+    names = ['NS::C%d' % i for i in range(50)]
+    digests = {}
+    for name in names:
+        refid = 'class' + name.replace('::', '_1_1')
+        xml = CLASS_XML.replace('classOpenMM_1_1Force', refid).replace('OpenMM::Force', name).replace(
+            '<name>getForceGroup</name>',
+            '<name>getForceGroup</name><detaileddescription><para>%s</para></detaileddescription>' % name)
+        xmldir.join(refid + '.xml').write(xml)
+        digests[name] = hashlib.sha1(xml.encode('utf-8')).hexdigest()
+    xmldir.join('index.xml').write('<doxygenindex>%s</doxygenindex>' % ''.join(
+        '<compound refid="class%s" kind="class"><name>%s</name></compound>' % (name.replace('::', '_1_1'), name)
+        for name in names))
+    tmpdir.join('ns.tag').write('<tagfile>%s</tagfile>' % ''.join(
+        '<compound kind="class"><name>%s</name><filename>class%s.html</filename></compound>'
+        % (name, name.replace('::', '_1_1')) for name in names))
+
+    index = load_xml_dir(str(xmldir), lazy_descriptions=True, on_demand=True)
+    index.seed_tags(read_tagfile(str(tmpdir.join('ns.tag'))), str(xmldir))
+    assert index.compounds == {}
+    barrier = threading.Barrier(8)
+
+    def lookup(seed):
+        order = list(names)
+        random.Random(seed).shuffle(order)
+        barrier.wait()
+        for name in order:
+            compound = index.find_compound(name)
+            member = compound.find('sectiondef/memberdef')
+            assert index.description(member, 'detaileddescription').findtext('para') == name
+            assert index.digest(compound) == digests[name]
+
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lookup, range(8)))
+    finally:
+        index.close_files()
+    assert index.loaded_on_demand == set(names)
@@ -1,6 +1,9 @@
 from mock import Mock
 from contextlib import contextmanager
 
+import pytest
+from sphinx.errors import ExtensionError
+
 import lxml.etree as ET
 from sphinxcontrib.autodoc_doxygen.autodoc import DoxygenMethodDocumenter
 import sphinxcontrib.autodoc_doxygen
@@ -63,3 +66,286 @@ def test_1():
         documenter.import_object()
         assert documenter.format_name() == 'const Force & getForce'
         assert documenter.format_signature() == '(int index) const '
+
+
+OVERLOADS = '''
+  <compounddef id="classOpenMM_1_1Context" kind="class" language="C++" prot="public">
+    <compoundname>OpenMM::Context</compoundname>
+    <sectiondef kind="public-func">
+      <memberdef kind="function" id="classOpenMM_1_1Context_1a1" prot="public" static="no" const="no">
+        <type>void</type>
+        <definition>void OpenMM::Context::setPositions</definition>
+        <argsstring>(const std::vector&lt; Vec3 &gt; &amp;positions)</argsstring>
+        <name>setPositions</name>
+        <param>
+          <type>const std::vector&lt; <ref refid="classOpenMM_1_1Vec3" kindref="compound">Vec3</ref> &gt; &amp;</type>
+          <declname>positions</declname>
+        </param>
+        <detaileddescription>
+<para>Set the positions of all particles.</para>
+        </detaileddescription>
+      </memberdef>
+      <memberdef kind="function" id="classOpenMM_1_1Context_1a2" prot="public" static="no" const="yes">
+        <type>void</type>
+        <definition>void OpenMM::Context::setPositions</definition>
+        <argsstring>(int index, double x=0) const </argsstring>
+        <name>setPositions</name>
+        <param>
+          <type>int</type>
+          <declname>index</declname>
+        </param>
+        <param>
+          <type>double</type>
+          <declname>x</declname>
+          <defval>0</defval>
+        </param>
+      </memberdef>
+    </sectiondef>
+  </compounddef>'''
+
+
+def test_overloads():
+    node = ET.fromstring(OVERLOADS)
+
+    with set_doxygen_root(node):
+        for name, id in [('OpenMM::Context::setPositions', 'classOpenMM_1_1Context_1a1'),
+                         ('OpenMM::Context::setPositions(const std::vector<Vec3>&)', 'classOpenMM_1_1Context_1a1'),
+                         ('OpenMM::Context::setPositions(int index, double x) const', 'classOpenMM_1_1Context_1a2'),
+                         ('OpenMM::Context::setPositions( int,double )const', 'classOpenMM_1_1Context_1a2')]:
+            documenter = DoxygenMethodDocumenter(Mock(), name)
+            documenter.parse_name()
+            documenter.import_object()
+            assert documenter.object.get('id') == id
+            assert documenter.objname == 'setPositions'
+
+        documenter = DoxygenMethodDocumenter(Mock(), 'OpenMM::Context::setPositions(int)')
+        documenter.parse_name()
+        with pytest.raises(ExtensionError):
+            documenter.import_object()
+
+
+TEMPLATE_METHOD = '''
+<root>
+  <compounddef id="classOpenMM_1_1Context" kind="class">
+    <compoundname>OpenMM::Context</compoundname>
+    <sectiondef kind="public-func">
+      <memberdef kind="function" id="classOpenMM_1_1Context_1a3" prot="public" static="no">
+        <templateparamlist>
+          <param><type>typename <ref refid="classOpenMM_1_1Key" kindref="compound">Key</ref></type></param>
+        </templateparamlist>
+        <type>const std::map&lt; <ref refid="classOpenMM_1_1Key" kindref="compound">Key</ref>, <ref refid="classOpenMM_1_1Vec3" kindref="compound">Vec3</ref> &gt; &amp;</type>
+        <definition>const std::map&lt;Key, Vec3&gt;&amp; OpenMM::Context::getMap</definition>
+        <argsstring>(int index) const</argsstring>
+        <name>getMap</name>
+      </memberdef>
+    </sectiondef>
+  </compounddef>
+</root>'''
+
+
+def test_declaration(tmpdir):
+    from sphinxcontrib.autodoc_doxygen.index import Declaration, DoxygenIndex
+
+    node = ET.fromstring(TEMPLATE_METHOD)
+    with set_doxygen_root(node):
+        documenter = DoxygenMethodDocumenter(Mock(), 'getMap', id='classOpenMM_1_1Context_1a3')
+        assert documenter.fullname == 'OpenMM::Context::getMap'
+        # the return type is not cut after its first ref
+        assert documenter.format_name() == 'template <typename Key> const std::map< Key, Vec3 > & getMap'
+        assert documenter.format_signature() == '(int index) const'
+
+    # the declarations are stored in the dump
+    filename = str(tmpdir.join('index.xml'))
+    DoxygenIndex(node).dump(filename)
+    index = DoxygenIndex.load(filename)
+    assert index.declarations == {'classOpenMM_1_1Context_1a3': Declaration(
+        'template <typename Key> ', 'const std::map< Key, Vec3 > &', 'OpenMM::Context::getMap', '(int index) const')}
+    assert index.root.find('declaration') is None
+
+
+def test_precompute():
+    node = ET.fromstring(OVERLOADS)
+    with set_doxygen_root(node):
+        documenter = DoxygenMethodDocumenter(Mock(), 'setPositions', id='classOpenMM_1_1Context_1a1')
+        expected = documenter.format_name(), documenter.format_signature(), documenter.get_doc()
+        assert 'Set the positions of all particles.' in expected[2][0]
+
+        documenter.precompute()
+        # generate() no longer needs the XML
+        documenter.object = None
+        assert (documenter.format_name(), documenter.format_signature(), documenter.get_doc()) == expected
+
+
+def test_concurrent_lazy_index():
+    from concurrent.futures import ThreadPoolExecutor
+    from sphinxcontrib.autodoc_doxygen import get_doxygen_index
+
+    setup = sphinxcontrib.autodoc_doxygen.setup
+    with set_doxygen_root(ET.fromstring(OVERLOADS)):
+        setup.DOXYGEN_INDEX = None
+        try:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                indexes = list(pool.map(lambda i: get_doxygen_index(), range(64)))
+            assert all(index is indexes[0] for index in indexes)
+        finally:
+            del setup.DOXYGEN_INDEX
+
+
+def test_generated_rest_cache():
+    from docutils.statemachine import StringList
+    from mock import patch
+    from sphinx.ext.autodoc import Options
+    from sphinxcontrib.autodoc_doxygen.autodoc import prune_unused_rest, purge_generated_rest
+
+    def generate(env):
+        directive = Mock(env=env, genopt=Options(project=None), result=StringList())
+        documenter = DoxygenMethodDocumenter(directive, 'OpenMM::Context::setPositions(const std::vector<Vec3>&)')
+        documenter.generate(more_content=StringList())
+        return directive.result
+
+    env = Mock(temp_data={}, doxygen_compounds={}, docname='index')
+    env.doc2path = lambda docname: '/src/%s.rst' % docname
+    env.app.registry.autodoc_attrgettrs = {}
+    env.config.autodoc_doxygen_cache_rest = True
+    env.config.autodoc_doxygen_profile = env.config.autodoc_doxygen_timings = ''
+    env.config.autodoc_doxygen_memory = ''
+    env.doxygen_rest = {}
+    env.doxygen_rest_used = {}
+    node = ET.fromstring('<root>%s<compounddef id="classOpenMM_1_1Vec3" kind="class">'
+                         '<compoundname>OpenMM::Vec3</compoundname></compounddef></root>' % OVERLOADS)
+    node.find('.//detaileddescription/para').append(ET.fromstring('<ref refid="classOpenMM_1_1Vec3">Vec3</ref>'))
+    with set_doxygen_root(node):
+        # the name is only looked up once, for the cache key
+        with patch.object(DoxygenMethodDocumenter, 'import_object', autospec=True,
+                          side_effect=DoxygenMethodDocumenter.import_object) as import_object:
+            result = generate(env)
+        assert import_object.call_count == 1
+        lines = list(result)
+        assert lines[1] == '.. cpp:function:: void setPositions(const std::vector< Vec3 > &positions)'
+        assert ':cpp:any:`Vec3 <OpenMM::Vec3>`' in lines[-2]
+        assert result.items[1][0] == '/src/index.rst:docstring of OpenMM::Context::setPositions'
+        assert len(env.doxygen_rest) == 1
+
+        # replayed from the cache, without formatting the XML again, and
+        # located in the document replaying it
+        key, (digest, version, refs, cached) = next(iter(env.doxygen_rest.items()))
+        assert refs == (('classOpenMM_1_1Vec3', 'OpenMM::Vec3'),)
+        assert cached[1][1] == ':docstring of OpenMM::Context::setPositions'
+        env.docname = 'other'
+        result = generate(env)
+        assert list(result) == lines
+        assert result.items[1][0] == '/src/other.rst:docstring of OpenMM::Context::setPositions'
+        env.doxygen_rest[key] = (digest, version, refs, [(u'cached', ':docstring', 0)])
+        assert list(generate(env)) == [u'cached']
+
+        # the entries of a different compound are generated again
+        env.doxygen_rest[key] = ('other digest', version, refs, [(u'cached', ':docstring', 0)])
+        assert list(generate(env)) == lines
+
+        # and so are those whose references link to other names
+        env.doxygen_rest[key] = (digest, version, refs, [(u'cached', ':docstring', 0)])
+        node.find('compounddef[@id="classOpenMM_1_1Vec3"]/compoundname').text = 'OpenMM::Vec4'
+        assert ':cpp:any:`Vec3 <OpenMM::Vec4>`' in generate(env)[-2]
+
+        # the entries no document uses any more are dropped once the documents are read
+        assert env.doxygen_rest_used == {'index': {key}, 'other': {key}}
+        purge_generated_rest(None, env, 'index')
+        prune_unused_rest(None, env)
+        assert key in env.doxygen_rest
+        purge_generated_rest(None, env, 'other')
+        prune_unused_rest(None, env)
+        assert env.doxygen_rest == {}
+
+NAMESPACE = '''
+<root>
+  <compounddef id="namespaceOpenMM" kind="namespace">
+    <compoundname>OpenMM</compoundname>
+    <innerclass refid="classOpenMM_1_1Force" prot="public">OpenMM::Force</innerclass>
+    <innerclass refid="classOpenMM_1_1Missing" prot="public">OpenMM::Missing</innerclass>
+    <sectiondef kind="typedef">
+      <memberdef kind="typedef" id="namespaceOpenMM_1t1" prot="public" static="no">
+        <type>std::vector&lt; double &gt;</type>
+        <definition>typedef std::vector&lt;double&gt; OpenMM::Grid</definition>
+        <name>Grid</name>
+      </memberdef>
+    </sectiondef>
+    <sectiondef kind="enum">
+      <memberdef kind="enum" id="namespaceOpenMM_1e1" prot="public" static="no" strong="yes">
+        <name>Method</name>
+        <enumvalue id="namespaceOpenMM_1e1a" prot="public">
+          <name>NoCutoff</name>
+          <initializer>= 0</initializer>
+          <detaileddescription><para>No cutoff is applied.</para></detaileddescription>
+        </enumvalue>
+        <enumvalue id="namespaceOpenMM_1e1b" prot="public">
+          <name>Ewald</name>
+        </enumvalue>
+      </memberdef>
+    </sectiondef>
+    <sectiondef kind="func">
+      <memberdef kind="function" id="namespaceOpenMM_1f1" prot="public" static="no">
+        <templateparamlist>
+          <param><type>class T</type></param>
+        </templateparamlist>
+        <type>T</type>
+        <definition>T OpenMM::norm</definition>
+        <argsstring>(const T &amp;v)</argsstring>
+        <name>norm</name>
+      </memberdef>
+    </sectiondef>
+  </compounddef>
+  <compounddef id="classOpenMM_1_1Force" kind="class" prot="public">
+    <compoundname>OpenMM::Force</compoundname>
+    <sectiondef kind="public-func">
+      <memberdef kind="function" id="classOpenMM_1_1Force_1a1" prot="public" static="no">
+        <type>int</type>
+        <definition>int OpenMM::Force::getForceGroup</definition>
+        <argsstring>() const</argsstring>
+        <name>getForceGroup</name>
+      </memberdef>
+    </sectiondef>
+  </compounddef>
+</root>'''
+
+
+def test_namespace_documenter():
+    from docutils.statemachine import StringList
+    from sphinx.ext.autodoc import ALL, Options
+    from sphinxcontrib.autodoc_doxygen.autodoc import (
+        DoxygenClassDocumenter, DoxygenEnumDocumenter, DoxygenFunctionDocumenter,
+        DoxygenNamespaceDocumenter, DoxygenTypedefDocumenter)
+    from sphinxcontrib.autodoc_doxygen import get_doxygen_index
+
+    def generate(members):
+        directive = Mock(env=env, genopt=Options(project=None, members=members), result=StringList())
+        DoxygenNamespaceDocumenter(directive, 'OpenMM').generate()
+        return [line for line in directive.result if line.strip()]
+
+    env = Mock(temp_data={}, doxygen_compounds={}, docname='index')
+    env.app.registry.autodoc_attrgettrs = {}
+    env.app.registry.documenters = dict(
+        (cls.objtype, cls) for cls in (DoxygenClassDocumenter, DoxygenMethodDocumenter,
+                                       DoxygenNamespaceDocumenter, DoxygenFunctionDocumenter,
+                                       DoxygenEnumDocumenter, DoxygenTypedefDocumenter))
+    env.config.autodoc_doxygen_cache_rest = False
+    env.config.autodoc_doxygen_member_jobs = 1
+    env.config.autodoc_doxygen_profile = env.config.autodoc_doxygen_timings = ''
+    env.config.autodoc_doxygen_memory = ''
+    with set_doxygen_root(ET.fromstring(NAMESPACE)):
+        members = get_doxygen_index().namespace_members('OpenMM')
+        assert [m.get('id') for m in members['class']] == ['classOpenMM_1_1Force']
+        assert [len(members[kind]) for kind in ('typedef', 'enum', 'function')] == [1, 1, 1]
+        assert get_doxygen_index().namespace_members('OpenMM::Force') is None
+
+        assert generate(ALL) == [
+            '.. cpp:class:: OpenMM::Force',
+            '   .. cpp:function:: int getForceGroup() const',
+            '.. cpp:type:: std::vector<double> OpenMM::Grid',
+            '.. cpp:enum-class:: OpenMM::Method',
+            '   .. cpp:enumerator:: NoCutoff = 0',
+            '      No cutoff is applied.',
+            '   .. cpp:enumerator:: Ewald',
+            '.. cpp:function:: template <class T> T OpenMM::norm(const T &v)',
+        ]
+        assert generate(['norm']) == ['.. cpp:function:: template <class T> T OpenMM::norm(const T &v)']
+        assert generate(None) == []
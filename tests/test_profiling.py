@@ -0,0 +1,148 @@
+import io
+import json
+import os
+import pstats
+import tracemalloc
+
+import pytest
+from sphinx.application import Sphinx
+
+import sphinxcontrib.autodoc_doxygen
+
+CLASS_XML = '''<?xml version='1.0' encoding='UTF-8' standalone='no'?>
+<doxygen version="1.8.9.1">
+  <compounddef id="classOpenMM_1_1Force" kind="class" language="C++" prot="public">
+    <compoundname>OpenMM::Force</compoundname>
+    <sectiondef kind="public-func">
+      <memberdef kind="function" id="classOpenMM_1_1Force_1a1" prot="public" static="no">
+        <type>int</type>
+        <definition>int OpenMM::Force::getForceGroup</definition>
+        <argsstring>() const </argsstring>
+        <name>getForceGroup</name>
+      </memberdef>
+      <memberdef kind="function" id="classOpenMM_1_1Force_1a2" prot="public" static="no">
+        <type>void</type>
+        <definition>void OpenMM::Force::setForceGroup</definition>
+        <argsstring>(int group)</argsstring>
+        <name>setForceGroup</name>
+        <param><type>int</type><declname>group</declname></param>
+      </memberdef>
+    </sectiondef>
+  </compounddef>
+</doxygen>
+'''
+
+INDEX_XML = '''<?xml version='1.0' encoding='UTF-8' standalone='no'?>
+<doxygenindex version="1.8.9.1">
+  <compound refid="classOpenMM_1_1Force" kind="class"><name>OpenMM::Force</name>
+    <member refid="classOpenMM_1_1Force_1a1" kind="function"><name>getForceGroup</name></member>
+    <member refid="classOpenMM_1_1Force_1a2" kind="function"><name>setForceGroup</name></member>
+  </compound>
+</doxygenindex>
+'''
+
+# more documents than sphinx needs to read them in parallel
+DOCNAMES = ['doc%d' % i for i in range(6)]
+
+DOCUMENT = '''%s
+====
+
+.. autodoxyclass:: OpenMM::Force
+   :members:
+'''
+
+
+@pytest.fixture
+def build(tmpdir):
+    """Build a small site documenting a class with the extension, with the
+    given config overrides. Returns the source directory.
+    """
+    xml = tmpdir.mkdir('xml')
+    xml.join('classOpenMM_1_1Force.xml').write(CLASS_XML)
+    xml.join('index.xml').write(INDEX_XML)
+    src = tmpdir.mkdir('src')
+    src.join('conf.py').write("extensions = ['sphinxcontrib.autodoc_doxygen']\n"
+                              "doxygen_xml = %r\n" % str(xml))
+    src.join('index.rst').write('Index\n=====\n\n.. toctree::\n\n%s\n' % '\n'.join(
+        '   %s' % docname for docname in DOCNAMES))
+    for docname in DOCNAMES:
+        src.join(docname + '.rst').write(DOCUMENT % docname)
+
+    def build(parallel=1, **confoverrides):
+        app = Sphinx(str(src), str(src), str(tmpdir.join('html')), str(tmpdir.join('doctrees')),
+                     'html', confoverrides, status=io.StringIO(), warning=io.StringIO(),
+                     freshenv=True, parallel=parallel)
+        app.build()
+        return src
+
+    setup = sphinxcontrib.autodoc_doxygen.setup
+    yield build
+    for name in ('DOXYGEN_ROOT', 'DOXYGEN_INDEX', 'DOXYGEN_INDEXES', 'DOXYGEN_CHANGED',
+                 'DOXYGEN_LOADED', 'DOXYGEN_FUTURE'):
+        if hasattr(setup, name):
+            delattr(setup, name)
+
+
+def read_directives(src):
+    with open(os.path.join(str(src), 'profile', 'directives.tsv')) as f:
+        return sorted(line.rstrip('\n').split('\t')[1:] for line in f)
+
+
+@pytest.mark.parametrize('parallel', [1, 2])
+def test_profile(build, parallel):
+    # without replaying the reST of the class, every document runs the same calls
+    src = build(parallel, autodoc_doxygen_profile='profile', autodoc_doxygen_cache_rest=False)
+    profile = src.join('profile')
+
+    # one profile per document using the extension, whichever process read it
+    assert sorted(profile.join('docs').listdir()) == [
+        profile.join('docs', docname + '.pstats') for docname in DOCNAMES]
+    assert profile.join('builder-inited.pstats').check()
+
+    # one row per directive: the documenters of the members are run by the
+    # one of the class, within its profile
+    assert read_directives(src) == [[docname, '4', 'doxyclass', 'OpenMM::Force'] for docname in DOCNAMES]
+
+    # merged.pstats merges the profiles of all the processes: the class and
+    # its two methods are generated in each document
+    merged = pstats.Stats(str(profile.join('merged.pstats')))
+    calls = dict((func[2], stat[1]) for func, stat in merged.stats.items()
+                 if func[0].endswith('autodoc.py'))
+    assert calls['generate'] == 3 * len(DOCNAMES)
+
+
+
+def test_timings(build):
+    # the timings of the documents read by the parallel readers are merged
+    # into the environment of the main process, along with its own ones
+    src = build(2, autodoc_doxygen_timings='timings.json')
+    with open(str(src.join('timings.json'))) as f:
+        timings = json.load(f)
+    assert sorted(timings['documents']) == DOCNAMES
+    assert timings['phases']['doxyclass']['calls'] == len(DOCNAMES)
+    assert timings['phases']['set_doxygen_xml']['calls'] == 1
+    # the documenters of the members are timed as part of the class
+    assert 'doxymethod' not in timings['phases']
+
+
+def test_memory(build):
+    src = build(autodoc_doxygen_memory='memory.json')
+    with open(str(src.join('memory.json'))) as f:
+        report = json.load(f)
+    assert not tracemalloc.is_tracing()
+
+    phases = report['phases']
+    assert sorted(phases) == ['process_generate_options', 'read', 'set_doxygen_xml']
+    assert phases['read']['calls'] == 1
+    for phase in phases.values():
+        assert sorted(phase) == ['calls', 'peak_traced_mb', 'rss_added_mb', 'rss_mb', 'top', 'traced_mb']
+        assert phase['peak_traced_mb'] >= 0 and phase['rss_mb'] > 0
+    # the allocation sites are lines of the extension, biggest first
+    top = phases['read']['top']
+    assert top and all(site['site'].startswith('autodoc_doxygen' + os.sep) for site in top)
+    assert [site['size_kb'] for site in top] == sorted((site['size_kb'] for site in top), reverse=True)
+
+    # the size of the loaded XML, whose memory tracemalloc does not see
+    counts = report['doxygen']['']
+    assert (counts['compounds'], counts['members']) == (1, 2)
+    assert counts['nodes'] > counts['elements'] > 0
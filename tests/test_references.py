@@ -0,0 +1,56 @@
+import lxml.etree as ET
+from docutils import nodes
+from mock import Mock
+from sphinx import addnodes
+
+import sphinxcontrib.autodoc_doxygen
+from sphinxcontrib.autodoc_doxygen.index import DoxygenIndex
+from sphinxcontrib.autodoc_doxygen.references import clear_reference_cache, resolve_missing_reference
+
+
+XML = '''
+<root>
+  <compounddef id="classOpenMM_1_1Force" kind="class">
+    <compoundname>OpenMM::Force</compoundname>
+    <sectiondef kind="public-func">
+      <memberdef kind="function" id="classOpenMM_1_1Force_1a1">
+        <type>int</type>
+        <argsstring>() const</argsstring>
+        <name>getForceGroup</name>
+      </memberdef>
+    </sectiondef>
+  </compounddef>
+  <compounddef id="classOpenMM_1_1Context" kind="class">
+    <compoundname>OpenMM::Context</compoundname>
+  </compounddef>
+</root>'''
+
+
+def pending_xref(target, scope=None):
+    node = addnodes.pending_xref('', refdomain='cpp', reftype='any', reftarget=target, refdoc='api')
+    if scope:
+        node['cpp:parent_key'] = Mock(data=[(scope, None, 'id')])
+    return node
+
+
+def test_resolve_missing_reference():
+    index = DoxygenIndex(ET.fromstring(XML))
+    setup = sphinxcontrib.autodoc_doxygen.setup
+    setup.DOXYGEN_ROOT, setup.DOXYGEN_INDEX = index.root, index
+    app = Mock()
+    app.builder.get_relative_uri = lambda fromdoc, todoc: todoc + '.html'
+    env = Mock(found_docs={'api', 'generated/OpenMM.Force'})
+    try:
+        contnode = nodes.literal('', 'Force')
+        ref = resolve_missing_reference(app, env, pending_xref('Force', 'OpenMM'), contnode)
+        assert ref['refuri'] == 'generated/OpenMM.Force.html#_CPPv4N6OpenMM5ForceE'
+        ref = resolve_missing_reference(app, env, pending_xref('OpenMM::Force::getForceGroup'), contnode)
+        assert ref['refuri'] == 'generated/OpenMM.Force.html'
+
+        # known, but without a page: literal text
+        assert resolve_missing_reference(app, env, pending_xref('OpenMM::Context'), contnode) is contnode
+        # unknown: left to sphinx
+        assert resolve_missing_reference(app, env, pending_xref('std::vector'), contnode) is None
+    finally:
+        clear_reference_cache(app, env)
+        del setup.DOXYGEN_ROOT, setup.DOXYGEN_INDEX